@@ -39,7 +39,11 @@ BEGIN
         [EventType] NVARCHAR(50) NOT NULL,
         [MessageId] INT NULL,
         [MessageValues] NVARCHAR(500) NULL, -- JSON array: ["80", "95"]
-        [Value] DECIMAL(18,2) NULL, -- For numeric metrics like latency
+        [Value] DECIMAL(18,2) NULL, -- For numeric metrics like latency (sum when Occurrences > 1)
+        [Source] NVARCHAR(255) NULL, -- Input file the event was read from
+        [Occurrences] INT NOT NULL DEFAULT 1, -- Events merged into this row by pre-aggregation
+        [MinValue] DECIMAL(18,2) NULL, -- Min/max of the merged metric values
+        [MaxValue] DECIMAL(18,2) NULL,
         [CreatedAt] DATETIME2 DEFAULT GETDATE(),
         
         CONSTRAINT [FK_TimelineEvents_Messages] 
@@ -56,6 +60,26 @@ BEGIN
 END
 GO
 
+-- =============================================
+-- Column upgrades for existing databases
+-- =============================================
+IF COL_LENGTH('dbo.TimelineEvents', 'Source') IS NULL
+BEGIN
+    ALTER TABLE [dbo].[TimelineEvents] ADD [Source] NVARCHAR(255) NULL;
+    PRINT 'Column TimelineEvents.Source added.';
+END
+GO
+
+IF COL_LENGTH('dbo.TimelineEvents', 'Occurrences') IS NULL
+BEGIN
+    ALTER TABLE [dbo].[TimelineEvents] ADD
+        [Occurrences] INT NOT NULL CONSTRAINT [DF_TimelineEvents_Occurrences] DEFAULT 1,
+        [MinValue] DECIMAL(18,2) NULL,
+        [MaxValue] DECIMAL(18,2) NULL;
+    PRINT 'Columns TimelineEvents.Occurrences, MinValue, MaxValue added.';
+END
+GO
+
 -- =============================================
 -- Indexes for Performance Optimization
 -- =============================================
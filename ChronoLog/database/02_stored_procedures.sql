@@ -45,8 +45,13 @@ BEGIN
         te.[EventType] as [event],
         te.[MessageId] as [msg_id],
         te.[MessageValues] as [msg_values],
-        te.[Value] as [value],
+        -- aggregated metric rows store the sum; show the mean like a single event
+        te.[Value] / te.[Occurrences] as [value],
         m.[Template] as [template],
+        te.[Source] as [source],
+        te.[Occurrences] as [occurrences],
+        te.[MinValue] as [min_value],
+        te.[MaxValue] as [max_value],
         @TotalCount as [TotalCount]
     FROM [dbo].[TimelineEvents] te WITH (NOLOCK)
     LEFT JOIN [dbo].[Messages] m WITH (NOLOCK) ON te.[MessageId] = m.[MessageId]
@@ -80,18 +85,19 @@ BEGIN
     DECLARE @LatencyCount INT;
     DECLARE @LatencyAvg DECIMAL(18,2);
     
+    -- Counts are of events, not rows: pre-aggregated rows stand for [Occurrences] events
     -- Count errors
-    SELECT @ErrorCount = COUNT(*) 
+    SELECT @ErrorCount = ISNULL(SUM([Occurrences]), 0) 
     FROM [dbo].[TimelineEvents] WITH (NOLOCK)
     WHERE [EventType] = 'error';
     
     -- Count warnings
-    SELECT @WarningCount = COUNT(*) 
+    SELECT @WarningCount = ISNULL(SUM([Occurrences]), 0) 
     FROM [dbo].[TimelineEvents] WITH (NOLOCK)
     WHERE [EventType] = 'warning';
     
     -- Total timeline count
-    SELECT @TimelineCount = COUNT(*) 
+    SELECT @TimelineCount = ISNULL(SUM(CAST([Occurrences] AS BIGINT)), 0) 
     FROM [dbo].[TimelineEvents] WITH (NOLOCK);
     
     -- Unique messages count
@@ -100,8 +106,8 @@ BEGIN
     
     -- Latency metrics
     SELECT 
-        @LatencyCount = COUNT(*),
-        @LatencyAvg = AVG([Value])
+        @LatencyCount = ISNULL(SUM([Occurrences]), 0),
+        @LatencyAvg = SUM([Value]) / NULLIF(SUM([Occurrences]), 0)
     FROM [dbo].[TimelineEvents] WITH (NOLOCK)
     WHERE [EventType] = 'latency' AND [Value] IS NOT NULL;
     
@@ -156,7 +162,7 @@ BEGIN
     BEGIN
         SELECT TOP (@Limit)
             [EventTime] as [time],
-            [Value] as [value]
+            [Value] / [Occurrences] as [value]
         FROM [dbo].[TimelineEvents] WITH (NOLOCK)
         WHERE [EventType] = 'latency' AND [Value] IS NOT NULL
         ORDER BY [EventId] DESC;
@@ -168,19 +174,20 @@ BEGIN
     BEGIN
         SELECT TOP (@Limit)
             te.[EventTime] as [time],
-            CAST(JSON_VALUE(te.[MessageValues], '$[0]') AS DECIMAL(18,2)) as [value]
+            TRY_CAST(JSON_VALUE(te.[MessageValues], '$[0]') AS DECIMAL(18,2)) as [value]
         FROM [dbo].[TimelineEvents] te WITH (NOLOCK)
         WHERE te.[MessageId] = @MessageId 
             AND te.[MessageValues] IS NOT NULL
-            AND JSON_VALUE(te.[MessageValues], '$[0]') IS NOT NULL
+            -- template parameters may be ids, paths or quoted text; only numbers are plotted
+            AND TRY_CAST(JSON_VALUE(te.[MessageValues], '$[0]') AS DECIMAL(18,2)) IS NOT NULL
         ORDER BY te.[EventId] DESC;
         RETURN;
     END
     
-    -- Otherwise match by event type, return Value field
+    -- Otherwise match by event type, return Value field (the mean for aggregated rows)
     SELECT TOP (@Limit)
         [EventTime] as [time],
-        [Value] as [value]
+        [Value] / [Occurrences] as [value]
     FROM [dbo].[TimelineEvents] WITH (NOLOCK)
     WHERE [EventType] = @Metric AND [Value] IS NOT NULL
     ORDER BY [EventId] DESC;
@@ -203,15 +210,16 @@ CREATE PROCEDURE [dbo].[sp_InsertTimelineEvent]
     @EventType NVARCHAR(50),
     @MessageId INT = NULL,
     @MessageValues NVARCHAR(500) = NULL,
-    @Value DECIMAL(18,2) = NULL
+    @Value DECIMAL(18,2) = NULL,
+    @Source NVARCHAR(255) = NULL
 AS
 BEGIN
     SET NOCOUNT ON;
     
     INSERT INTO [dbo].[TimelineEvents] 
-        ([EventTime], [EventType], [MessageId], [MessageValues], [Value])
+        ([EventTime], [EventType], [MessageId], [MessageValues], [Value], [Source])
     VALUES 
-        (@EventTime, @EventType, @MessageId, @MessageValues, @Value);
+        (@EventTime, @EventType, @MessageId, @MessageValues, @Value, @Source);
     
     -- Return the new EventId
     SELECT SCOPE_IDENTITY() as [NewEventId];
@@ -261,6 +269,52 @@ GO
 PRINT 'Stored procedure sp_GetOrInsertMessage created successfully.';
 GO
 
+-- =============================================
+-- Stored Procedure: sp_GetOrInsertMessages
+-- Set-based get-or-insert for many message templates in one call
+-- Parameters:
+--   @TemplatesJson: JSON array of templates
+-- Returns one row per template: its position in the array and its MessageId
+-- =============================================
+IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_GetOrInsertMessages]') AND type in (N'P', N'PC'))
+    DROP PROCEDURE [dbo].[sp_GetOrInsertMessages];
+GO
+
+CREATE PROCEDURE [dbo].[sp_GetOrInsertMessages]
+    @TemplatesJson NVARCHAR(MAX)
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @Templates TABLE ([Index] INT NOT NULL, [Template] NVARCHAR(500) NOT NULL);
+    INSERT INTO @Templates ([Index], [Template])
+    SELECT CAST([key] AS INT), CAST([value] AS NVARCHAR(500))
+    FROM OPENJSON(@TemplatesJson)
+    WHERE [value] IS NOT NULL;
+
+    BEGIN TRY
+        INSERT INTO [dbo].[Messages] ([Template])
+        SELECT DISTINCT t.[Template] FROM @Templates t
+        WHERE NOT EXISTS (SELECT 1 FROM [dbo].[Messages] m WHERE m.[Template] = t.[Template]);
+    END TRY
+    BEGIN CATCH
+        -- If race condition (some inserted by another process), insert the rest
+        IF ERROR_NUMBER() NOT IN (2601, 2627)
+            THROW;
+        INSERT INTO [dbo].[Messages] ([Template])
+        SELECT DISTINCT t.[Template] FROM @Templates t
+        WHERE NOT EXISTS (SELECT 1 FROM [dbo].[Messages] m WHERE m.[Template] = t.[Template]);
+    END CATCH
+
+    SELECT t.[Index], m.[MessageId]
+    FROM @Templates t
+    JOIN [dbo].[Messages] m ON m.[Template] = t.[Template];
+END
+GO
+
+PRINT 'Stored procedure sp_GetOrInsertMessages created successfully.';
+GO
+
 -- =============================================
 -- Stored Procedure: sp_BulkInsertTimelineEvents
 -- Bulk insert multiple timeline events (for migration)
@@ -276,21 +330,31 @@ BEGIN
     SET NOCOUNT ON;
     
     -- Parse JSON and insert
+    -- [time] is in epoch seconds; split into days + seconds so DATEADD stays within INT range
+    -- [count], [min] and [max] are only present for pre-aggregated rows
     INSERT INTO [dbo].[TimelineEvents] 
-        ([EventTime], [EventType], [MessageId], [MessageValues], [Value])
+        ([EventTime], [EventType], [MessageId], [MessageValues], [Value], [Source], [Occurrences], [MinValue], [MaxValue])
     SELECT 
-        CAST([time] AS DATETIME2),
+        DATEADD(SECOND, [time] % 86400, DATEADD(DAY, [time] / 86400, CAST('1970-01-01' AS DATETIME2))),
         [event],
         [msg_id],
         [msg_values],
-        CAST([value] AS DECIMAL(18,2))
+        CAST([value] AS DECIMAL(18,2)),
+        [source],
+        ISNULL([count], 1),
+        CAST([min] AS DECIMAL(18,2)),
+        CAST([max] AS DECIMAL(18,2))
     FROM OPENJSON(@EventsJson)
     WITH (
-        [time] NVARCHAR(50),
+        [time] BIGINT,
         [event] NVARCHAR(50),
         [msg_id] INT,
         [msg_values] NVARCHAR(500),
-        [value] NVARCHAR(50)
+        [value] NVARCHAR(50),
+        [source] NVARCHAR(255),
+        [count] INT,
+        [min] NVARCHAR(50),
+        [max] NVARCHAR(50)
     );
     
     SELECT @@ROWCOUNT as [InsertedCount];
@@ -300,5 +364,56 @@ GO
 PRINT 'Stored procedure sp_BulkInsertTimelineEvents created successfully.';
 GO
 
+-- =============================================
+-- Table type: TimelineEventRows
+-- Stored Procedure: sp_BulkInsertTimelineEventsTvp
+-- Bulk insert of typed rows passed as a table-valued parameter (INSERT_ENGINE=tvp),
+-- without the JSON round-trip of sp_BulkInsertTimelineEvents
+-- =============================================
+IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[sp_BulkInsertTimelineEventsTvp]') AND type in (N'P', N'PC'))
+    DROP PROCEDURE [dbo].[sp_BulkInsertTimelineEventsTvp];
+GO
+
+IF TYPE_ID(N'[dbo].[TimelineEventRows]') IS NULL
+    CREATE TYPE [dbo].[TimelineEventRows] AS TABLE (
+        [EventTime] DATETIME2 NULL,
+        [EventType] NVARCHAR(50) NOT NULL,
+        [MessageId] INT NULL,
+        [MessageValues] NVARCHAR(500) NULL,
+        [Value] FLOAT NULL,
+        [Source] NVARCHAR(255) NULL,
+        [Occurrences] INT NOT NULL,
+        [MinValue] FLOAT NULL,
+        [MaxValue] FLOAT NULL
+    );
+GO
+
+CREATE PROCEDURE [dbo].[sp_BulkInsertTimelineEventsTvp]
+    @Events [dbo].[TimelineEventRows] READONLY
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    INSERT INTO [dbo].[TimelineEvents]
+        ([EventTime], [EventType], [MessageId], [MessageValues], [Value], [Source], [Occurrences], [MinValue], [MaxValue])
+    SELECT
+        [EventTime],
+        [EventType],
+        [MessageId],
+        [MessageValues],
+        CAST([Value] AS DECIMAL(18,2)),
+        [Source],
+        [Occurrences],
+        CAST([MinValue] AS DECIMAL(18,2)),
+        CAST([MaxValue] AS DECIMAL(18,2))
+    FROM @Events;
+
+    SELECT @@ROWCOUNT as [InsertedCount];
+END
+GO
+
+PRINT 'Stored procedure sp_BulkInsertTimelineEventsTvp created successfully.';
+GO
+
 PRINT 'All stored procedures created successfully.';
 GO
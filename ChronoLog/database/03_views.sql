@@ -23,8 +23,9 @@ SELECT
     te.[EventType] as [event],
     te.[MessageId] as [msg_id],
     te.[MessageValues] as [msg_values],
-    te.[Value] as [value],
+    te.[Value] / te.[Occurrences] as [value],
     m.[Template] as [template],
+    te.[Occurrences] as [occurrences],
     te.[CreatedAt]
 FROM [dbo].[TimelineEvents] te
 LEFT JOIN [dbo].[Messages] m ON te.[MessageId] = m.[MessageId];
@@ -45,12 +46,12 @@ GO
 CREATE VIEW [dbo].[vw_EventSummary]
 AS
 SELECT 
-    (SELECT COUNT(*) FROM [dbo].[TimelineEvents] WHERE [EventType] = 'error') as [error_count],
-    (SELECT COUNT(*) FROM [dbo].[TimelineEvents] WHERE [EventType] = 'warning') as [warning_count],
-    (SELECT COUNT(*) FROM [dbo].[TimelineEvents]) as [timeline_count],
+    (SELECT ISNULL(SUM([Occurrences]), 0) FROM [dbo].[TimelineEvents] WHERE [EventType] = 'error') as [error_count],
+    (SELECT ISNULL(SUM([Occurrences]), 0) FROM [dbo].[TimelineEvents] WHERE [EventType] = 'warning') as [warning_count],
+    (SELECT ISNULL(SUM(CAST([Occurrences] AS BIGINT)), 0) FROM [dbo].[TimelineEvents]) as [timeline_count],
     (SELECT COUNT(*) FROM [dbo].[Messages]) as [unique_messages],
-    (SELECT COUNT(*) FROM [dbo].[TimelineEvents] WHERE [EventType] = 'latency' AND [Value] IS NOT NULL) as [latency_count],
-    (SELECT AVG([Value]) FROM [dbo].[TimelineEvents] WHERE [EventType] = 'latency' AND [Value] IS NOT NULL) as [latency_average];
+    (SELECT ISNULL(SUM([Occurrences]), 0) FROM [dbo].[TimelineEvents] WHERE [EventType] = 'latency' AND [Value] IS NOT NULL) as [latency_count],
+    (SELECT SUM([Value]) / NULLIF(SUM([Occurrences]), 0) FROM [dbo].[TimelineEvents] WHERE [EventType] = 'latency' AND [Value] IS NOT NULL) as [latency_average];
 GO
 
 PRINT 'View vw_EventSummary created successfully.';
@@ -123,7 +124,7 @@ AS
 SELECT 
     te.[EventId],
     te.[EventTime],
-    te.[Value] as [Latency],
+    te.[Value] / te.[Occurrences] as [Latency],
     te.[CreatedAt]
 FROM [dbo].[TimelineEvents] te
 WHERE te.[EventType] = 'latency' AND te.[Value] IS NOT NULL;
@@ -117,6 +117,15 @@ def get_timeline():
                 type: number
               template:
                 type: string
+              source:
+                type: string
+              count:
+                type: integer
+                description: Events merged into this row by pre-aggregation (1 otherwise)
+              min:
+                type: number
+              max:
+                type: number
               total_count:
                 type: integer
     """
@@ -186,6 +195,50 @@ def get_messages():
     data = facade.get_messages()
     return jsonify(data)
 
+@app.route('/api/pool', methods=['GET'])
+def get_pool_stats():
+    """
+    Get database connection pool statistics of the API process
+    ---
+    tags:
+      - Dashboard
+    responses:
+      200:
+        description: Connection pool statistics
+        schema:
+          type: object
+          properties:
+            pid:
+              type: integer
+            size:
+              type: integer
+              description: Open connections, idle or in use
+            idle:
+              type: integer
+            in_use:
+              type: integer
+            min_size:
+              type: integer
+            max_size:
+              type: integer
+            created:
+              type: integer
+            reused:
+              type: integer
+            closed_idle:
+              type: integer
+              description: Connections closed after idling longer than DB_POOL_IDLE_TIMEOUT
+            broken:
+              type: integer
+              description: Connections dropped after a failed health check or a lost link
+            waits:
+              type: integer
+              description: Checkouts that had to wait for a free connection
+            timeouts:
+              type: integer
+    """
+    return jsonify(facade.get_pool_stats())
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
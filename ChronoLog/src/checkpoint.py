@@ -0,0 +1,115 @@
+import json
+import os
+import time
+from pathlib import Path
+from config import CHECKPOINT_PATH
+
+
+class OffsetTracker:
+    """
+    Tracks committed byte ranges of one input file.
+    Writers commit chunks out of order, so only the contiguous prefix
+    (the watermark) is safe to persist.
+    """
+
+    def __init__(self, start=0, inode=None, generation=0):
+        self.watermark = start
+        self.inode = inode
+        # bumped by the reader whenever the file is rotated or truncated
+        self.generation = generation
+        self.pending = {}
+
+    def commit(self, start, end):
+        """
+        Records a committed [start, end) range.
+        Returns True if the watermark advanced.
+        """
+        if end <= self.watermark:
+            return False
+        if start > self.watermark:
+            self.pending[start] = max(end, self.pending.get(start, end))
+            return False
+
+        self.watermark = end
+        while self.watermark in self.pending:
+            self.watermark = self.pending.pop(self.watermark)
+        return True
+
+
+class CheckpointStore:
+    """
+    Persists the last committed byte offset per input file, together with the
+    file's inode and size so a rotated or truncated file is not resumed mid-way.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = Path(path)
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not read checkpoint file {self.path}: {e}")
+            return {}
+
+    @staticmethod
+    def _key(file_path):
+        return str(Path(file_path).resolve())
+
+    def get(self, file_path):
+        return self.entries.get(self._key(file_path))
+
+    def resume_offset(self, file_path):
+        """
+        Returns the byte offset to resume reading from, or 0 if the file
+        has no checkpoint or no longer matches the one recorded.
+        """
+        entry = self.get(file_path)
+        if not entry:
+            return 0
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return 0
+
+        if entry.get("inode") != st.st_ino:
+            print(f"Checkpoint ignored for {file_path}: file was replaced (rotated).")
+            return 0
+        # the recorded size is never below the offset for plain files; compressed logs
+        # checkpoint offsets in the decompressed stream, so only the size is compared
+        if st.st_size < entry.get("size", 0):
+            print(f"Checkpoint ignored for {file_path}: file was truncated.")
+            return 0
+        return entry.get("offset", 0)
+
+    def update(self, file_path, offset, inode=None, size=None):
+        if inode is None or size is None:
+            st = os.stat(file_path)
+            inode = st.st_ino if inode is None else inode
+            size = st.st_size if size is None else size
+        self.entries[self._key(file_path)] = {
+            "offset": offset,
+            "inode": inode,
+            "size": size,
+            "updated": time.time(),
+        }
+
+    def reset(self, file_path):
+        self.entries.pop(self._key(file_path), None)
+
+    def save(self):
+        """
+        Atomically writes all entries: the new content is fsynced to a temp
+        file which then replaces the old one, so a crash never leaves a torn file.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
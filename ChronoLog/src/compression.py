@@ -0,0 +1,245 @@
+import bz2
+import gzip
+import io
+import lzma
+import mmap
+import os
+import struct
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for .zst logs
+    zstandard = None
+
+GZIP = "gzip"
+BZ2 = "bz2"
+XZ = "xz"
+ZSTD = "zstd"
+
+ZSTD_MAGIC = 0xFD2FB528
+ZSTD_SKIPPABLE_MIN = 0x184D2A50
+ZSTD_SKIPPABLE_MAX = 0x184D2A5F
+
+
+def detect_compression(file_path):
+    """
+    Returns the codec name of a compressed log (by magic bytes), or None for plain text.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            head = f.read(10)
+    except OSError:
+        return None
+    if head[:3] == b"\x1f\x8b\x08":
+        return GZIP
+    if head[:3] == b"BZh" and head[3:4].isdigit() and head[4:10] == b"\x31\x41\x59\x26\x53\x59":
+        return BZ2
+    if head[:6] == b"\xfd7zXZ\x00":
+        return XZ
+    if len(head) >= 4 and struct.unpack_from("<I", head)[0] == ZSTD_MAGIC:
+        return ZSTD
+    return None
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("Reading .zst logs requires the 'zstandard' package (pip install zstandard)")
+
+
+def open_decompressed(file_path, codec):
+    """
+    Opens a compressed log as a buffered binary stream of decompressed bytes.
+    Multi-member gzip, multi-stream bz2/xz and multi-frame zstd files are read to the end.
+    """
+    if codec == GZIP:
+        return gzip.open(file_path, "rb")
+    if codec == BZ2:
+        return bz2.open(file_path, "rb")
+    if codec == XZ:
+        return lzma.open(file_path, "rb")
+    if codec == ZSTD:
+        _require_zstandard()
+        raw = open(file_path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader)
+    raise ValueError(f"Unsupported compression: {codec}")
+
+
+def decompress(codec, data):
+    """
+    Decompresses a block made of one or more complete members/frames.
+    """
+    if codec == GZIP:
+        return gzip.decompress(data)
+    if codec == ZSTD:
+        _require_zstandard()
+        with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True) as reader:
+            return reader.read()
+    if codec == BZ2:
+        return bz2.decompress(data)
+    if codec == XZ:
+        return lzma.decompress(data)
+    raise ValueError(f"Unsupported compression: {codec}")
+
+
+def _bgzf_member(buf, pos):
+    """
+    Returns (size, is_empty) of the BGZF member at pos, or None if it is plain gzip.
+    BGZF stores each member's size in a 'BC' extra subfield, so members can be
+    located without decompressing anything.
+    """
+    if buf[pos:pos + 3] != b"\x1f\x8b\x08" or not buf[pos + 3] & 0x04:
+        return None
+    xlen = struct.unpack_from("<H", buf, pos + 10)[0]
+    p = pos + 12
+    end = p + xlen
+    while p + 4 <= end:
+        si1, si2, slen = buf[p], buf[p + 1], struct.unpack_from("<H", buf, p + 2)[0]
+        if si1 == 66 and si2 == 67 and slen == 2:  # 'B', 'C'
+            size = struct.unpack_from("<H", buf, p + 4)[0] + 1
+            isize = struct.unpack_from("<I", buf, pos + size - 4)[0]
+            return size, isize == 0
+        p += 4 + slen
+    return None
+
+
+def _zstd_frame(buf, pos):
+    """
+    Returns (size, is_empty) of the zstd frame at pos by walking its block headers.
+    Skippable frames carry no data and are reported as empty.
+    """
+    magic = struct.unpack_from("<I", buf, pos)[0]
+    if ZSTD_SKIPPABLE_MIN <= magic <= ZSTD_SKIPPABLE_MAX:
+        return 8 + struct.unpack_from("<I", buf, pos + 4)[0], True
+    if magic != ZSTD_MAGIC:
+        return None
+
+    fhd = buf[pos + 4]
+    fcs_flag = fhd >> 6
+    single_segment = (fhd >> 5) & 1
+    has_checksum = (fhd >> 2) & 1
+    did_size = (0, 1, 2, 4)[fhd & 3]
+    fcs_size = (single_segment, 2, 4, 8)[fcs_flag]
+    p = pos + 5 + (0 if single_segment else 1) + did_size
+
+    content_size = None
+    if fcs_size:
+        content_size = int.from_bytes(buf[p:p + fcs_size], "little") + (256 if fcs_size == 2 else 0)
+    p += fcs_size
+
+    while True:
+        header = int.from_bytes(buf[p:p + 3], "little")
+        p += 3
+        block_type = (header >> 1) & 3
+        if block_type == 3:
+            return None
+        p += 1 if block_type == 1 else header >> 3
+        if header & 1:
+            break
+    if has_checksum:
+        p += 4
+    return p - pos, content_size == 0
+
+
+def _member_at(buf, pos, codec):
+    if codec == GZIP:
+        return _bgzf_member(buf, pos)
+    if codec == ZSTD:
+        return _zstd_frame(buf, pos)
+    return None
+
+
+def member_units(file_path, codec):
+    """
+    Splits a BGZF or multi-frame zstd file into independently decompressible
+    (offset, length) units, each holding at least one byte of data (empty
+    members are merged into the following unit). Returns None when the file
+    cannot be split without decompressing it (plain gzip, bz2, xz).
+    """
+    if codec not in (GZIP, ZSTD):
+        return None
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return []
+
+    units = []
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = 0
+        unit_start = 0
+        try:
+            while pos < size:
+                member = _member_at(mm, pos, codec)
+                if member is None:
+                    return None
+                length, is_empty = member
+                pos += length
+                if not is_empty:
+                    units.append((unit_start, pos - unit_start))
+                    unit_start = pos
+        except (struct.error, IndexError):
+            # truncated or malformed header: fall back to sequential streaming
+            return None
+        if unit_start < size:
+            if units:
+                last_offset, _ = units[-1]
+                units[-1] = (last_offset, size - last_offset)
+            else:
+                units.append((0, size))
+    return units
+
+
+def group_units(units, chunk_bytes, start=0):
+    """
+    Groups consecutive units into (offset, length, prev) ranges of at least
+    `chunk_bytes` compressed bytes, beginning at the unit that starts at `start`.
+    `prev` is the unit just before the range (None for the first one); workers use
+    it to tell whether the range begins in the middle of a line.
+    """
+    index = 0
+    if start:
+        index = next((i for i, (offset, _) in enumerate(units) if offset == start), None)
+        if index is None:
+            raise ValueError(f"offset {start} is not a member boundary")
+
+    while index < len(units):
+        first = index
+        offset = units[index][0]
+        end = offset
+        while index < len(units) and end - offset < chunk_bytes:
+            end = units[index][0] + units[index][1]
+            index += 1
+        prev = units[first - 1] if first > 0 else None
+        yield offset, end - offset, prev
+
+
+def read_member_range(file_path, codec, offset, length, prev=None):
+    """
+    Decompresses one range produced by group_units and returns whole lines only.
+    A line belongs to the range its first byte is in: the partial line at the start
+    is skipped (the previous range finishes it), and the last line is completed by
+    decompressing the following members until a newline turns up.
+    """
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        starts_mid_line = False
+        if prev is not None:
+            before = decompress(codec, mm[prev[0]:prev[0] + prev[1]])
+            starts_mid_line = bool(before) and not before.endswith(b"\n")
+
+        data = decompress(codec, mm[offset:offset + length])
+        if starts_mid_line:
+            cut = data.find(b"\n")
+            data = data[cut + 1:] if cut != -1 else b""
+
+        pos = offset + length
+        while data and not data.endswith(b"\n") and pos < len(mm):
+            member = _member_at(mm, pos, codec)
+            if member is None:
+                break
+            more = decompress(codec, mm[pos:pos + member[0]])
+            pos += member[0]
+            nl = more.find(b"\n")
+            if nl != -1:
+                data += more[:nl + 1]
+                break
+            data += more
+    return data
@@ -9,16 +9,106 @@ INPUT_DIR = ROOT / "input"
 
 DEFAULT_INPUT_FILE = INPUT_DIR / "sample.log"
 
+# A single file, a directory or a glob pattern (e.g. input/*.log)
 INPUT_FILE_PATH = Path(os.getenv("INPUT_FILE_PATH", DEFAULT_INPUT_FILE))
+# Files picked up when INPUT_FILE_PATH is a directory
+INPUT_DIR_PATTERN = os.getenv("INPUT_DIR_PATTERN", "*.log")
+# Seconds between scans for new input files in live mode
+DISCOVERY_INTERVAL = float(os.getenv("DISCOVERY_INTERVAL", "5.0"))
 
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "5000"))
+CHUNK_BYTES = int(os.getenv("CHUNK_BYTES", str(4 * 1024 * 1024)))
+# Compressed bytes per parallel task for BGZF / multi-frame zstd logs
+COMPRESSED_CHUNK_BYTES = int(os.getenv("COMPRESSED_CHUNK_BYTES", str(512 * 1024)))
 QUEUE_MAX_SIZE = int(os.getenv("QUEUE_MAX_SIZE", "100"))
 POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "0.5"))
+TAIL_MODE = os.getenv("TAIL_MODE", "auto").lower()  # auto | inotify | poll
 NUM_PROCESSES = int(os.getenv("NUM_PROCESSES", "3"))
 NUM_WRITERS = int(os.getenv("NUM_WRITERS", "2"))
-WRITER_FLUSH_INTERVAL = 2.0
+# Writers collect the rows of consecutive chunks and insert them together once the batch
+# reaches WRITER_BATCH_ROWS rows or WRITER_BATCH_BYTES bytes, or WRITER_FLUSH_INTERVAL
+# seconds after its first chunk arrived
+WRITER_FLUSH_INTERVAL = float(os.getenv("WRITER_FLUSH_INTERVAL", "2.0"))
+WRITER_BATCH_ROWS = int(os.getenv("WRITER_BATCH_ROWS", "50000"))
+WRITER_BATCH_BYTES = int(os.getenv("WRITER_BATCH_BYTES", str(8 * 1024 * 1024)))
+# How writers send rows to the database: json (one JSON document parsed by OPENJSON),
+# executemany (typed parameter arrays, pyodbc fast_executemany) or tvp (table-valued parameter)
+INSERT_ENGINE = os.getenv("INSERT_ENGINE", "json").lower()
+# Template -> message id entries cached. With SHARED_MSG_CACHE one table in shared memory
+# serves all writers (least recently used entries are replaced, per set of MSG_CACHE_WAYS);
+# otherwise each writer keeps its own cache, cleared when full
+MSG_CACHE_SIZE = int(os.getenv("MSG_CACHE_SIZE", "10000"))
+SHARED_MSG_CACHE = os.getenv("SHARED_MSG_CACHE", "true").lower() in ("1", "true", "yes")
+MSG_CACHE_WAYS = int(os.getenv("MSG_CACHE_WAYS", "8"))
 QUEUE_PUT_TIMEOUT = 1.0
+# Work dispatched to the parsers but not yet handed to the writers (0 = no limit)
+MAX_IN_FLIGHT_CHUNKS = int(os.getenv("MAX_IN_FLIGHT_CHUNKS", "16"))
+MAX_IN_FLIGHT_BYTES = int(os.getenv("MAX_IN_FLIGHT_BYTES", str(64 * 1024 * 1024)))
+# Seconds between in-flight / queue depth reports (0 disables them)
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", "10.0"))
+
+# Chunks and parse results travel through shared memory slots; only descriptors are pickled.
+# The default 48 MiB fits Docker's 64 MiB /dev/shm; if /dev/shm has less room the
+# transport is disabled at startup
+SHM_TRANSPORT = os.getenv("SHM_TRANSPORT", "true").lower() in ("1", "true", "yes")
+SHM_SLOTS = int(os.getenv("SHM_SLOTS", "6"))
+SHM_SLOT_BYTES = int(os.getenv("SHM_SLOT_BYTES", str(8 * 1024 * 1024)))
+
+STATE_DIR = ROOT / "state"
+CHECKPOINT_ENABLED = os.getenv("CHECKPOINT_ENABLED", "true").lower() in ("1", "true", "yes")
+CHECKPOINT_PATH = Path(os.getenv("CHECKPOINT_PATH") or STATE_DIR / "checkpoints.json")
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", "1.0"))
+# A failed insert is retried WRITER_RETRIES times, WRITER_RETRY_DELAY seconds apart (doubled
+# after each attempt); a batch that still fails is saved to DEAD_LETTER_DIR and its chunks
+# are acknowledged, so checkpoints move on
+WRITER_RETRIES = int(os.getenv("WRITER_RETRIES", "3"))
+WRITER_RETRY_DELAY = float(os.getenv("WRITER_RETRY_DELAY", "1.0"))
+DEAD_LETTER_DIR = Path(os.getenv("DEAD_LETTER_DIR") or STATE_DIR / "dead_letter")
+
+# Input format: auto (detected per file from its first lines), default, jsonl, logfmt, syslog or nginx
+LOG_FORMAT = os.getenv("LOG_FORMAT", "auto").lower()
+
+# Extra strptime formats for line timestamps, separated by ";" (e.g. "%d/%m/%Y %H:%M:%S;%b %d %H:%M:%S")
+# YYYY-MM-DD HH:MM:SS and YYYY-MM-DDTHH:MM:SS are always recognised, with an optional Z/+HH:MM zone.
+# Formats are matched against a prefix of fixed width, so variable-width directives
+# (%A, %B, %p, %z, %Z) are rejected at startup
+TIMESTAMP_FORMATS = [f for f in os.getenv("TIMESTAMP_FORMATS", "").split(";") if f.strip()]
 
 TRACK_VARIABLES = [v.strip() for v in os.getenv("TRACK_VARIABLES", "").split(",") if v.strip()]
-VAR_REGEX = {var: re.compile(rf"\b{re.escape(var)}=(\d+)\b") for var in TRACK_VARIABLES} if TRACK_VARIABLES else None
-KEY_VAL_RE = re.compile(r"\b([a-zA-Z_][a-zA-Z0-9_]*)=(\d+)\b")
\ No newline at end of file
+# Ingest rules, applied before a line is parsed (see ingest_rules.py):
+# lines must match INCLUDE_PATTERN (if set) and not EXCLUDE_PATTERN (regexes)
+INCLUDE_PATTERN = os.getenv("INCLUDE_PATTERN", "")
+EXCLUDE_PATTERN = os.getenv("EXCLUDE_PATTERN", "")
+# Drop lines without a level at least this severe: warning or error (empty keeps everything)
+MIN_LEVEL = os.getenv("MIN_LEVEL", "").strip().lower()
+# Share of events kept per event type, e.g. "latency:0.1,warning:0.5"
+SAMPLE_RATES = {
+    event.strip(): float(rate)
+    for event, _, rate in (item.partition(":") for item in os.getenv("SAMPLE_RATES", "").split(","))
+    if event.strip() and rate.strip()
+}
+# Pre-aggregation: merge identical events within buckets of this many seconds into one row
+# with an occurrence count (metrics: sum/min/max); 0 writes every event as its own row
+AGGREGATE_BUCKET = int(os.getenv("AGGREGATE_BUCKET", "0"))
+# Multi-line records (stack traces, wrapped messages) in the default format: a line that does
+# not start with MULTILINE_START (a regex) is appended to the record before it, and chunks are
+# only cut where a record starts
+MULTILINE = os.getenv("MULTILINE", "false").lower() in ("1", "true", "yes")
+MULTILINE_START = os.getenv("MULTILINE_START", r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}")
+# Parse metric lines of the default format a whole chunk at a time with NumPy, when it is
+# installed and TRACK_VARIABLES is set
+VECTOR_PARSING = os.getenv("VECTOR_PARSING", "true").lower() in ("1", "true", "yes")
+# Level tokens and their timeline event names
+LEVEL_EVENTS = {"ERROR": "error", "WARNING": "warning"}
+# Single pass per line: a level token, or a key=value pair (tracked variables are picked by name)
+LINE_RE = re.compile(r"\b(?:(ERROR|WARNING)\b|([a-zA-Z_][a-zA-Z0-9_]*)=(\d+)\b)")
+
+# Message templating: a Drain-style miner that masks ids, IPs, paths and quoted strings
+# and merges similar messages (false -> only numbers become {num})
+TEMPLATE_MINER = os.getenv("TEMPLATE_MINER", "true").lower() in ("1", "true", "yes")
+TEMPLATE_DEPTH = int(os.getenv("TEMPLATE_DEPTH", "4"))
+# Share of equal tokens needed to merge a message into an existing template
+TEMPLATE_SIMILARITY = float(os.getenv("TEMPLATE_SIMILARITY", "0.5"))
+TEMPLATE_MAX_CHILDREN = int(os.getenv("TEMPLATE_MAX_CHILDREN", "100"))
+# Templates kept per parser worker; the least recently used is dropped beyond this
+TEMPLATE_MAX_CLUSTERS = int(os.getenv("TEMPLATE_MAX_CLUSTERS", "1000"))
\ No newline at end of file
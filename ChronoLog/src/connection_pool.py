@@ -0,0 +1,146 @@
+import threading
+import time
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of open database connections for one process.
+
+    `connect()` opens a new connection and `ping(conn)` raises if it is no longer
+    usable. Connections are handed out most recently used first; those idle longer
+    than `ping_interval` are pinged on checkout and replaced if the ping fails, and
+    those idle longer than `idle_timeout` are closed (the pool never shrinks below
+    `min_size` that way). At most `max_size` connections are open at a time; a
+    checkout waits up to `timeout` seconds for one to be returned.
+    """
+
+    def __init__(self, connect, ping, min_size=1, max_size=8, idle_timeout=300.0, ping_interval=30.0, timeout=30.0):
+        self._connect = connect
+        self._ping = ping
+        self.min_size = max(min_size, 0)
+        self.max_size = max(max_size, 1, self.min_size)
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        # (connection, time it was returned), most recently returned last
+        self._idle = []
+        # open connections, idle or checked out
+        self._size = 0
+        self._closed = False
+        self.counters = dict.fromkeys(("created", "reused", "closed_idle", "broken", "waits", "timeouts"), 0)
+        for _ in range(self.min_size):
+            self._idle.append((self._open(), time.monotonic()))
+
+    def _open(self):
+        with self._cond:
+            self._size += 1
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.counters["created"] += 1
+        return conn
+
+    def acquire(self):
+        """
+        Checks out a healthy connection; raises TimeoutError if none becomes free in time.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                self._evict_idle()
+                waited = False
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if not waited:
+                        self.counters["waits"] += 1
+                        waited = True
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        self.counters["timeouts"] += 1
+                        raise TimeoutError(f"No database connection became free within {self.timeout}s")
+                if not self._idle:
+                    conn = None
+                else:
+                    conn, returned = self._idle.pop()
+            if conn is None:
+                return self._open()
+            if time.monotonic() - returned < self.ping_interval or self._healthy(conn):
+                with self._cond:
+                    self.counters["reused"] += 1
+                return conn
+            self.discard(conn)
+
+    def _healthy(self, conn):
+        try:
+            self._ping(conn)
+            return True
+        except Exception:
+            return False
+
+    def release(self, conn):
+        """
+        Returns a connection that is still usable to the pool.
+        """
+        with self._cond:
+            if not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self.discard(conn, broken=False)
+
+    def discard(self, conn, broken=True):
+        """
+        Closes a connection instead of returning it, e.g. after a lost link.
+        """
+        with self._cond:
+            self._size -= 1
+            if broken:
+                self.counters["broken"] += 1
+            self._cond.notify()
+        self._close(conn)
+
+    def _evict_idle(self):
+        # called with the lock held; the oldest idle connections are at the front
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.pop(0)
+            self._size -= 1
+            self.counters["closed_idle"] += 1
+            self._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """
+        Closes the idle connections; connections still checked out are closed when returned.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                **self.counters,
+            }
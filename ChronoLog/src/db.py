@@ -1,20 +1,60 @@
 import pyodbc
 import os
+import threading
 from dotenv import load_dotenv
+from connection_pool import ConnectionPool
 
 load_dotenv()
 
+# Guards creating a process's connection pool
+_POOL_LOCK = threading.Lock()
+
+
 class DatabaseConnectionError(Exception):
     pass
 
+
+def is_disconnect(error):
+    """
+    True if a pyodbc error means the connection itself is gone (SQLSTATE class 08,
+    e.g. 08S01 communication link failure), not that the statement failed.
+    """
+    return bool(error.args) and str(error.args[0]).startswith("08")
+
+
+def _ping(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1").fetchall()
+    finally:
+        cursor.close()
+
+
 class SQLConnection:
     def __init__(self):
         self.connection_string = os.getenv("DB_CONNECTION_STRING")
         if not self.connection_string:
             raise ValueError("DB_CONNECTION_STRING environment variable not set")
-        
+
+        # Connections are pooled per process (see pool()); the settings are shared
+        self.pool_settings = {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "8")),
+            "idle_timeout": float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+            "ping_interval": float(os.getenv("DB_POOL_PING_INTERVAL", "30")),
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        }
+        self._pool = None
+        self._pool_pid = None
+
         self._ensure_database_exists()
 
+    def __getstate__(self):
+        # open connections cannot cross a process boundary; the new process makes its own pool
+        state = self.__dict__.copy()
+        state["_pool"] = state["_pool_pid"] = None
+        return state
+
     def _ensure_database_exists(self):
         """
         Parses the connection string to find the target database,
@@ -54,39 +94,127 @@ class SQLConnection:
         except pyodbc.Error as e:
             raise DatabaseConnectionError(f"Failed to connect to database: {e}")
 
-    def execute_query(self, query, params=None):
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def pool(self):
+        """
+        Returns this process's connection pool, creating it on first use. A pool
+        inherited from the parent process is never used, its connections belong there.
+        """
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with _POOL_LOCK:
+                if self._pool is None or self._pool_pid != pid:
+                    self._pool = ConnectionPool(self.get_connection, _ping, **self.pool_settings)
+                    self._pool_pid = pid
+        return self._pool
+
+    def pool_stats(self):
+        """
+        Connection counts of this process's pool, plus how often connections were
+        created, reused, closed after idling or found broken, and checkout waits/timeouts.
+        """
+        if self._pool is None or self._pool_pid != os.getpid():
+            return {"pid": os.getpid(), "size": 0}
+        return {"pid": self._pool_pid, **self._pool.stats()}
+
+    def close(self):
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.close()
+        self._pool = self._pool_pid = None
+
+    def _run(self, work, commit):
+        """
+        Runs work(cursor) on a pooled connection and commits (or, for queries, rolls
+        back) before the connection goes back to the pool. If the connection turns out
+        to be broken before anything was committed, the work is retried once on a new one.
+        """
+        pool = self.pool()
+        for attempt in (1, 2):
+            try:
+                conn = pool.acquire()
+            except TimeoutError as e:
+                raise DatabaseConnectionError(str(e))
+            try:
+                cursor = conn.cursor()
+                try:
+                    result = work(cursor)
+                finally:
+                    self._close_cursor(cursor)
+            except pyodbc.Error as e:
+                if not is_disconnect(e):
+                    self._give_back(pool, conn)
+                    raise
+                pool.discard(conn)
+                if attempt == 2:
+                    raise DatabaseConnectionError(f"Lost connection to database: {e}")
+                print(f"Database connection lost ({e}), retrying on a new connection.")
+                continue
+            except BaseException:
+                self._give_back(pool, conn)
+                raise
+
+            try:
+                if commit:
+                    conn.commit()
+                else:
+                    conn.rollback()
+            except pyodbc.Error as e:
+                pool.discard(conn)
+                if is_disconnect(e):
+                    # the commit may or may not have gone through, so it is not retried
+                    raise DatabaseConnectionError(f"Lost connection to database: {e}")
+                raise
+            pool.release(conn)
+            return result
+
+    @staticmethod
+    def _close_cursor(cursor):
         try:
+            cursor.close()
+        except pyodbc.Error:
+            pass
+
+    @staticmethod
+    def _give_back(pool, conn):
+        # a failed statement must not leave a transaction open on a pooled connection
+        try:
+            conn.rollback()
+        except pyodbc.Error:
+            pool.discard(conn)
+        else:
+            pool.release(conn)
+
+    def execute_query(self, query, params=None):
+        def work(cursor):
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
             return cursor.fetchall()
-        finally:
-            cursor.close()
-            conn.close()
+        return self._run(work, commit=False)
 
     def execute_non_query(self, query, params=None):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
+        def work(cursor):
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
-            conn.commit()
-        finally:
-            cursor.close()
-            conn.close()
+        self._run(work, commit=True)
+
+    def execute_many(self, query, rows):
+        """
+        Executes a statement once per row of parameters. The rows are sent to the
+        server as parameter arrays (fast_executemany) instead of one round-trip each.
+        """
+        def work(cursor):
+            cursor.fast_executemany = True
+            cursor.executemany(query, rows)
+        self._run(work, commit=True)
 
     def execute_sp(self, sp_name, params=None):
         """
         Executes a stored procedure.
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
+        def work(cursor):
             if params:
                 placeholders = ",".join(["?"] * len(params))
                 sql = f"{{CALL {sp_name} ({placeholders})}}"
@@ -94,14 +222,8 @@ class SQLConnection:
             else:
                 sql = f"{{CALL {sp_name}}}"
                 cursor.execute(sql)
-            
+
             if cursor.description:
-                result = cursor.fetchall()
-                conn.commit()
-                return result
-            
-            conn.commit()
+                return cursor.fetchall()
             return None
-        finally:
-            cursor.close()
-            conn.close()
+        return self._run(work, commit=True)
@@ -0,0 +1,176 @@
+import math
+from array import array
+
+# Stored in `times` for lines without a recognisable timestamp
+NO_TIME = -(2 ** 63)
+# Stored in `template_ids` for metric events, which carry a value instead of a message
+NO_TEMPLATE = -1
+
+
+
+def _plain(v):
+    # integral floats come back as ints, as they were parsed
+    return int(v) if v.is_integer() else v
+
+
+class EventBatch:
+    """
+    Columnar container for the events parsed from one chunk, passed from the
+    parser workers to the writers. Each event is one position in a set of
+    parallel arrays; event names and message templates are stored once per
+    batch and referenced by index, so a batch pickles to a few flat buffers
+    instead of one dict per event.
+    """
+    __slots__ = (
+        "source", "times", "event_codes", "event_names", "values",
+        "template_ids", "templates", "msg_values", "counts", "mins", "maxs",
+        "_event_index", "_template_index",
+    )
+
+    def __init__(self, source=None):
+        # input file the events came from (the same for the whole chunk)
+        self.source = source
+        self.times = array("q")
+        self.event_codes = array("H")
+        self.event_names = []
+        # NaN where the event has no value
+        self.values = array("d")
+        self.template_ids = array("i")
+        self.templates = []
+        # JSON array of the numbers taken out of the message, or None
+        self.msg_values = []
+        # set by aggregated(): events merged into each row, and min/max of metric values
+        # (values then hold the sum); None for batches of single events
+        self.counts = None
+        self.mins = None
+        self.maxs = None
+        self._event_index = {}
+        self._template_index = {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def add(self, time, event, value=None, template=None, msg_values=None):
+        self.times.append(NO_TIME if time is None else time)
+        self.event_codes.append(self._intern(event, self.event_names, self._event_index))
+        self.values.append(math.nan if value is None else value)
+        if template is None:
+            self.template_ids.append(NO_TEMPLATE)
+        else:
+            self.template_ids.append(self._intern(template, self.templates, self._template_index))
+        self.msg_values.append(msg_values)
+
+    def add_metrics(self, times, event, values):
+        """
+        Appends one metric event per position of `times` and `values`, given as
+        native int64 and float64 buffers (e.g. NumPy arrays); they are copied in
+        whole, without a Python-level loop.
+        """
+        count = len(times)
+        self.times.frombytes(memoryview(times).cast("B"))
+        self.event_codes.extend(array("H", [self._intern(event, self.event_names, self._event_index)]) * count)
+        self.values.frombytes(memoryview(values).cast("B"))
+        self.template_ids.extend(array("i", [NO_TEMPLATE]) * count)
+        self.msg_values.extend([None] * count)
+
+    def aggregated(self, bucket):
+        """
+        Returns a batch where identical events within the same `bucket` seconds are
+        merged into one row: level events with the same template and values, and all
+        values of a metric. Rows are timed at the start of their bucket and carry
+        the number of merged events; metric rows hold the sum, min and max.
+        """
+        out = EventBatch(self.source)
+        out.event_names = list(self.event_names)
+        out.templates = list(self.templates)
+        out._event_index = dict(self._event_index)
+        out._template_index = dict(self._template_index)
+        out.counts = array("I")
+        out.mins = array("d")
+        out.maxs = array("d")
+        rows = {}
+        for time, code, value, tmpl, msg_values in zip(
+                self.times, self.event_codes, self.values, self.template_ids, self.msg_values):
+            if time != NO_TIME:
+                time -= time % bucket
+            key = (time, code, tmpl, msg_values)
+            row = rows.get(key)
+            if row is None:
+                rows[key] = len(out.times)
+                out.times.append(time)
+                out.event_codes.append(code)
+                out.values.append(value)
+                out.template_ids.append(tmpl)
+                out.msg_values.append(msg_values)
+                out.counts.append(1)
+                out.mins.append(value)
+                out.maxs.append(value)
+            else:
+                out.counts[row] += 1
+                if value == value:  # not NaN
+                    out.values[row] += value
+                    if value < out.mins[row]:
+                        out.mins[row] = value
+                    if value > out.maxs[row]:
+                        out.maxs[row] = value
+        return out
+
+    def count_at(self, i):
+        return 1 if self.counts is None else self.counts[i]
+
+    @staticmethod
+    def _intern(key, table, index):
+        code = index.get(key)
+        if code is None:
+            code = index[key] = len(table)
+            table.append(key)
+        return code
+
+    def time_at(self, i):
+        t = self.times[i]
+        return None if t == NO_TIME else t
+
+    def value_at(self, i):
+        v = self.values[i]
+        if v != v:  # NaN
+            return None
+        return _plain(v)
+
+    def template_at(self, i):
+        t = self.template_ids[i]
+        return None if t == NO_TEMPLATE else self.templates[t]
+
+    def rows(self):
+        """
+        Yields the events as timeline dicts (time, event, value or template and
+        msg_values, source; count, min and max for aggregated batches), e.g. for
+        tests and debugging.
+        """
+        for i in range(len(self)):
+            row = {"time": self.time_at(i), "event": self.event_names[self.event_codes[i]]}
+            value = self.value_at(i)
+            if value is not None:
+                row["value"] = value
+                if self.counts is not None:
+                    row["min"], row["max"] = _plain(self.mins[i]), _plain(self.maxs[i])
+            else:
+                row["template"] = self.template_at(i)
+                row["msg_values"] = self.msg_values[i]
+            if self.counts is not None:
+                row["count"] = self.counts[i]
+            if self.source is not None:
+                row["source"] = self.source
+            yield row
+
+    def __getstate__(self):
+        # the interning indexes are only needed while the batch is being filled
+        return (self.source, self.times, self.event_codes, self.event_names,
+                self.values, self.template_ids, self.templates, self.msg_values,
+                self.counts, self.mins, self.maxs)
+
+    def __setstate__(self, state):
+        (self.source, self.times, self.event_codes, self.event_names,
+         self.values, self.template_ids, self.templates, self.msg_values,
+         self.counts, self.mins, self.maxs) = state
+        self._event_index = {name: i for i, name in enumerate(self.event_names)}
+        self._template_index = {tmpl: i for i, tmpl in enumerate(self.templates)}
@@ -1,6 +1,16 @@
 import json
 from db import SQLConnection
 
+# Ways to bulk insert timeline rows (INSERT_ENGINE)
+INSERT_ENGINES = ("json", "executemany", "tvp")
+# Order of the values in the rows passed to bulk_insert_timeline_rows
+TIMELINE_COLUMNS = ("EventTime", "EventType", "MessageId", "MessageValues", "Value", "Source",
+                    "Occurrences", "MinValue", "MaxValue")
+INSERT_TIMELINE_SQL = (
+    f"INSERT INTO TimelineEvents ({', '.join(TIMELINE_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(TIMELINE_COLUMNS))})"
+)
+
 class ChronoLogFacade:
     def __init__(self):
         self.db = SQLConnection()
@@ -13,6 +23,18 @@ class ChronoLogFacade:
         rows = self.db.execute_query("SELECT MessageId, Template FROM Messages")
         return {str(row.MessageId): row.Template for row in rows}
 
+    def get_pool_stats(self):
+        """
+        Statistics of the database connection pool of the calling process.
+        """
+        return self.db.pool_stats()
+
+    def close(self):
+        """
+        Closes the pooled database connections of the calling process.
+        """
+        self.db.close()
+
     def get_or_create_message_id(self, template):
         """
         Gets existing message ID or creates a new one.
@@ -22,7 +44,18 @@ class ChronoLogFacade:
             return rows[0].MessageId
         return None
 
-    def insert_timeline_event(self, event_time, event_type, message_id=None, message_values=None, value=None):
+    def get_or_create_message_ids(self, templates):
+        """
+        Gets or creates the IDs of many templates in one call.
+        Returns a dict {template: id}.
+        """
+        if not templates:
+            return {}
+        templates = list(templates)
+        rows = self.db.execute_sp("sp_GetOrInsertMessages", (json.dumps(templates),))
+        return {templates[row.Index]: row.MessageId for row in rows or []}
+
+    def insert_timeline_event(self, event_time, event_type, message_id=None, message_values=None, value=None, source=None):
         """
         Inserts a timeline event.
         message_values should be a list of strings/numbers, which will be converted to JSON.
@@ -37,21 +70,45 @@ class ChronoLogFacade:
             event_type, 
             message_id, 
             msg_values_json, 
-            val
+            val,
+            source
         ))
 
     def bulk_insert_timeline_events(self, events):
         """
         Bulk inserts timeline events.
-        events: list of dicts with keys: time, event, msg_id, msg_values, value
+        events: list of dicts with keys: time (epoch seconds), event, msg_id, msg_values, value, source,
+        and for pre-aggregated rows count, min, max (value is then the sum)
         """
         if not events:
             return
             
         # Convert list of dicts to JSON string
-        events_json = json.dumps(events)
+        self.bulk_insert_timeline_json(json.dumps(events))
+
+    def bulk_insert_timeline_json(self, events_json):
+        """
+        Bulk inserts timeline events already encoded as a JSON array of the
+        dicts described in bulk_insert_timeline_events.
+        """
         self.db.execute_sp("sp_BulkInsertTimelineEvents", (events_json,))
 
+    def bulk_insert_timeline_rows(self, rows, engine="executemany"):
+        """
+        Bulk inserts timeline events given as tuples in TIMELINE_COLUMNS order
+        (EventTime as datetime, numbers as numbers, MessageValues as a JSON string),
+        so nothing is serialized to JSON and parsed again on the server.
+        engine "executemany" sends them as parameter arrays, "tvp" as one
+        table-valued parameter of sp_BulkInsertTimelineEventsTvp.
+        """
+        if not rows:
+            return
+
+        if engine == "tvp":
+            self.db.execute_sp("sp_BulkInsertTimelineEventsTvp", (rows,))
+        else:
+            self.db.execute_many(INSERT_TIMELINE_SQL, rows)
+
     def get_timeline_page(self, page=1, per_page=30, event_type=None):
         """
         Retrieves a page of timeline events.
@@ -62,7 +119,8 @@ class ChronoLogFacade:
             return []
         
         # Convert rows to dicts
-        # Columns: EventId, time, event, msg_id, msg_values, value, template, TotalCount
+        # Columns: EventId, time, event, msg_id, msg_values, value, template, source,
+        # occurrences, min_value, max_value, TotalCount
         result = []
         for row in rows:
             result.append({
@@ -73,6 +131,11 @@ class ChronoLogFacade:
                 "msg_values": json.loads(row.msg_values) if row.msg_values else None,
                 "value": float(row.value) if row.value is not None else None,
                 "template": row.template,
+                "source": row.source,
+                # events merged into this row (value is their mean, min/max their range)
+                "count": row.occurrences,
+                "min": float(row.min_value) if row.min_value is not None else None,
+                "max": float(row.max_value) if row.max_value is not None else None,
                 "total_count": row.TotalCount
             })
         return result
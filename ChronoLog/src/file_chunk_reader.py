@@ -1,38 +1,378 @@
-﻿import time
+﻿import glob
+import mmap
+import os
+import re
 from pathlib import Path
-from config import CHUNK_SIZE, POLL_INTERVAL
+from config import CHUNK_SIZE, CHUNK_BYTES, COMPRESSED_CHUNK_BYTES, POLL_INTERVAL, TAIL_MODE, INPUT_DIR_PATTERN, MULTILINE, MULTILINE_START
+from compression import detect_compression, open_decompressed, member_units, group_units, read_member_range
+from file_watcher import create_watcher
+from log_parser import DETECT_SAMPLE_LINES
+
+# Bytes read from the start of a file to sample its first lines
+SAMPLE_BYTES = 64 * 1024
+# In multi-line mode a chunk is extended by at most this much to reach the next record start,
+# so a file without any record starts is still split into chunks
+MAX_RECORD_BYTES = 1024 * 1024
+
+
+def _glob_base(pattern):
+    """
+    Returns the directory part of a glob pattern that contains no wildcards.
+    """
+    base = Path(pattern)
+    while glob.has_magic(str(base)):
+        base = base.parent
+    return base
+
+
+def resolve_input_files(input_path, dir_pattern=INPUT_DIR_PATTERN):
+    """
+    Expands INPUT_FILE_PATH into a sorted list of (path, source) pairs.
+    input_path may be a single file, a directory (matched against dir_pattern)
+    or a glob pattern. `source` identifies the file relative to the input root.
+    """
+    input_path = Path(input_path)
+    if input_path.is_dir():
+        base = input_path
+        files = [p for p in input_path.glob(dir_pattern) if p.is_file()]
+    elif glob.has_magic(str(input_path)):
+        base = _glob_base(input_path)
+        files = [Path(p) for p in glob.glob(str(input_path), recursive=True) if os.path.isfile(p)]
+    else:
+        return [(input_path, input_path.name)]
+
+    return [(p, p.relative_to(base).as_posix()) for p in sorted(files)]
+
+
+def find_range_end(buf, start, size, chunk_bytes, record_start=None):
+    """
+    Returns the end (exclusive) of the newline-aligned byte range that starts at `start`.
+    The range covers at least `chunk_bytes` (unless EOF comes first) and always ends
+    right after a newline or at EOF, so no line is ever split between two ranges.
+    With a `record_start` regex the range is extended to the next line matching it,
+    so multi-line records are not split either and workers can parse ranges independently.
+    """
+    end = start + max(chunk_bytes, 1)
+    if end >= size:
+        return size
+    nl = buf.find(b"\n", end - 1)
+    if record_start is not None:
+        while nl != -1 and nl + 1 < size and not record_start.match(buf, nl + 1):
+            if nl - end > MAX_RECORD_BYTES:
+                break
+            nl = buf.find(b"\n", nl + 1)
+    return size if nl == -1 else nl + 1
+
+
+def last_record_start(data, record_start):
+    """
+    Returns the offset of the last line in a newline-aligned block that matches
+    `record_start`, or 0 if no line after the first one does.
+    """
+    nl = data.rfind(b"\n", 0, len(data) - 1)
+    while nl != -1:
+        if record_start.match(data, nl + 1):
+            return nl + 1
+        nl = data.rfind(b"\n", 0, nl)
+    return 0
+
+
+def decode_lines(data):
+    """
+    Decodes a newline-aligned block of raw bytes into a list of lines.
+    Decoding the whole block at once is far cheaper than decoding line by line.
+    """
+    if not data:
+        return []
+    # str() also accepts memoryviews, e.g. of a shared memory slot
+    lines = str(data, "utf-8", errors="replace").split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def read_byte_range(file_path, offset, length, codec=None, prev=None, raw=False):
+    """
+    Reads and decodes one range produced by FileChunkReader.byte_ranges.
+    Used by parser workers so each of them reads its own part of the file.
+    For compressed logs the range is a group of members that is decompressed here.
+    raw=True returns the (decompressed) bytes instead of lines.
+    """
+    if codec:
+        data = read_member_range(file_path, codec, offset, length, prev)
+    else:
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+    return data if raw else decode_lines(data)
+
 
 class FileChunkReader:
-    def __init__(self, file_path, chunk_size=CHUNK_SIZE, poll_interval=POLL_INTERVAL, live=True):
+    def __init__(self, file_path, chunk_size=CHUNK_SIZE, poll_interval=POLL_INTERVAL, live=True, chunk_bytes=CHUNK_BYTES, start_offset=0, tail_mode=TAIL_MODE, source=None, raw=False, multiline=MULTILINE):
         self.file_path = Path(file_path).resolve()
+        # identifier events from this file are tagged with
+        self.source = source or self.file_path.name
+        # codec name for compressed logs (gzip, bz2, xz, zstd), None for plain text
+        self.compression = detect_compression(self.file_path)
         self.chunk_size = chunk_size
+        self.chunk_bytes = chunk_bytes
         self.poll_interval = poll_interval
+        self.tail_mode = tail_mode
         self.eof_reached = False
         self.live = live
+        # yield undecoded bytes instead of lines (for handing chunks to workers as-is)
+        self.raw = raw
+        # FORMATS name the chunks are parsed with; None lets the parser decide
+        self.log_format = None
+        # cut chunks only where a multi-line record starts (see record_start)
+        self.multiline = multiline
+        self._record_start = re.compile(MULTILINE_START.encode()) if multiline else None
+        # size of a trailing record held back while tailing, in case more of it is still coming
+        self._held = None
+        # byte offset of the next unread line, and the (start, end) range of the last yielded chunk
+        self.offset = start_offset
+        self.chunk_range = None
+        # identity of the file being tailed; generation changes on every rotation or truncation
+        self.inode = None
+        self.generation = 0
+
+    @property
+    def record_start(self):
+        """
+        Bytes regex matching the start of a record, or None if chunks may be cut at any
+        line. Records are only assembled for the default format.
+        """
+        return self._record_start if self.log_format in (None, "default") else None
 
     def __iter__(self):
-        with open(self.file_path, "r", encoding="utf-8", errors="replace") as f:
+        if self.compression:
+            # compressed archives are never appended to, so they are streamed once in either mode
+            yield from self._iter_compressed()
+            return
+
+        if not self.live:
+            # batch mode: split the file into byte ranges and decode each range in one go
+            yield from self._iter_batch()
+            return
+
+        # the watcher is armed before the first read so no write can slip by unnoticed
+        watcher = create_watcher(self.file_path, self.tail_mode, self.poll_interval)
+        try:
+            yield from self._tail(watcher)
+        finally:
+            watcher.close()
+
+    def _tail(self, watcher):
+        f = self._open_live()
+        try:
             while True:
-                chunk = self._read_chunk(f)
-                if chunk:
+                raw = self._read_chunk(f)
+                if raw and not raw[-1].endswith(b"\n"):
+                    # the writer is still in the middle of this line; pick it up on the next pass
+                    f.seek(-len(raw[-1]), os.SEEK_CUR)
+                    raw.pop()
+                data = self._hold_partial_record(f, raw)
+                if data:
                     # new data available
-                    yield chunk
+                    yield self._take(data)
                     self.eof_reached = False
-                else:
-                    # no new data
-                    if not self.eof_reached:
-                        self.eof_reached = True
-                        if self.live:
-                            print("Reading completed.")
-                        else:
-                            # batch mode: stop iteration and let caller finish processing
-                            return
-                    if self.live:
-                        time.sleep(self.poll_interval)
+                    continue
+
+                # no new data: before waiting, make sure we are still reading the right file
+                rotation = self._check_rotation(f)
+                if rotation == "truncated":
+                    print(f"{self.file_path} was truncated, reading from the start.")
+                    f.seek(0)
+                    self.offset = 0
+                    self._held = None
+                    self.generation += 1
+                    continue
+                if rotation == "renamed":
+                    # drain whatever is left in the rotated file, including an unterminated last line
+                    rest = f.read()
+                    if rest:
+                        yield self._take(rest)
+                    f.close()
+                    self._held = None
+                    print(f"{self.file_path} was rotated, switching to the new file.")
+                    self.offset = 0
+                    f = self._open_live()
+                    self.generation += 1
+                    watcher.rewatch()
+                    continue
+                if rotation == "pending":
+                    # a new file exists but is still empty: also wake up when it gets written
+                    watcher.rewatch()
+
+                if not self.eof_reached:
+                    self.eof_reached = True
+                    print("Reading completed.")
+                # sleeps until the file changes (inotify) or the poll interval passes;
+                # a held back record is given one poll interval to be continued
+                watcher.wait(self.poll_interval if self._held is not None else None)
+        finally:
+            f.close()
+
+    def _hold_partial_record(self, f, raw):
+        """
+        Returns the complete records among the lines just read. In multi-line mode the
+        last record may still be growing, so it is left in the file for the next pass;
+        it is released once a new record follows it, when the chunk is full, or when a
+        pass finds nothing new to append to it.
+        """
+        data = b"".join(raw)
+        record_start = self.record_start
+        if not data or record_start is None:
+            self._held = None
+            return data
+        cut = last_record_start(data, record_start)
+        if cut == 0:
+            if len(raw) >= self.chunk_size or self._held == len(data):
+                self._held = None
+                return data
+            # a lone record that may still be growing: wait one pass for more of it
+            self._held = len(data)
+        else:
+            self._held = None
+        f.seek(cut - len(data), os.SEEK_CUR)
+        return data[:cut]
+
+    def _open_live(self):
+        f = open(self.file_path, "rb")
+        self.inode = os.fstat(f.fileno()).st_ino
+        f.seek(self.offset)
+        return f
+
+    def _take(self, data):
+        self.chunk_range = (self.offset, self.offset + len(data))
+        self.offset += len(data)
+        return data if self.raw else decode_lines(data)
+
+    def _check_rotation(self, f):
+        """
+        Returns "renamed" if the path now points to a new, non-empty file (rename rotation),
+        "pending" if that new file is still empty, "truncated" if the open file shrank
+        below our offset (copytruncate), otherwise None.
+        """
+        current = os.fstat(f.fileno())
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            # rotated away and the new file does not exist yet; keep draining the old one
+            return None
+        if (st.st_ino, st.st_dev) != (current.st_ino, current.st_dev):
+            # switch only once the application has started writing to the new file
+            return "renamed" if st.st_size > 0 else "pending"
+        if current.st_size < self.offset:
+            return "truncated"
+        return None
+
+    def _iter_compressed(self):
+        """
+        Stream-decompresses the file and yields chunks of whole lines; offsets are
+        positions in the decompressed stream, so nothing is ever written to disk.
+        """
+        with open_decompressed(self.file_path, self.compression) as stream:
+            skip = self.offset
+            while skip > 0:
+                # resuming: decompress and discard what was already committed
+                skipped = len(stream.read(min(skip, self.chunk_bytes)))
+                if not skipped:
+                    return
+                skip -= skipped
+            record_start = self.record_start
+            # start of a multi-line record that may continue in the next block
+            carry = b""
+            while True:
+                data = stream.read(self.chunk_bytes)
+                if not data:
+                    break
+                if not data.endswith(b"\n"):
+                    data += stream.readline()
+                if record_start is not None:
+                    data = carry + data
+                    cut = last_record_start(data, record_start)
+                    if cut:
+                        data, carry = data[:cut], data[cut:]
                     else:
-                        # batch mode: no need to loop/wait
-                        return
+                        carry = b""
+                yield self._take(data)
+            if carry:
+                yield self._take(carry)
+        self.eof_reached = True
+
+    def sample_lines(self, count=DETECT_SAMPLE_LINES, max_bytes=SAMPLE_BYTES):
+        """
+        Returns up to `count` lines from the start of the file (decompressed if needed),
+        used to autodetect its log format. Does not move the reader's offset.
+        """
+        if self.compression:
+            with open_decompressed(self.file_path, self.compression) as stream:
+                data = stream.read(max_bytes)
+        else:
+            with open(self.file_path, "rb") as f:
+                data = f.read(max_bytes)
+        if len(data) == max_bytes:
+            # the last line may be cut off
+            data = data[:data.rfind(b"\n") + 1]
+        return [line for line in decode_lines(data) if line.strip()][:count]
+
+    def member_ranges(self, chunk_bytes=COMPRESSED_CHUNK_BYTES):
+        """
+        For BGZF and multi-frame zstd logs, returns (offset, length, prev) groups of
+        compressed members that workers can decompress independently, starting at the
+        current offset. Returns None if the file can only be decompressed sequentially,
+        which includes multi-line mode: records may cross member boundaries.
+        """
+        if self.record_start is not None:
+            return None
+        units = member_units(self.file_path, self.compression)
+        if units is None:
+            return None
+        try:
+            return list(group_units(units, chunk_bytes, self.offset))
+        except ValueError:
+            print(f"Checkpoint for {self.file_path} is not on a member boundary, reading from the start.")
+            self.offset = 0
+            return list(group_units(units, chunk_bytes))
+
+    def byte_ranges(self, start=None):
+        """
+        Yields newline-aligned (offset, length) byte ranges of roughly `chunk_bytes` each.
+        The file is memory-mapped, so only the pages around each range boundary are
+        touched; nothing is read or decoded here.
+        """
+        start = self.offset if start is None else start
+        size = os.path.getsize(self.file_path)
+        if size <= start:
+            return
+        with open(self.file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offset = start
+            while offset < size:
+                end = find_range_end(mm, offset, size, self.chunk_bytes, self.record_start)
+                yield offset, end - offset
+                offset = end
+
+    def _iter_batch(self):
+        size = os.path.getsize(self.file_path)
+        if size <= self.offset:
+            return
+        with open(self.file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            while self.offset < size:
+                end = find_range_end(mm, self.offset, size, self.chunk_bytes, self.record_start)
+                # lines are only decoded once the consumer asks for this chunk
+                lines = decode_lines(mm[self.offset:end])
+                self.chunk_range = (self.offset, end)
+                self.offset = end
+                if lines:
+                    yield lines
+        self.eof_reached = True
 
     def _read_chunk(self, file_obj):
-        lines = [file_obj.readline() for _ in range(self.chunk_size)]
-        return [l for l in lines if l]
\ No newline at end of file
+        lines = []
+        for _ in range(self.chunk_size):
+            line = file_obj.readline()
+            if not line:
+                break
+            lines.append(line)
+        return lines
@@ -0,0 +1,123 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+from pathlib import Path
+from config import POLL_INTERVAL, TAIL_MODE
+
+# inotify(7) constants
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+
+FILE_EVENTS = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_DELETE_SELF | IN_MOVE_SELF
+DIR_EVENTS = IN_CREATE | IN_MOVED_TO
+
+
+class PollingWatcher:
+    """
+    Fallback watcher: simply sleeps for `poll_interval` and lets the caller re-check the file.
+    """
+
+    def __init__(self, file_path, poll_interval=POLL_INTERVAL):
+        self.file_path = Path(file_path)
+        self.poll_interval = poll_interval
+
+    def wait(self, timeout=None):
+        time.sleep(self.poll_interval if timeout is None else min(timeout, self.poll_interval))
+        return True
+
+    def rewatch(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Blocks until the kernel reports a change to the watched file (or a file being
+    created/renamed in its directory), so idle tailing costs no wakeups.
+    """
+
+    # Re-check the file every so often even without events (e.g. network filesystems).
+    SAFETY_TIMEOUT = 5.0
+
+    def __init__(self, file_path):
+        self.file_path = Path(file_path)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        try:
+            self._add_watch(self.file_path, FILE_EVENTS)
+            self._add_watch(self.file_path.parent, DIR_EVENTS)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def _add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch failed for {path}: {os.strerror(err)}")
+        return wd
+
+    def rewatch(self):
+        """
+        inotify watches inodes, not paths: after a rotation the new file at the same
+        path has to be watched too. The old file keeps its watch while it is drained;
+        the kernel drops it once the file is deleted.
+        """
+        self._add_watch(self.file_path, FILE_EVENTS)
+
+    def wait(self, timeout=None):
+        """
+        Returns True as soon as an event arrives, False on timeout.
+        """
+        timeout = self.SAFETY_TIMEOUT if timeout is None else timeout
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        self._drain()
+        return True
+
+    def _drain(self):
+        # Events are only used as wake-ups; the reader re-checks the file itself.
+        while True:
+            try:
+                if not os.read(self.fd, 64 * 1024):
+                    return
+            except BlockingIOError:
+                return
+
+    def close(self):
+        if self.fd is not None and self.fd >= 0:
+            os.close(self.fd)
+            self.fd = None
+
+
+def create_watcher(file_path, mode=TAIL_MODE, poll_interval=POLL_INTERVAL):
+    """
+    mode="auto"    -> inotify on Linux, polling elsewhere or if inotify is unavailable
+    mode="inotify" -> inotify only (raises if unavailable)
+    mode="poll"    -> always poll every `poll_interval` seconds
+    """
+    if mode in ("auto", "inotify") and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(file_path)
+        except (OSError, AttributeError) as e:
+            if mode == "inotify":
+                raise
+            print(f"inotify unavailable ({e}), falling back to polling.")
+    elif mode == "inotify":
+        raise OSError("inotify is only available on Linux")
+    return PollingWatcher(file_path, poll_interval)
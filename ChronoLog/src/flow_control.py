@@ -0,0 +1,57 @@
+import threading
+from config import MAX_IN_FLIGHT_CHUNKS, MAX_IN_FLIGHT_BYTES
+
+
+class InFlightBudget:
+    """
+    Caps the work dispatched to the parser pool but not yet handed to the writers,
+    both in chunks and in bytes (0 means no limit). Readers call acquire() before
+    dispatching a chunk and block while the budget is spent; pool callbacks call
+    release() once the chunk has reached the writer queue. Since that queue is
+    bounded too, memory use stays flat no matter how large the input is.
+    """
+
+    def __init__(self, max_chunks=MAX_IN_FLIGHT_CHUNKS, max_bytes=MAX_IN_FLIGHT_BYTES):
+        self.max_chunks = max_chunks
+        self.max_bytes = max_bytes
+        self.chunks = 0
+        self.bytes = 0
+        # number of times a reader had to wait for capacity
+        self.waits = 0
+        self._cond = threading.Condition()
+
+    def _has_room(self, size):
+        if self.chunks == 0:
+            # always admit one chunk, even if it alone exceeds max_bytes
+            return True
+        if self.max_chunks and self.chunks >= self.max_chunks:
+            return False
+        if self.max_bytes and self.bytes + size > self.max_bytes:
+            return False
+        return True
+
+    def acquire(self, size, stop_flag=None, poll=1.0):
+        """
+        Blocks until `size` bytes fit in the budget. Returns False if stop_flag
+        gets set while waiting.
+        """
+        with self._cond:
+            if not self._has_room(size):
+                self.waits += 1
+            while not self._has_room(size):
+                if stop_flag is not None and stop_flag.is_set():
+                    return False
+                self._cond.wait(poll)
+            self.chunks += 1
+            self.bytes += size
+            return True
+
+    def release(self, size):
+        with self._cond:
+            self.chunks -= 1
+            self.bytes -= size
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return {"chunks": self.chunks, "bytes": self.bytes, "waits": self.waits}
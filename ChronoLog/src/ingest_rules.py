@@ -0,0 +1,99 @@
+import re
+from config import INCLUDE_PATTERN, EXCLUDE_PATTERN, MIN_LEVEL, SAMPLE_RATES, LEVEL_EVENTS
+
+# Severity order of the level tokens, for MIN_LEVEL
+LEVEL_RANKS = {"WARNING": 1, "ERROR": 2}
+# Slack for float rounding in the sampling credit, so e.g. ten events at 0.3 keep exactly three
+SAMPLE_EPSILON = 1e-9
+
+
+class IngestRules:
+    """
+    Filter and sampling rules applied by LogParser before any parsing work:
+
+    - include / exclude: regexes searched in the raw line; a line must match the
+      include pattern (if set) and must not match the exclude pattern
+    - min_level: "warning" or "error"; lines without a level at least that severe
+      are dropped, metrics included
+    - sample_rates: {event type: fraction kept}, e.g. {"latency": 0.1} keeps every
+      tenth latency event. Sampling is deterministic, so the kept share is exact.
+
+    `dropped` counts rejected lines and `sampled` the events left out by sampling.
+    """
+
+    def __init__(self, include=INCLUDE_PATTERN, exclude=EXCLUDE_PATTERN, min_level=MIN_LEVEL, sample_rates=SAMPLE_RATES):
+        self.include = re.compile(include) if include else None
+        self.exclude = re.compile(exclude) if exclude else None
+        if min_level and min_level.upper() not in LEVEL_RANKS:
+            raise ValueError(f"Unknown minimum level {min_level!r}, expected one of {', '.join(LEVEL_RANKS).lower()}")
+        self.min_rank = LEVEL_RANKS[min_level.upper()] if min_level else 0
+        # level tokens of the default format that pass the threshold, to reject lines before parsing
+        accepted = [level for level, rank in LEVEL_RANKS.items() if rank >= self.min_rank and level in LEVEL_EVENTS]
+        self.level_re = re.compile(r"\b(?:" + "|".join(accepted) + r")\b") if self.min_rank else None
+        # rates of 1 or more keep everything and need no bookkeeping
+        self.sample_rates = {event: max(rate, 0.0) for event, rate in dict(sample_rates or {}).items() if rate < 1}
+        self._credit = {}
+        self.dropped = 0
+        self.sampled = 0
+
+    @property
+    def filters_lines(self):
+        return self.include is not None or self.exclude is not None or self.min_rank > 0
+
+    def accept(self, line, default_format=True):
+        """
+        Include/exclude check, plus the level threshold when the line is in the default
+        format (other formats are checked on their parsed levels in accept_levels).
+        """
+        if (self.include is not None and not self.include.search(line)) \
+                or (self.exclude is not None and self.exclude.search(line)) \
+                or (default_format and self.level_re is not None and not self.level_re.search(line)):
+            self.dropped += 1
+            return False
+        return True
+
+    def accept_levels(self, levels):
+        if self.min_rank and not any(LEVEL_RANKS.get(level, 0) >= self.min_rank for level in levels):
+            self.dropped += 1
+            return False
+        return True
+
+    def sample(self, event):
+        """
+        True if this event of the given type is kept.
+        """
+        rate = self.sample_rates.get(event)
+        if rate is None:
+            return True
+        credit = self._credit.get(event, 0.0) + rate
+        if credit >= 1.0 - SAMPLE_EPSILON:
+            self._credit[event] = credit - 1.0
+            return True
+        self._credit[event] = credit
+        self.sampled += 1
+        return False
+
+    def sample_span(self, event, count):
+        """
+        Sampling for `count` consecutive events at once: returns (credit, rate) such that
+        event i is kept when floor(credit + (i + 1) * rate) > floor(credit + i * rate),
+        both with SAMPLE_EPSILON added, or None if the event type is not sampled.
+        Updates the state as sample() would.
+        """
+        rate = self.sample_rates.get(event)
+        if rate is None:
+            return None
+        credit = self._credit.get(event, 0.0)
+        total = credit + count * rate
+        kept = int(total + SAMPLE_EPSILON)
+        self._credit[event] = total - kept
+        self.sampled += count - kept
+        return credit, rate
+
+    def take_counts(self):
+        """
+        Returns (dropped, sampled) since the last call and resets them.
+        """
+        counts = (self.dropped, self.sampled)
+        self.dropped = self.sampled = 0
+        return counts
@@ -1,77 +1,397 @@
-﻿import re
-from datetime import datetime
-from config import KEY_VAL_RE, VAR_REGEX
+﻿import json
+import math
+import re
+from config import (AGGREGATE_BUCKET, LEVEL_EVENTS, LINE_RE, LOG_FORMAT, MULTILINE, MULTILINE_START, TEMPLATE_MINER,
+                    TRACK_VARIABLES, VECTOR_PARSING)
+from event_batch import EventBatch
+from ingest_rules import IngestRules
+from template_miner import TemplateMiner
+from timestamps import TimestampParser
+from vector_parser import VectorParser
+
+try:
+    import orjson  # optional, much faster for JSON lines
+    _json_loads = orjson.loads
+    _JSON_ERRORS = (orjson.JSONDecodeError,)
+except ImportError:
+    _json_loads = json.loads
+    _JSON_ERRORS = (ValueError,)
+
+# Message templates: the leading timestamp is dropped and every number becomes {num}
+TIMESTAMP_PREFIX_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} ")
+NUM_SPLIT_RE = re.compile(r"\b(\d+)\b")
+
+
+def join_records(lines, record_start):
+    """
+    Stitches multi-line records together: every line that does not match `record_start`
+    is appended (after a newline) to the record before it. Lines before the first record
+    start, which only happens at the start of a file, form a record of their own.
+    """
+    records = []
+    for line in lines:
+        line = line.rstrip()
+        if not line:
+            continue
+        if records and not record_start.match(line):
+            records[-1] += "\n" + line
+        else:
+            records.append(line)
+    return records
+
+
+def make_template(line):
+    """
+    Returns (template, values) for a message line, e.g.
+    "2025-11-23 12:00:00 ERROR User 42 failed" -> ("ERROR User {num} failed", '["42"]').
+    values is a JSON array of the numbers as strings, or None if there are none.
+    """
+    parts = NUM_SPLIT_RE.split(TIMESTAMP_PREFIX_RE.sub("", line, count=1))
+    # split() with a capturing group alternates text and numbers
+    nums = parts[1::2]
+    return "{num}".join(parts[::2]), (json.dumps(nums) if nums else None)
+
+
+# Severity names used by structured formats, mapped to the level tokens of LEVEL_EVENTS
+SEVERITY_LEVELS = {
+    "error": "ERROR", "err": "ERROR", "fatal": "ERROR", "critical": "ERROR",
+    "crit": "ERROR", "alert": "ERROR", "emerg": "ERROR", "panic": "ERROR",
+    "warning": "WARNING", "warn": "WARNING",
+}
+# Field names recognised in JSON lines and logfmt records
+TIME_KEYS = ("time", "timestamp", "ts", "@timestamp", "datetime")
+LEVEL_KEYS = ("level", "severity", "lvl", "loglevel")
+MESSAGE_KEYS = ("msg", "message", "event")
+
+# Lines sampled to autodetect the format of a file
+DETECT_SAMPLE_LINES = 20
+
+FORMATS = {}
+
+
+def register_format(cls):
+    """
+    Class decorator adding a log format to the registry. A format has a `name`,
+    a `detect(line)` check used for autodetection and a `parse(parser, line, batch)`
+    method that appends the line's events to the batch.
+    """
+    FORMATS[cls.name] = cls()
+    return cls
+
+
+def detect_format(lines):
+    """
+    Picks the registered format that recognises most of the sampled lines,
+    falling back to "default".
+    """
+    sample = [line.strip() for line in lines if line.strip()][:DETECT_SAMPLE_LINES]
+    best, best_hits = "default", 0
+    for name, fmt in FORMATS.items():
+        hits = sum(1 for line in sample if fmt.detect(line))
+        if hits > best_hits:
+            best, best_hits = name, hits
+    return best
+
+
+def _number(text):
+    # int or float value of an unquoted logfmt value, otherwise the text itself
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        value = float(text)
+    except ValueError:
+        return text
+    return value if math.isfinite(value) else text
+
+
+@register_format
+class DefaultFormat:
+    """
+    YYYY-MM-DD HH:MM:SS LEVEL text key=value ...
+    """
+    name = "default"
+    PREFIX_RE = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}")
+
+    def detect(self, line):
+        return self.PREFIX_RE.match(line) is not None
+
+    def parse(self, parser, line, batch):
+        parser.parse_line(line, parser.extract_timestamp(line), batch)
+
+
+@register_format
+class JsonLinesFormat:
+    """
+    One JSON object per line, e.g. {"time": "...", "level": "error", "msg": "...", "latency": 12}
+    """
+    name = "jsonl"
+
+    def detect(self, line):
+        return line.startswith("{") and line.endswith("}")
+
+    def parse(self, parser, line, batch):
+        try:
+            record = _json_loads(line)
+        except _JSON_ERRORS:
+            return
+        if isinstance(record, dict):
+            parser.parse_fields(record, batch)
+
+
+@register_format
+class LogfmtFormat:
+    """
+    key=value pairs with optionally quoted values, e.g. time=... level=warn msg="disk full" free=12
+    """
+    name = "logfmt"
+    PAIR_RE = re.compile(r'([\w.@-]+)=("(?:[^"\\]|\\.)*"|\S*)')
+    START_RE = re.compile(r'^[\w.@-]+=')
+
+    def detect(self, line):
+        return self.START_RE.match(line) is not None and len(self.PAIR_RE.findall(line)) >= 2
+
+    def parse(self, parser, line, batch):
+        fields = {}
+        for key, value in self.PAIR_RE.findall(line):
+            if value.startswith('"') and len(value) >= 2:
+                value = value[1:-1].replace('\\"', '"')
+            else:
+                value = _number(value)
+            fields[key] = value
+        parser.parse_fields(fields, batch)
+
+
+@register_format
+class SyslogFormat:
+    """
+    RFC 5424: <PRI>1 TIMESTAMP HOST APP PROCID MSGID [SD] MSG
+    RFC 3164: <PRI>Mmm dd hh:mm:ss HOST TAG[PID]: MSG (the <PRI> part is optional, as in /var/log/syslog)
+    Severity comes from PRI when present; the message itself is scanned like a default line.
+    """
+    name = "syslog"
+    RFC5424_RE = re.compile(r"^<(\d{1,3})>1 (\S+) (\S+) (\S+) (\S+) (\S+) (-|(?:\[(?:[^\]\\]|\\.)*\])+) ?(.*)$")
+    RFC3164_RE = re.compile(r"^(?:<(\d{1,3})>)?([A-Z][a-z]{2} [ \d]\d \d{2}:\d{2}:\d{2}) (\S+) ([^:\[\s]+)(?:\[\d+\])?: ?(.*)$")
+
+    def __init__(self):
+        self.timestamps = TimestampParser(["%b %d %H:%M:%S"])
+
+    def detect(self, line):
+        return (self.RFC5424_RE.match(line) or self.RFC3164_RE.match(line)) is not None
+
+    def parse(self, parser, line, batch):
+        m = self.RFC5424_RE.match(line)
+        if m:
+            pri, timestamp, app, message = m.group(1), parser.timestamps.parse(m.group(2)), m.group(4), m.group(8)
+        else:
+            m = self.RFC3164_RE.match(line)
+            if not m:
+                return
+            pri, timestamp, app, message = m.group(1), self.timestamps.parse(m.group(2)), m.group(4), m.group(5)
+
+        levels, variables = parser.scan(message)
+        if pri is not None and not levels:
+            # severity is the low 3 bits of PRI: 0-3 are errors, 4 is a warning
+            severity = int(pri) & 7
+            if severity <= 4:
+                levels = ["ERROR" if severity <= 3 else "WARNING"]
+        parser.emit(batch, timestamp, levels, f"{app}: {message}", variables)
+
+
+@register_format
+class NginxFormat:
+    """
+    nginx/Apache combined log format, optionally followed by $request_time.
+    5xx responses are recorded as errors and 4xx as warnings; body_bytes_sent and
+    request_time become metrics.
+    """
+    name = "nginx"
+    LINE_RE = re.compile(
+        r'^(\S+) \S+ (\S+) \[([^\]]+)\] "(\S+) (\S+)[^"]*" (\d{3}) (\d+|-)'
+        r'(?: "(?:[^"\\]|\\.)*" "(?:[^"\\]|\\.)*")?(?: (\d+(?:\.\d+)?))?'
+    )
+
+    def __init__(self):
+        self.timestamps = TimestampParser(["%d/%b/%Y:%H:%M:%S"])
+
+    def detect(self, line):
+        return self.LINE_RE.match(line) is not None
+
+    def parse(self, parser, line, batch):
+        m = self.LINE_RE.match(line)
+        if not m:
+            return
+        _, _, time_local, method, path, status, body_bytes, request_time = m.groups()
+        timestamp = self.timestamps.parse(time_local)
+        status = int(status)
+        levels = ["ERROR"] if status >= 500 else ["WARNING"] if status >= 400 else []
+        variables = []
+        if body_bytes != "-" and parser.tracks("body_bytes_sent"):
+            variables.append(("body_bytes_sent", int(body_bytes)))
+        if request_time is not None and parser.tracks("request_time"):
+            variables.append(("request_time", float(request_time)))
+        # the endpoint is what groups requests, so it is templated as is (numbers only)
+        # and the query string is left out so it does not explode into variants
+        template = make_template(f"{method} {path.split('?', 1)[0]} {status}")
+        parser.emit(batch, timestamp, levels, None, variables, template)
+
 
 class LogParser:
-    def __init__(self, var_regex=None):
-        self.var_regex = var_regex or VAR_REGEX
-        self.key_val_re = KEY_VAL_RE
+    def __init__(self, var_regex=None, timestamp_formats=None, log_format=LOG_FORMAT, template_miner=TEMPLATE_MINER,
+                 vector_parsing=VECTOR_PARSING, rules=None, aggregate_bucket=AGGREGATE_BUCKET,
+                 multiline=MULTILINE, multiline_start=MULTILINE_START):
+        # names of the tracked variables; empty means every key=value pair is recorded
+        # (a {name: regex} mapping is accepted too, only its names are used)
+        self.variables = frozenset(var_regex or TRACK_VARIABLES)
+        self.line_re = LINE_RE
+        self.timestamps = TimestampParser(timestamp_formats)
+        # templates are mined per parser; without the miner only numbers are parameters
+        self.miner = TemplateMiner() if template_miner else None
+        if log_format != "auto" and log_format not in FORMATS:
+            raise ValueError(f"Unknown log format {log_format!r}, expected auto or one of {', '.join(FORMATS)}")
+        self.log_format = log_format
+        # filter and sampling rules, checked before any parsing work
+        self.rules = rules or IngestRules()
+        self.aggregate_bucket = aggregate_bucket
+        # regex starting a record in multi-line mode, None when every line is a record
+        self.record_start = re.compile(multiline_start) if multiline else None
+        # bulk path for raw chunks of metric lines (see parse_buffer); it has no line filters
+        # and takes every line as a record of its own
+        self.vector = None
+        if vector_parsing and VectorParser.available(self) and not self.rules.filters_lines \
+                and self.record_start is None:
+            self.vector = VectorParser(self)
 
-    def parse_lines(self, lines):
-        events = {"ERROR": [], "WARNING": []}
-        timeline = []
+    def parse_lines(self, lines, source=None, log_format=None):
+        """
+        Parses a chunk of lines in the given format (a FORMATS name); by default the
+        parser's own format, autodetected from the chunk itself when that is "auto".
+        """
+        # every event is tagged with the input file it came from (batch.source)
+        batch = EventBatch(source)
+        log_format = log_format or self.log_format
+        if log_format == "auto":
+            log_format = detect_format(lines)
+        parse = FORMATS[log_format].parse
+        accept = self.rules.accept if self.rules.filters_lines else None
+        default_format = log_format == "default"
+        if default_format and self.record_start is not None:
+            lines = join_records(lines, self.record_start)
 
         for line in lines:
             line = line.strip()
             if not line:
                 continue
-            timestamp = self.extract_timestamp(line)
-            self.parse_errors_warnings(line, timestamp, events, timeline)
-            self.parse_variables(line, timestamp, events, timeline)
+            if accept is not None and not accept(line, default_format):
+                continue
+            parse(self, line, batch)
+
+        return batch
+
+    def parse_buffer(self, data, decode, source=None, log_format=None):
+        """
+        Parses a newline-aligned block of raw bytes. Default-format chunks go through
+        the vectorized path when it is available; otherwise `decode` turns the block
+        into lines for parse_lines.
+        """
+        if self.vector is not None and (log_format or self.log_format) == "default":
+            return self.vector.parse(data, source)
+        return self.parse_lines(decode(data), source, log_format)
 
-        return events, timeline
+    def aggregate(self, batch):
+        """
+        Collapses repeated events of a parsed chunk per AGGREGATE_BUCKET seconds,
+        if pre-aggregation is on; called once per chunk, after parsing.
+        """
+        return batch.aggregated(self.aggregate_bucket) if self.aggregate_bucket > 0 else batch
 
     def extract_timestamp(self, line):
-        # Try to extract timestamp from the beginning of the line
+        # Timestamp at the beginning of the line as epoch seconds (see TimestampParser).
         # Supports:
         # YYYY-MM-DD HH:MM:SS
         # YYYY-MM-DDTHH:MM:SS
-        parts = line.split(" ", 2)
-        if len(parts) < 2:
-            return None
-        
-        # Try space separated first
-        ts_str = f"{parts[0]} {parts[1]}"
-        try:
-            return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S").isoformat()
-        except ValueError:
-            pass
-            
-        # Try ISO format (first part only)
-        ts_str = parts[0]
-        try:
-            return datetime.fromisoformat(ts_str).isoformat()
-        except ValueError:
-            pass
-            
+        # plus any formats listed in TIMESTAMP_FORMATS
+        return self.timestamps.parse(line)
+
+    def parse_line(self, line, timestamp, batch):
+        levels, variables = self.scan(line)
+        # a multi-line record is templated on its first line, the rest is mostly a stack trace
+        self.emit(batch, timestamp, levels, line.partition("\n")[0], variables)
+
+    def tracks(self, key):
+        return not self.variables or key in self.variables
+
+    def scan(self, text):
+        """
+        Finds level tokens and key=value pairs in one scan of the text, so the cost
+        does not grow with the number of tracked variables. Each level is returned
+        once; a tracked variable only its first time.
+        """
+        levels = []
+        variables = []
+        seen = set()
+        for level, key, val in self.line_re.findall(text):
+            if level:
+                if level not in levels:
+                    levels.append(level)
+            elif key.upper() in LEVEL_EVENTS:
+                continue
+            elif not self.variables:
+                variables.append((key, int(val)))
+            elif key in self.variables and key not in seen:
+                seen.add(key)
+                variables.append((key, int(val)))
+        return levels, variables
+
+    def parse_fields(self, fields, batch):
+        """
+        Events of a structured record (JSON object or logfmt pairs): the time, level and
+        message fields make up the level event, other numeric fields become metrics.
+        """
+        timestamp = None
+        level = None
+        message = ""
+        variables = []
+        for key, value in fields.items():
+            lower = key.lower()
+            if lower in TIME_KEYS:
+                timestamp = self._field_time(value)
+            elif lower in LEVEL_KEYS:
+                level = SEVERITY_LEVELS.get(str(value).lower())
+            elif lower in MESSAGE_KEYS:
+                message = str(value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool) \
+                    and key.upper() not in LEVEL_EVENTS and self.tracks(key):
+                variables.append((key, value))
+        levels = [level] if level else []
+        self.emit(batch, timestamp, levels, f"{level} {message}" if level else message, variables)
+
+    def _field_time(self, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            # epoch seconds, or milliseconds for values too large to be seconds
+            return int(value / 1000 if value > 1e11 else value)
+        if isinstance(value, str):
+            return self.timestamps.parse(value)
         return None
 
-    def parse_errors_warnings(self, line, timestamp, events, timeline):
-        if "ERROR" in line:
-            self._add_event("ERROR", line, "error", timestamp, events, timeline)
-        if "WARNING" in line:
-            self._add_event("WARNING", line, "warning", timestamp, events, timeline)
-
-    def parse_variables(self, line, timestamp, events, timeline):
-        if self.var_regex:
-            for var, rx in self.var_regex.items():
-                m = rx.search(line)
-                if m:
-                    val = int(m.group(1))
-                    self._add_event(var, line, var, timestamp, events, timeline, val)
-        else:
-            for m in self.key_val_re.finditer(line):
-                key = m.group(1)
-                val = int(m.group(2))
-                if key.upper() in ("ERROR", "WARNING"):
-                    continue
-                self._add_event(key, line, key, timestamp, events, timeline, val)
-
-    def _add_event(self, key, line, event_name, timestamp, events, timeline, value=None):
-        events.setdefault(key, []).append(line)
-        entry = {"time": timestamp, "event": event_name}
-        if value is not None:
-            entry["value"] = value
-        else:
-            entry["msg"] = line
-        timeline.append(entry)
\ No newline at end of file
+    def emit(self, batch, timestamp, levels, text, variables, template=None):
+        """
+        Appends one event per level (templated from `text`, unless a ready
+        (template, values) pair is given) and one per variable.
+        """
+        rules = self.rules
+        if rules.min_rank and not rules.accept_levels(levels):
+            return
+        if rules.sample_rates:
+            levels = [level for level in levels if rules.sample(LEVEL_EVENTS[level])]
+            variables = [(key, value) for key, value in variables if rules.sample(key)]
+        if levels:
+            # templated here, in the parser workers, so writers only map templates to ids
+            if template is None:
+                template = self.miner.template(text) if self.miner is not None else make_template(text)
+            template, msg_values = template
+            for level in levels:
+                batch.add(timestamp, LEVEL_EVENTS[level], template=template, msg_values=msg_values)
+        for key, value in variables:
+            batch.add(timestamp, key, value)
\ No newline at end of file
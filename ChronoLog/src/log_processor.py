@@ -1,43 +1,173 @@
 ﻿import multiprocessing
+import os
+import queue
+import threading
 import time
-from config import INPUT_FILE_PATH, NUM_PROCESSES, QUEUE_MAX_SIZE, QUEUE_PUT_TIMEOUT, NUM_WRITERS
-from log_parser import LogParser
-from file_chunk_reader import FileChunkReader
-from writer_process import WriterProcess
+from functools import partial
+from config import (
+    INPUT_FILE_PATH, NUM_PROCESSES, QUEUE_MAX_SIZE, QUEUE_PUT_TIMEOUT, NUM_WRITERS,
+    CHECKPOINT_ENABLED, CHECKPOINT_INTERVAL, DISCOVERY_INTERVAL, SHM_TRANSPORT, STATS_INTERVAL, LOG_FORMAT,
+    SHARED_MSG_CACHE,
+)
+from checkpoint import CheckpointStore, OffsetTracker
+from flow_control import InFlightBudget
+from log_parser import LogParser, detect_format
+from file_chunk_reader import FileChunkReader, decode_lines, read_byte_range, resolve_input_files
+from shared_transport import SharedSlots
+from template_cache import SharedTemplateCache
+from writer_process import STOP, WriterProcess
+
+# Per-worker state set by _init_worker: the parser, the shared memory transport,
+# the writer queue that workers feed directly, and the shared ingest rule counters.
+_worker_parser = None
+_worker_transport = None
+_worker_queue = None
+_worker_stop = None
+_worker_rule_counts = None
+
+
+def _init_worker(transport=None, writer_queue=None, stop_flag=None, rule_counts=None):
+    global _worker_parser, _worker_transport, _worker_queue, _worker_stop, _worker_rule_counts
+    _worker_parser = LogParser()
+    _worker_transport = transport
+    _worker_queue = writer_queue
+    _worker_stop = stop_flag
+    _worker_rule_counts = rule_counts
+
+
+def _report_rule_counts():
+    # once per chunk, so the shared counters are not locked per line
+    dropped, sampled = _worker_parser.rules.take_counts()
+    if dropped or sampled:
+        with _worker_rule_counts.get_lock():
+            _worker_rule_counts[0] += dropped
+            _worker_rule_counts[1] += sampled
+
+
+def _ship(result, marker=None):
+    """
+    Hands a parse result to the writers. Results go through shared memory when a slot
+    is free (only the descriptor is pickled) and the worker puts them on the writer queue
+    itself, so the parent never handles them. Without a writer queue the result is returned.
+    """
+    if _worker_rule_counts is not None:
+        _report_rule_counts()
+    if _worker_transport is not None:
+        ref = _worker_transport.put(result)
+        if ref is not None:
+            result = ref
+    if _worker_queue is None:
+        return result
+
+    # marker = (source, generation, start, end) byte range the writer acknowledges once committed
+    item = (result, marker)
+    while True:
+        try:
+            # blocks only this worker while writers catch up
+            _worker_queue.put(item, timeout=QUEUE_PUT_TIMEOUT)
+            return None
+        except queue.Full:
+            if _worker_stop is not None and _worker_stop.is_set():
+                print("Warning: dropped log chunk during shutdown")
+                return None
+
+
+def parse_chunk(lines, source=None, marker=None, log_format=None):
+    """
+    Pool task for live mode: parses a chunk of lines sent by the reader.
+    """
+    parser = _worker_parser or LogParser()
+    return _ship(parser.aggregate(parser.parse_lines(lines, source, log_format)), marker)
+
+
+def parse_shared_chunk(ref, source=None, marker=None, log_format=None):
+    """
+    Pool task for live mode with the shared memory transport: the raw chunk is
+    decoded straight out of the reader's slot, which is then handed back.
+    """
+    parser = _worker_parser or LogParser()
+    view = _worker_transport.view(ref)
+    try:
+        batch = parser.parse_buffer(view, decode_lines, source, log_format)
+    finally:
+        view.release()
+        _worker_transport.release(ref)
+    return _ship(parser.aggregate(batch), marker)
+
+
+def parse_byte_range(file_path, offset, length, source=None, codec=None, prev=None, marker=None, log_format=None):
+    """
+    Pool task for batch mode: the worker reads its own byte range of the input file,
+    so the parent only ships (path, offset, length) instead of the lines themselves.
+    For splittable compressed logs the worker also decompresses its range.
+    """
+    parser = _worker_parser or LogParser()
+    data = read_byte_range(file_path, offset, length, codec, prev, raw=True)
+    return _ship(parser.aggregate(parser.parse_buffer(data, decode_lines, source, log_format)), marker)
+
 
 class LogProcessor:
-    def __init__(self, input_file=INPUT_FILE_PATH, num_processes=NUM_PROCESSES, num_writers=NUM_WRITERS):
+    def __init__(self, input_file=INPUT_FILE_PATH, num_processes=NUM_PROCESSES, num_writers=NUM_WRITERS, resume=True, log_format=LOG_FORMAT):
         self.input_file = input_file
         self.num_processes = num_processes
         self.num_writers = num_writers
-        self.parser = LogParser()
+        self.resume = resume
+        self.parser = LogParser(log_format=log_format)
+        self.log_format = log_format
         self.queue = multiprocessing.Queue(maxsize=QUEUE_MAX_SIZE)
         self.stop_flag = multiprocessing.Event()
 
+        # Writers report committed chunks on ack_queue; only then is the offset checkpointed.
+        self.checkpoints = CheckpointStore() if CHECKPOINT_ENABLED else None
+        self.ack_queue = multiprocessing.Queue() if self.checkpoints else None
+        self.trackers = {}
+        self._checkpoint_thread = None
+
+        # created in start(), so building a processor does not allocate shared memory
+        self.transport = None
+        # template -> message id cache shared by the writers
+        self.template_cache = None
+
+        # Readers wait for this budget before dispatching, so memory stays bounded.
+        self.budget = InFlightBudget()
+        # lines dropped and events sampled out by the ingest rules, summed over the workers
+        self.rule_counts = multiprocessing.Array("q", 2)
+        self._stats_stop = threading.Event()
+        self._stats_thread = None
+
     def start(self, live=True):
         """
-        live=True  -> keep tailing the file until interrupted
+        live=True  -> keep tailing the input files until interrupted
         live=False -> read available data, process, then exit once processing is complete
         """
+        # the cache first: it is small, and the transport is sized against what is left
+        if SHARED_MSG_CACHE:
+            self.template_cache = SharedTemplateCache()
+        if SHM_TRANSPORT:
+            self.transport = SharedSlots.create()
+
         writers = []
         for _ in range(self.num_writers):
             wp = multiprocessing.Process(
                 target=WriterProcess().run,
-                args=(self.queue, self.stop_flag)
+                args=(self.queue, self.ack_queue, self.transport, self.template_cache)
             )
             wp.start()
             writers.append(wp)
 
-        pool = multiprocessing.Pool(self.num_processes)
-        reader = FileChunkReader(self.input_file, live=live)
+        # workers push their results straight onto the writer queue
+        pool = multiprocessing.Pool(
+            self.num_processes, initializer=_init_worker,
+            initargs=(self.transport, self.queue, self.stop_flag, self.rule_counts),
+        )
+        self._start_checkpointing()
+        self._start_reporting()
         try:
-            for chunk in reader:
-                pool.apply_async(
-                    self.parser.parse_lines,
-                    args=(chunk,),
-                    callback=self._on_result,
-                    error_callback=self._on_error
-                )
+            if live:
+                self._run_live(pool)
+            else:
+                for path, source in resolve_input_files(self.input_file):
+                    self._dispatch_file(pool, self._open_reader(path, source, live=False))
 
             # If reader finished normally (batch mode), close the pool and wait for workers to finish.
             if not live:
@@ -52,9 +182,134 @@ class LogProcessor:
         finally:
             self._shutdown(pool, writers)
 
-    def _on_result(self, result):
-        events, timeline = result
-        self._safe_queue_put((events, timeline))
+    def _open_reader(self, path, source, live):
+        reader = FileChunkReader(
+            path, live=live, start_offset=self._resume_offset(path), source=source,
+            raw=self.transport is not None,
+        )
+        reader.log_format = self._detect_format(reader)
+        # member groups of a splittable compressed log, None if it is read sequentially;
+        # computed before the tracker, as a checkpoint off a member boundary resets the offset
+        reader.members = reader.member_ranges() if reader.compression else None
+        if self.checkpoints:
+            key = str(reader.file_path)
+            self.trackers[key] = OffsetTracker(reader.offset, inode=os.stat(key).st_ino)
+        return reader
+
+    def _detect_format(self, reader):
+        """
+        With LOG_FORMAT=auto the format is detected once per file from its first lines,
+        so workers never have to guess per chunk. Files still empty are left on auto.
+        """
+        if self.log_format != "auto":
+            return self.log_format
+        sample = reader.sample_lines()
+        if not sample:
+            return "auto"
+        log_format = detect_format(sample)
+        print(f"{reader.file_path}: detected log format {log_format}")
+        return log_format
+
+    def _run_live(self, pool):
+        """
+        Tails every input file in its own thread, all feeding the shared pool.
+        New files matching the input pattern are picked up as they appear.
+        """
+        tailing = {}
+        while not self.stop_flag.is_set():
+            for path, source in resolve_input_files(self.input_file):
+                key = str(path.resolve())
+                reader, thread = tailing.get(key, (None, None))
+                if thread is not None and (thread.is_alive() or reader.compression):
+                    # compressed archives are ingested once and never tailed
+                    continue
+                try:
+                    reader = self._open_reader(path, source, live=True)
+                except OSError as e:
+                    print(f"Cannot open {path}: {e}")
+                    continue
+                print(f"Tailing {path} (source: {source})")
+                thread = threading.Thread(target=self._dispatch_file, args=(pool, reader), daemon=True)
+                thread.start()
+                tailing[key] = (reader, thread)
+            if not tailing:
+                print(f"No input files found for {self.input_file}, waiting...")
+            time.sleep(DISCOVERY_INTERVAL)
+
+    def _dispatch_file(self, pool, reader):
+        if reader.live and not reader.compression:
+            self._dispatch_lines(pool, reader)
+        elif reader.compression and reader.members is None:
+            print(f"{reader.file_path}: {reader.compression} stream cannot be split, decompressing sequentially.")
+            self._dispatch_lines(pool, reader)
+        else:
+            self._dispatch_ranges(pool, reader)
+
+    def _dispatch_lines(self, pool, reader):
+        file_path = str(reader.file_path)
+        try:
+            for chunk in reader:
+                if self.stop_flag.is_set():
+                    return
+                start, end = reader.chunk_range
+                # backpressure: the reader pauses here while parsers and writers are behind
+                if not self.budget.acquire(end - start, self.stop_flag):
+                    return
+                self._track_generation(file_path, reader)
+                task, payload = self._chunk_task(chunk)
+                marker = (file_path, reader.generation, start, end)
+                pool.apply_async(
+                    task,
+                    args=(payload, reader.source, marker, reader.log_format),
+                    callback=partial(self._on_result, marker=marker, size=end - start),
+                    error_callback=partial(self._on_error, marker=marker, size=end - start)
+                )
+        except Exception as e:
+            if not self.stop_flag.is_set():
+                print(f"Reader for {file_path} stopped: {e}")
+
+    def _chunk_task(self, chunk):
+        """
+        Raw chunks are placed in shared memory and only their descriptor is sent to the
+        pool; if no slot is free (or the reader yields lines) the lines go inline.
+        """
+        if not isinstance(chunk, (bytes, bytearray)):
+            return parse_chunk, chunk
+        ref = self.transport.put_bytes(chunk) if self.transport is not None else None
+        if ref is None:
+            return parse_chunk, decode_lines(chunk)
+        return parse_shared_chunk, ref
+
+    def _dispatch_ranges(self, pool, reader):
+        # The parent only computes newline-aligned offsets (or member boundaries for
+        # compressed logs); workers do the reading and decompressing.
+        file_path = str(reader.file_path)
+        if reader.compression:
+            ranges = reader.members
+        else:
+            ranges = ((offset, length, None) for offset, length in reader.byte_ranges())
+        for offset, length, prev in ranges:
+            if not self.budget.acquire(length, self.stop_flag):
+                return
+            marker = (file_path, 0, offset, offset + length)
+            pool.apply_async(
+                parse_byte_range,
+                args=(file_path, offset, length, reader.source, reader.compression, prev, marker, reader.log_format),
+                callback=partial(self._on_result, marker=marker, size=length),
+                error_callback=partial(self._on_error, marker=marker, size=length)
+            )
+
+    def _on_result(self, result, marker=None, size=None):
+        # Workers normally deliver results to the writers themselves and return None;
+        # anything returned is forwarded from here.
+        try:
+            if result is not None:
+                # an EventBatch, or a SharedRef to one that the writer reads from shared memory
+                self._safe_queue_put((result, marker))
+        finally:
+            # the chunk has reached the writer queue, so it no longer counts as in flight
+            if size is not None:
+                self.budget.release(size)
 
     def _safe_queue_put(self, item):
         # Implement backpressure: wait until queue has space
@@ -73,8 +328,134 @@ class LogProcessor:
         except Exception:
             print("Warning: dropped log chunk during shutdown")
 
-    def _on_error(self, exc):
+    def _on_error(self, exc, marker=None, size=None):
         print("worker error:", exc)
+        if marker is not None:
+            # the chunk will never be written: acknowledge it so the checkpoint moves past it
+            file_path, _, start, end = marker
+            print(f"Skipped bytes {start}-{end} of {file_path}")
+            if self.ack_queue is not None:
+                self.ack_queue.put(marker)
+        if size is not None:
+            self.budget.release(size)
+
+    def _start_reporting(self):
+        if STATS_INTERVAL <= 0:
+            return
+        self._stats_thread = threading.Thread(target=self._report_loop, daemon=True)
+        self._stats_thread.start()
+
+    def _report_loop(self):
+        while not self._stats_stop.wait(STATS_INTERVAL):
+            print(self.stats_line())
+
+    def stats(self):
+        """
+        Current flow-control state: work in flight, writer queue depth and
+        shared memory slots in use (None where the platform cannot tell), plus
+        the lines dropped and events sampled out by the ingest rules and the
+        hits and misses of the shared message cache.
+        """
+        stats = self.budget.snapshot()
+        try:
+            stats["queue_depth"] = self.queue.qsize()
+        except NotImplementedError:  # macOS
+            stats["queue_depth"] = None
+        stats["shm_slots_in_use"] = self.transport.in_use() if self.transport is not None else None
+        stats["dropped"], stats["sampled"] = self.rule_counts[:]
+        if self.template_cache is not None:
+            cache = self.template_cache.stats()
+            stats["msg_cache_hits"], stats["msg_cache_misses"] = cache["hits"], cache["misses"]
+        else:
+            stats["msg_cache_hits"] = stats["msg_cache_misses"] = None
+        return stats
+
+    def stats_line(self):
+        stats = self.stats()
+        line = (
+            f"In flight: {stats['chunks']} chunks ({stats['bytes'] / (1024 * 1024):.1f} MB), "
+            f"writer queue depth: {stats['queue_depth']}, reader waits: {stats['waits']}"
+        )
+        if stats["shm_slots_in_use"] is not None:
+            line += f", shared memory slots in use: {stats['shm_slots_in_use']}"
+        if stats["dropped"] or stats["sampled"]:
+            line += f", dropped lines: {stats['dropped']}, sampled out events: {stats['sampled']}"
+        if stats["msg_cache_hits"] is not None:
+            line += f", message cache hits/misses: {stats['msg_cache_hits']}/{stats['msg_cache_misses']}"
+        return line
+
+    def _resume_offset(self, file_path):
+        if not self.checkpoints:
+            return 0
+        if not self.resume:
+            self.checkpoints.reset(file_path)
+            return 0
+        offset = self.checkpoints.resume_offset(file_path)
+        if offset:
+            print(f"Resuming {file_path} from byte {offset}.")
+        return offset
+
+    def _start_checkpointing(self):
+        if not self.checkpoints:
+            return
+        self._checkpoint_thread = threading.Thread(target=self._checkpoint_loop, daemon=True)
+        self._checkpoint_thread.start()
+
+    def _checkpoint_loop(self):
+        """
+        Consumes writer acknowledgements and periodically persists the contiguous
+        committed offset of every input file. A None item ends the loop.
+        """
+        dirty = False
+        last_save = time.monotonic()
+        while True:
+            try:
+                marker = self.ack_queue.get(timeout=CHECKPOINT_INTERVAL)
+            except queue.Empty:
+                marker = False
+            if marker is None:
+                break
+            if marker:
+                dirty = self._commit_marker(marker) or dirty
+            if dirty and time.monotonic() - last_save >= CHECKPOINT_INTERVAL:
+                self._save_checkpoints()
+                dirty = False
+                last_save = time.monotonic()
+        if dirty:
+            self._save_checkpoints()
+
+    def _track_generation(self, source, reader):
+        # After a rotation or truncation offsets restart at 0 in a new file; acks for the
+        # previous generation are then ignored, which at worst replays a few old lines.
+        tracker = self.trackers.get(source)
+        if tracker is not None and tracker.generation != reader.generation:
+            self.trackers[source] = OffsetTracker(0, inode=reader.inode, generation=reader.generation)
+
+    def _commit_marker(self, marker):
+        source, generation, start, end = marker
+        tracker = self.trackers.get(source)
+        return bool(tracker and tracker.generation == generation and tracker.commit(start, end))
+
+    def _save_checkpoints(self):
+        for source, tracker in list(self.trackers.items()):
+            try:
+                st = os.stat(source)
+                # if the path now points to another file, the recorded size is what we read
+                size = st.st_size if st.st_ino == tracker.inode else tracker.watermark
+            except OSError:
+                size = tracker.watermark
+            self.checkpoints.update(source, tracker.watermark, inode=tracker.inode, size=size)
+        try:
+            self.checkpoints.save()
+        except OSError as e:
+            print(f"Warning: could not save checkpoint: {e}")
+
+    def _stop_checkpointing(self):
+        if not self._checkpoint_thread:
+            return
+        self.ack_queue.put(None)
+        self._checkpoint_thread.join(timeout=10)
+        self._checkpoint_thread = None
 
     def _handle_interrupt(self, pool):
         self.stop_flag.set()
@@ -95,15 +476,35 @@ class LogProcessor:
         except Exception:
             pass
 
-        # Ensure writers are signalled to stop (if not already).
+        # Ensure readers and workers are signalled to stop (if not already).
         self.stop_flag.set()
 
-        # Wait for writers to finish writing remaining queued items.
-        for wp in writers:
-            wp.join(timeout=10)
-            if wp.is_alive():
+        # One stop sentinel per writer, queued behind every chunk still waiting; the
+        # pool is joined, so no worker adds anything after them.
+        for _ in writers:
+            while any(wp.is_alive() for wp in writers):
                 try:
-                    wp.terminate()
-                except Exception:
-                    pass
-                wp.join()
\ No newline at end of file
+                    self.queue.put(STOP, timeout=QUEUE_PUT_TIMEOUT)
+                    break
+                except queue.Full:
+                    continue
+
+        # No timeout: each writer exits once it has written everything up to its sentinel.
+        for wp in writers:
+            wp.join()
+
+        # Writers are done, so every acknowledgement they sent can be checkpointed.
+        self._stop_checkpointing()
+
+        self._stats_stop.set()
+        if self._stats_thread is not None:
+            self._stats_thread.join(timeout=1)
+            self._stats_thread = None
+
+        if self.transport is not None:
+            self.transport.unlink()
+            self.transport = None
+        if self.template_cache is not None:
+            print(f"Message cache: {self.template_cache.stats()}")
+            self.template_cache.unlink()
+            self.template_cache = None
\ No newline at end of file
@@ -16,6 +16,11 @@ def parse_args():
         help="override input file path",
         default=None
     )
+    p.add_argument(
+        "--from-start",
+        action="store_true",
+        help="ignore the saved checkpoint and process the input from the beginning"
+    )
     return p.parse_args()
 
 if __name__ == "__main__":
@@ -25,7 +30,7 @@ if __name__ == "__main__":
     input_path = args.input or INPUT_FILE_PATH
     live_mode = args.mode == "live"
 
-    LogProcessor(input_path).start(live=live_mode)
+    LogProcessor(input_path, resume=not args.from_start).start(live=live_mode)
 
     end_time = time.time()
     elapsed = end_time - start_time
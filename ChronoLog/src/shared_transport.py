@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import pickle
+from multiprocessing import shared_memory
+from config import SHM_SLOTS, SHM_SLOT_BYTES
+
+# Where POSIX shared memory segments live on Linux
+SHM_DIR = "/dev/shm"
+
+
+def shm_free_bytes(path=SHM_DIR):
+    """
+    Free space for shared memory segments, or None where it cannot be checked.
+    """
+    try:
+        stat = os.statvfs(path)
+    except (AttributeError, OSError):
+        return None
+    return stat.f_bavail * stat.f_frsize
+
+
+class SharedRef:
+    """
+    Descriptor of a payload stored in shared memory: (segment, offset, length).
+    This is all that travels through pipes and queues between the stages.
+    """
+    __slots__ = ("segment", "offset", "length")
+
+    def __init__(self, segment, offset, length):
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+
+    def __reduce__(self):
+        return SharedRef, (self.segment, self.offset, self.length)
+
+    def __repr__(self):
+        return f"SharedRef({self.segment!r}, {self.offset}, {self.length})"
+
+
+class SharedSlots:
+    """
+    A shared memory segment cut into fixed-size slots, shared by the reader,
+    the parser workers and the writers. A producer claims a free slot, copies
+    its payload in and passes a SharedRef on; the consumer reads the payload
+    and hands the slot back. Slot state lives in shared memory too, so any
+    process can produce or consume.
+
+    Payloads that do not fit in a slot, or that arrive while every slot is in
+    use, are not stored: put() returns None and the caller sends them inline.
+    """
+
+    def __init__(self, slots=SHM_SLOTS, slot_bytes=SHM_SLOT_BYTES):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        # 1 per slot in use; its lock guards claiming, the semaphore counts free slots
+        self.used = multiprocessing.Array("b", slots)
+        self.available = multiprocessing.Semaphore(slots)
+
+    @classmethod
+    def create(cls, slots=SHM_SLOTS, slot_bytes=SHM_SLOT_BYTES, free=None):
+        """
+        Returns new SharedSlots, or None if SHM_DIR has no room for them, in which
+        case payloads are pickled through the queues. The segment is allocated lazily,
+        so an oversized one fails with SIGBUS on first write rather than here; Docker
+        containers get 64 MiB of /dev/shm unless run with --shm-size.
+        """
+        free = shm_free_bytes() if free is None else free
+        size = slots * slot_bytes
+        if free is not None and size > free:
+            print(f"Shared memory transport needs {size >> 20} MiB but {SHM_DIR} has {free >> 20} MiB free; "
+                  f"sending data through pipes (lower SHM_SLOTS / SHM_SLOT_BYTES or raise --shm-size)")
+            return None
+        return cls(slots, slot_bytes)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def put_bytes(self, data, timeout=0.0):
+        """
+        Copies raw bytes into a free slot and returns its SharedRef, or None.
+        """
+        length = len(data)
+        if length > self.slot_bytes:
+            return None
+        claimed = self.available.acquire(timeout=timeout) if timeout else self.available.acquire(False)
+        if not claimed:
+            return None
+        with self.used.get_lock():
+            index = self.used[:].index(0)
+            self.used[index] = 1
+        offset = index * self.slot_bytes
+        self.shm.buf[offset:offset + length] = data
+        return SharedRef(self.shm.name, offset, length)
+
+    def put(self, obj, timeout=0.0):
+        """
+        Pickles obj into a free slot; returns its SharedRef, or None.
+        """
+        return self.put_bytes(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), timeout)
+
+    def view(self, ref):
+        """
+        Zero-copy view of a payload; release() the view and then the slot when done.
+        """
+        return self.shm.buf[ref.offset:ref.offset + ref.length]
+
+    def take(self, ref):
+        """
+        Unpickles the payload directly from shared memory and releases the slot.
+        """
+        view = self.view(ref)
+        try:
+            return pickle.loads(view)
+        finally:
+            view.release()
+            self.release(ref)
+
+    def release(self, ref):
+        with self.used.get_lock():
+            self.used[ref.offset // self.slot_bytes] = 0
+        self.available.release()
+
+    def in_use(self):
+        return sum(self.used[:])
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        """
+        Removes the segment; called once by the process that created it.
+        """
+        self.shm.close()
+        self.shm.unlink()
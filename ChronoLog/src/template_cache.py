@@ -0,0 +1,143 @@
+import hashlib
+import multiprocessing
+from multiprocessing import shared_memory
+from config import MSG_CACHE_SIZE, MSG_CACHE_WAYS
+
+# Slots of the header array
+_CLOCK, _HITS, _MISSES, _EVICTIONS, _PREWARMED = range(5)
+
+
+def template_key(template):
+    """
+    128-bit digest of a template as two signed 64-bit words (key, check). The key
+    picks the set and is 0 only for an empty entry; the check word is compared too,
+    so two templates are confused only if all 128 bits collide.
+    """
+    digest = hashlib.blake2b(template.encode("utf-8"), digest_size=16).digest()
+    key = int.from_bytes(digest[:8], "little", signed=True)
+    return key or 1, int.from_bytes(digest[8:], "little", signed=True)
+
+
+class SharedTemplateCache:
+    """
+    Template -> message id cache shared by all writer processes, so a template
+    looked up by one writer is known to the others and the total size does not
+    grow with the number of writers.
+
+    It is a set-associative hash table in a shared memory segment: a template's
+    key picks one set of `ways` entries, and when the set is full its least
+    recently used entry is replaced. Entries hold the template's 128-bit digest
+    (key and check word), the message id and the time of last use (a shared clock). One lock guards the table and the hit, miss
+    and eviction counters; lookups take it once per batch of templates.
+    """
+
+    def __init__(self, size=MSG_CACHE_SIZE, ways=MSG_CACHE_WAYS):
+        self.ways = max(ways, 1)
+        self.sets = max(-(-size // self.ways), 1)
+        entries = self.sets * self.ways
+        # keys, check words, ids and last-use times as four int64 arrays
+        self.shm = shared_memory.SharedMemory(create=True, size=4 * 8 * entries)
+        self.lock = multiprocessing.Lock()
+        self.header = multiprocessing.RawArray("q", 5)
+        self._views = None
+
+    def __getstate__(self):
+        # memoryviews cannot be pickled; each process casts its own
+        state = self.__dict__.copy()
+        state["_views"] = None
+        return state
+
+    @property
+    def size(self):
+        return self.sets * self.ways
+
+    def _table(self):
+        if self._views is None:
+            entries = self.size
+            buf = self.shm.buf
+            self._views = tuple(buf[8 * entries * i:8 * entries * (i + 1)].cast("q") for i in range(4))
+        return self._views
+
+    def get_many(self, templates):
+        """
+        Returns the cached message id of each template, or None where it is not cached.
+        """
+        keys = [template_key(tmpl) for tmpl in templates]
+        table_keys, checks, ids, used = self._table()
+        header = self.header
+        result = []
+        with self.lock:
+            for key, check in keys:
+                start = (key % self.sets) * self.ways
+                for i in range(start, start + self.ways):
+                    if table_keys[i] == key and checks[i] == check:
+                        header[_CLOCK] += 1
+                        used[i] = header[_CLOCK]
+                        result.append(ids[i])
+                        break
+                else:
+                    result.append(None)
+            hits = len(result) - result.count(None)
+            header[_HITS] += hits
+            header[_MISSES] += len(result) - hits
+        return result
+
+    def put_many(self, pairs):
+        """
+        Stores (template, message id) pairs, replacing the least recently used entry
+        of a full set.
+        """
+        entries = [(template_key(tmpl), msg_id) for tmpl, msg_id in pairs]
+        table_keys, checks, ids, used = self._table()
+        header = self.header
+        with self.lock:
+            for (key, check), msg_id in entries:
+                start = (key % self.sets) * self.ways
+                slot = None
+                for i in range(start, start + self.ways):
+                    if table_keys[i] == key and checks[i] == check:
+                        slot = i
+                        break
+                    if slot is None or used[i] < used[slot]:
+                        slot = i
+                if table_keys[slot] and (table_keys[slot], checks[slot]) != (key, check):
+                    header[_EVICTIONS] += 1
+                header[_CLOCK] += 1
+                table_keys[slot] = key
+                checks[slot] = check
+                ids[slot] = msg_id
+                used[slot] = header[_CLOCK]
+
+    def claim_prewarm(self):
+        """
+        True for the first caller only, so the cache is filled from the database once.
+        """
+        with self.lock:
+            first = not self.header[_PREWARMED]
+            self.header[_PREWARMED] = 1
+        return first
+
+    def __len__(self):
+        table_keys = self._table()[0]
+        with self.lock:
+            return self.size - table_keys.tolist().count(0)
+
+    def stats(self):
+        with self.lock:
+            hits, misses, evictions = self.header[_HITS], self.header[_MISSES], self.header[_EVICTIONS]
+        return {"size": self.size, "hits": hits, "misses": misses, "evictions": evictions}
+
+    def close(self):
+        if self._views is not None:
+            for view in self._views:
+                view.release()
+            self._views = None
+        self.shm.close()
+
+    def unlink(self):
+        """
+        Frees the table once no writer uses it any more; only LogProcessor, which
+        created the cache, calls this, after the writers have exited.
+        """
+        self.close()
+        self.shm.unlink()
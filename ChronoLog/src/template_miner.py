@@ -0,0 +1,141 @@
+import json
+import re
+from collections import OrderedDict
+from config import TEMPLATE_DEPTH, TEMPLATE_SIMILARITY, TEMPLATE_MAX_CHILDREN, TEMPLATE_MAX_CLUSTERS
+
+# Placeholder for a variable part of a message, as in the Messages table and the web UI
+PARAM = "{num}"
+
+TIMESTAMP_PREFIX_RE = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}\S* ")
+# Whitespace-separated tokens; quoted strings stay whole even if they contain spaces
+TOKEN_RE = re.compile(r"""(?:"[^"]*"|'[^']*'|[^\s"']|["'])+""")
+# High-cardinality values masked inside a token, tried in this order
+MASK_RE = re.compile(
+    r"""("[^"]*"|'[^']*'"""                                                     # quoted strings
+    r"|\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"  # UUIDs
+    r"|\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"                                   # IPv4[:port]
+    r"|\b0[xX][0-9a-fA-F]+\b|\b(?=[0-9a-fA-F]*\d)(?=[0-9a-fA-F]*[a-fA-F])[0-9a-fA-F]{8,}\b"  # hex ids
+    r"|(?<![\w.])(?:/[\w.@~-]+)+/?"                                             # paths
+    r"|\b\d+(?:\.\d+)?)"                                                        # numbers, units stay: {num}ms
+)
+
+
+class LogCluster:
+    __slots__ = ("id", "tokens", "size")
+
+    def __init__(self, cluster_id, tokens):
+        self.id = cluster_id
+        self.tokens = tokens
+        self.size = 1
+
+
+class TemplateMiner:
+    """
+    Streaming message templating in the style of Drain (He et al., 2017).
+
+    Each message is split into tokens and high-cardinality values (quoted strings,
+    UUIDs, IPs, hex ids, paths, numbers) are masked. A fixed-depth tree routes the
+    message by token count and its first tokens to a small list of clusters; the
+    most similar cluster absorbs it, turning the positions where they differ into
+    parameters. So lines differing only in a user name or request id end up on one
+    template, and the work per line is roughly proportional to its token count.
+
+    The number of clusters is capped: the least recently used one is dropped when a
+    new cluster would exceed `max_clusters`.
+    """
+
+    def __init__(self, depth=TEMPLATE_DEPTH, similarity=TEMPLATE_SIMILARITY,
+                 max_children=TEMPLATE_MAX_CHILDREN, max_clusters=TEMPLATE_MAX_CLUSTERS):
+        # the tree has a length level plus depth-2 token levels above the leaves
+        self.prefix_tokens = max(depth - 2, 1)
+        self.similarity = similarity
+        self.max_children = max_children
+        self.max_clusters = max_clusters
+        self.root = {}
+        # cluster id -> (cluster, leaf list it lives in), in least recently used order
+        self.clusters = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self.clusters)
+
+    def template(self, line):
+        """
+        Returns (template, values) like make_template: the template with "{num}" for
+        every parameter and a JSON array of the parameter values (or None).
+        """
+        tokens, masked, values = self._tokenize(TIMESTAMP_PREFIX_RE.sub("", line, count=1))
+        if not tokens:
+            return "", None
+        cluster = self._match(masked)
+        params = []
+        for i, token in enumerate(cluster.tokens):
+            if token == PARAM and masked[i] != PARAM:
+                # generalised position: the whole original token is the value
+                params.append(tokens[i])
+            elif values[i]:
+                params.extend(values[i])
+        return " ".join(cluster.tokens), (json.dumps(params) if params else None)
+
+    @staticmethod
+    def _tokenize(text):
+        tokens = TOKEN_RE.findall(text)
+        masked = []
+        values = []
+        for token in tokens:
+            parts = MASK_RE.split(token)
+            if len(parts) == 1:
+                masked.append(token)
+                values.append(None)
+            else:
+                # split() with a capturing group alternates text and masked values
+                masked.append(PARAM.join(parts[::2]))
+                values.append(parts[1::2])
+        return tokens, masked, values
+
+    def _match(self, masked):
+        leaf = self._leaf(masked)
+        best, best_score = None, -1.0
+        for cluster in leaf:
+            score = self._score(cluster.tokens, masked)
+            if score > best_score:
+                best, best_score = cluster, score
+
+        if best is not None and best_score >= self.similarity:
+            for i, token in enumerate(best.tokens):
+                if token != masked[i] and token != PARAM:
+                    best.tokens[i] = PARAM
+            best.size += 1
+            self.clusters.move_to_end(best.id)
+            return best
+
+        cluster = LogCluster(self._next_id, list(masked))
+        self._next_id += 1
+        leaf.append(cluster)
+        self.clusters[cluster.id] = (cluster, leaf)
+        if len(self.clusters) > self.max_clusters:
+            _, (evicted, evicted_leaf) = self.clusters.popitem(last=False)
+            evicted_leaf.remove(evicted)
+        return cluster
+
+    @staticmethod
+    def _score(template, masked):
+        same = 0
+        for t, m in zip(template, masked):
+            if t == m or t == PARAM:
+                same += 1
+        return same / len(masked)
+
+    def _leaf(self, masked):
+        node = self.root.setdefault(len(masked), {})
+        for token in masked[:self.prefix_tokens]:
+            if any(c.isdigit() for c in token) or PARAM in token:
+                # variable-looking tokens never get their own branch
+                token = PARAM
+            child = node.get(token)
+            if child is None:
+                # a full node sends new tokens down its wildcard branch
+                key = token if len(node) < self.max_children else PARAM
+                child = node.setdefault(key, {})
+            node = child
+        return node.setdefault(None, [])
@@ -0,0 +1,160 @@
+import calendar
+import re
+from datetime import datetime, timedelta, timezone
+from config import TIMESTAMP_FORMATS
+
+# Cached prefixes are dropped wholesale once this many accumulate
+CACHE_LIMIT = 4096
+
+_SAMPLE = datetime(2000, 12, 31, 23, 59, 58)
+
+# strftime directives whose output width varies (month/day names, AM/PM, zones),
+# so the prefix a format is matched against cannot be sized from _SAMPLE
+VARIABLE_WIDTH = {"%A", "%B", "%p", "%z", "%Z"}
+
+# zone right after a fixed layout's seconds (past any fraction), e.g. +02:00, -0130, +02
+_ZONE_RE = re.compile(r"(?:[.,]\d*)?([+-])(\d{2})(?::?(\d{2}))?")
+# zone after a strptime format's timestamp, e.g. nginx "23/Nov/2025:14:00:00 +0200"
+_FORMAT_ZONE_RE = re.compile(r" ?([+-])(\d{2}):?(\d{2})(?!\d)")
+# a timestamp without a year is taken from last year if it would be further ahead than this
+FUTURE_SLACK = timedelta(days=1)
+
+
+def to_epoch(dt):
+    """
+    Seconds since 1970-01-01. Naive datetimes are taken as they are (no local
+    timezone applied), so the stored wall-clock time matches the log line.
+    """
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return calendar.timegm(dt.timetuple())
+
+
+def from_epoch(seconds):
+    """
+    Inverse of to_epoch, as a naive datetime.
+    """
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+
+class TimestampParser:
+    """
+    Turns the timestamp at the start of a log line into epoch seconds.
+
+    The built-in layouts YYYY-MM-DD HH:MM:SS and YYYY-MM-DDTHH:MM:SS are read by
+    slicing fixed positions; extra strptime formats from TIMESTAMP_FORMATS are
+    applied to a prefix of their fixed width. Parsed prefixes are cached, so all
+    lines logged within the same second cost a single dict lookup. A zone suffix
+    (Z, +HH:MM, -HHMM) after the timestamp converts the time to UTC, like to_epoch
+    does for aware datetimes.
+    """
+
+    def __init__(self, formats=None):
+        formats = TIMESTAMP_FORMATS if formats is None else formats
+        for fmt in formats:
+            variable = VARIABLE_WIDTH.intersection(re.findall(r"%.", fmt))
+            if variable:
+                raise ValueError(f"Timestamp format {fmt!r} uses variable-width directives: {', '.join(sorted(variable))}")
+        # (strptime format, width of the timestamp it produces, has a year, cache)
+        self.formats = [
+            (fmt, len(_SAMPLE.strftime(fmt)), "%Y" in fmt or "%y" in fmt, {}) for fmt in formats
+        ]
+        self._seconds = {}
+        self._days = {}
+
+    def parse(self, line):
+        """
+        Returns epoch seconds for the line's leading timestamp, or None.
+        """
+        if self._fixed_layout(line):
+            prefix = line[:19]
+            value = self._seconds.get(prefix)
+            if value is None:
+                value = self._parse_fixed(prefix)
+                if value is not None:
+                    self._remember(self._seconds, prefix, value)
+            if value is not None:
+                return value - self._zone_offset(line, 19) if len(line) > 19 and line[19] in ".,+-" else value
+
+        for fmt, width, has_year, cache in self.formats:
+            prefix = line[:width]
+            value = cache.get(prefix)
+            if value is None:
+                value = self._parse_format(prefix, fmt, has_year)
+                if value is not None:
+                    self._remember(cache, prefix, value)
+            if value is not None:
+                return value - self._zone_offset(line, width, _FORMAT_ZONE_RE)
+        # anything else ISO 8601 in the first token, e.g. a bare date
+        return self._parse_iso(line)
+
+    @staticmethod
+    def _remember(cache, prefix, value):
+        if len(cache) >= CACHE_LIMIT:
+            cache.clear()
+        cache[prefix] = value
+        return value
+
+    @staticmethod
+    def _fixed_layout(line):
+        # YYYY-MM-DD HH:MM:SS or YYYY-MM-DDTHH:MM:SS, followed by the end of the line,
+        # a space, a fraction or a zone suffix
+        return len(line) >= 19 and line[4] == "-" and line[7] == "-" and line[10] in " T" \
+            and line[13] == ":" and line[16] == ":" and (len(line) == 19 or line[19] in " .,Z+-")
+
+    @staticmethod
+    def _zone_offset(line, pos, pattern=_ZONE_RE):
+        # seconds east of UTC of the zone suffix at pos; 0 without one
+        m = pattern.match(line, pos)
+        if m is None:
+            return 0
+        sign, hh, mm = m.groups()
+        offset = int(hh) * 3600 + int(mm or 0) * 60
+        return -offset if sign == "-" else offset
+
+    def _parse_fixed(self, line):
+        # wall-clock seconds of a line that passed _fixed_layout; the zone is applied by parse
+        day = self.day(line[:10])
+        hh, mm, ss = line[11:13], line[14:16], line[17:19]
+        if day is None or not (hh + mm + ss).isdigit():
+            return None
+        hh, mm, ss = int(hh), int(mm), int(ss)
+        if hh > 23 or mm > 59 or ss > 59:
+            return None
+        return day + hh * 3600 + mm * 60 + ss
+
+    def day(self, date):
+        """
+        Epoch seconds of midnight on a YYYY-MM-DD date, or None if it is invalid.
+        """
+        day = self._days.get(date)
+        if day is None:
+            try:
+                day = to_epoch(datetime.strptime(date, "%Y-%m-%d"))
+            except ValueError:
+                return None
+            if len(self._days) >= CACHE_LIMIT:
+                self._days.clear()
+            self._days[date] = day
+        return day
+
+    def _parse_format(self, prefix, fmt, has_year):
+        try:
+            dt = datetime.strptime(prefix, fmt)
+        except ValueError:
+            return None
+        if not has_year:
+            # e.g. syslog "Nov 23 12:00:00": assume the current year, or the last one
+            # for a date still ahead, so December logs read in January stay in the past
+            now = datetime.now()
+            dt = dt.replace(year=now.year)
+            if dt - now > FUTURE_SLACK:
+                dt = dt.replace(year=now.year - 1)
+        return to_epoch(dt)
+
+    def _parse_iso(self, line):
+        token = line.split(" ", 1)[0]
+        try:
+            return to_epoch(datetime.fromisoformat(token))
+        except ValueError:
+            return None
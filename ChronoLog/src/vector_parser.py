@@ -0,0 +1,175 @@
+import re
+from config import LEVEL_EVENTS
+from event_batch import EventBatch
+from ingest_rules import SAMPLE_EPSILON
+
+try:
+    import numpy as np
+except ImportError:  # optional, only needed for the vectorized metric path
+    np = None
+
+# Longest value read in bulk; longer ones (beyond exact float64 integers) go to the line parser
+MAX_DIGITS = 15
+# Bytes past the end of the buffer that fixed-offset reads may touch
+_PAD = 32
+_KEY_RE = re.compile(r"[a-zA-Z_][a-zA-Z0-9_]*")
+_TIMESTAMP_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+
+if np is not None:
+    # bytes that LINE_RE's \b treats as part of a word
+    _WORD = np.zeros(256, dtype=bool)
+    for _c in b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_":
+        _WORD[_c] = True
+    _TIMESTAMP_END = np.zeros(256, dtype=bool)
+    for _c in b" .,Z+-\r":
+        _TIMESTAMP_END[_c] = True
+
+
+def _find_all(buf, pattern):
+    """
+    Start positions of every occurrence of `pattern` in a uint8 array.
+    """
+    if len(buf) < len(pattern):
+        return np.empty(0, dtype=np.int64)
+    pos = np.flatnonzero(buf[:len(buf) - len(pattern) + 1] == pattern[0])
+    for i in range(1, len(pattern)):
+        pos = pos[buf[pos + i] == pattern[i]]
+    return pos
+
+
+def _digits(a, b):
+    return (a - 48) * 10 + (b - 48)
+
+
+class VectorParser:
+    """
+    Bulk path for metric lines of the default format: a whole chunk is scanned as a
+    NumPy byte array instead of line by line. Timestamps at their fixed positions and
+    the values of the tracked keys are converted for all lines at once and appended
+    to the batch as whole columns.
+
+    Lines this path cannot take exactly as LogParser would (level tokens, unusual
+    timestamps, oversized values) are decoded and handed to the line parser, so the
+    events are the same either way, only their order within the batch differs.
+    Needs NumPy and a TRACK_VARIABLES list, since the keys are searched by name.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.keys = [
+            (key, key.encode("ascii") + b"=") for key in sorted(parser.variables)
+            if _KEY_RE.fullmatch(key) and key.upper() not in LEVEL_EVENTS
+        ]
+        self.levels = [level.encode("ascii") for level in LEVEL_EVENTS]
+
+    @staticmethod
+    def available(parser):
+        return np is not None and bool(parser.variables)
+
+    def parse(self, data, source=None):
+        """
+        Parses a newline-aligned block of raw bytes (bytes or a memoryview) into an EventBatch.
+        """
+        batch = EventBatch(source)
+        raw = np.frombuffer(data, dtype=np.uint8)
+        size = len(raw)
+        if not size:
+            return batch
+        buf = np.concatenate((raw, np.zeros(_PAD, dtype=np.uint8)))
+
+        ends = np.flatnonzero(raw == 10)
+        if not len(ends) or ends[-1] != size - 1:
+            ends = np.append(ends, size)
+        starts = np.concatenate(([0], ends[:-1] + 1))
+
+        times, fast = self._timestamps(buf, starts, ends)
+        # word boundaries and digits are wider in Unicode, so non-ASCII lines go the slow way
+        fast[np.searchsorted(starts, np.flatnonzero(raw >= 128), "right") - 1] = False
+        for level in self.levels:
+            # any line mentioning a level is left to the line parser
+            fast[np.searchsorted(starts, _find_all(raw, level), "right") - 1] = False
+
+        columns = []
+        for key, pattern in self.keys:
+            line, values, oversized = self._values(buf, raw, starts, pattern)
+            fast[oversized] = False
+            columns.append((key, line, values))
+
+        for key, line, values in columns:
+            keep = fast[line]
+            line, values = line[keep], values[keep]
+            span = self.parser.rules.sample_span(key, len(line))
+            if span is not None:
+                credit, rate = span
+                steps = np.floor(credit + np.arange(len(line) + 1) * rate + SAMPLE_EPSILON)
+                sampled = steps[1:] > steps[:-1]
+                line, values = line[sampled], values[sampled]
+            if len(line):
+                batch.add_metrics(np.ascontiguousarray(times[line]), key,
+                                  np.ascontiguousarray(values, dtype=np.float64))
+
+        for i in np.flatnonzero(~fast):
+            line = str(data[starts[i]:ends[i]], "utf-8", errors="replace").strip()
+            if line:
+                self.parser.parse_line(line, self.parser.extract_timestamp(line), batch)
+        return batch
+
+    def _timestamps(self, buf, starts, ends):
+        # YYYY-MM-DD HH:MM:SS (or T) at the start of every line, read at fixed offsets
+        head = buf[starts[:, None] + np.arange(_PAD)]
+        digits = head[:, _TIMESTAMP_DIGITS]
+        fast = (
+            ((ends - starts) >= 19)
+            & np.all((digits >= 48) & (digits <= 57), axis=1)
+            & (head[:, 4] == 45) & (head[:, 7] == 45) & (head[:, 13] == 58) & (head[:, 16] == 58)
+            & ((head[:, 10] == 32) | (head[:, 10] == 84))
+            & (((ends - starts) == 19) | _TIMESTAMP_END[head[:, 19]])
+        )
+        # a zone offset after the seconds or their fraction shifts the time: leave those lines to the parser
+        fraction = (head[:, 19] == 46) | (head[:, 19] == 44)
+        after = head[:, 20:]
+        zone_at = np.where(fraction, 20 + np.argmin((after >= 48) & (after <= 57), axis=1), 19)
+        zone = head[np.arange(len(head)), zone_at]
+        fast &= (zone != 43) & (zone != 45)
+        head = head.astype(np.int64)
+        hh, mm, ss = _digits(head[:, 11], head[:, 12]), _digits(head[:, 14], head[:, 15]), _digits(head[:, 17], head[:, 18])
+        fast &= (hh <= 23) & (mm <= 59) & (ss <= 59)
+        date = _digits(head[:, 0], head[:, 1]) * 1000000 + _digits(head[:, 2], head[:, 3]) * 10000 \
+            + _digits(head[:, 5], head[:, 6]) * 100 + _digits(head[:, 8], head[:, 9])
+
+        # only a handful of distinct dates per chunk: resolve those through the parser's cache
+        unique, index = np.unique(np.where(fast, date, 0), return_inverse=True)
+        days = np.zeros(len(unique), dtype=np.int64)
+        valid = np.zeros(len(unique), dtype=bool)
+        for i, d in enumerate(unique.tolist()):
+            day = self.parser.timestamps.day(f"{d // 10000:04d}-{d // 100 % 100:02d}-{d % 100:02d}") if d else None
+            if day is not None:
+                days[i], valid[i] = day, True
+        fast &= valid[index]
+        return days[index] + hh * 3600 + mm * 60 + ss, fast
+
+    @staticmethod
+    def _values(buf, raw, starts, pattern):
+        """
+        Returns (line index, value) of the first `key=digits` per line, as LINE_RE
+        would match it, plus the lines whose value is too long to read here.
+        """
+        pos = _find_all(raw, pattern)
+        # the key must start a word, and the digits must end one
+        pos = pos[(pos == 0) | ~_WORD[buf[pos - 1]]]
+        window = buf[(pos + len(pattern))[:, None] + np.arange(MAX_DIGITS + 1)]
+        is_digit = (window >= 48) & (window <= 57)
+        length = np.argmin(is_digit, axis=1)
+        oversized = np.searchsorted(starts, pos[is_digit.all(axis=1)], "right") - 1
+        ends_word = ~_WORD[window[np.arange(len(pos)), length]]
+        match = (length > 0) & ends_word
+        pos, window, length = pos[match], window[match].astype(np.int64) - 48, length[match]
+
+        line = np.searchsorted(starts, pos, "right") - 1
+        line, first = np.unique(line, return_index=True)
+        window, length = window[first], length[first]
+        values = np.zeros(len(line), dtype=np.int64)
+        for i in range(MAX_DIGITS):
+            more = i < length
+            values[more] = values[more] * 10 + window[more, i]
+        return line, values, oversized
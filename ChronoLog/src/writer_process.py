@@ -1,87 +1,417 @@
-﻿import time
-import re
+﻿import hashlib
 import json
+import time
 import os
 import queue
-from facade import ChronoLogFacade
-from config import WRITER_FLUSH_INTERVAL
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from facade import ChronoLogFacade, INSERT_ENGINES
+from config import (WRITER_FLUSH_INTERVAL, WRITER_BATCH_ROWS, WRITER_BATCH_BYTES, WRITER_RETRIES, WRITER_RETRY_DELAY,
+                    DEAD_LETTER_DIR, MSG_CACHE_SIZE, INSERT_ENGINE)
+from event_batch import NO_TEMPLATE, NO_TIME
+from shared_transport import SharedRef
+
+EPOCH = datetime(1970, 1, 1)
+# Longest wait for a queue item, so stop requests and flush deadlines are noticed
+QUEUE_GET_TIMEOUT = 0.5
+# Rough size of a typed row without its strings, for WRITER_BATCH_BYTES
+ROW_BYTES = 64
+# Queued once per writer after the last chunk; a writer exits when it takes one
+STOP = None
+# Messages.Template and TimelineEvents.MessageValues are NVARCHAR(500)
+MAX_TEMPLATE_CHARS = 500
+MAX_VALUES_CHARS = 500
+# Marks a value or template shortened to fit its column
+ELLIPSIS = "..."
+
+
+def fit_template(template):
+    """
+    Shortens a template longer than MAX_TEMPLATE_CHARS, ending it with a hash of the
+    full template so distinct long templates keep distinct message ids.
+    """
+    if len(template) <= MAX_TEMPLATE_CHARS:
+        return template
+    digest = hashlib.blake2b(template.encode("utf-8"), digest_size=8).hexdigest()
+    return template[:MAX_TEMPLATE_CHARS - len(ELLIPSIS) - len(digest) - 1] + ELLIPSIS + "#" + digest
+
+
+def fit_values(msg_values):
+    """
+    Shortens the longest values of a JSON array of message values until the array
+    fits MAX_VALUES_CHARS, so it stays valid JSON instead of being cut by the column.
+    """
+    if msg_values is None or len(msg_values) <= MAX_VALUES_CHARS:
+        return msg_values
+    values = [str(v) for v in json.loads(msg_values)]
+    encoded = json.dumps(values)
+    while len(encoded) > MAX_VALUES_CHARS:
+        longest = max(range(len(values)), key=lambda i: len(values[i]))
+        value = values[longest]
+        if len(value) <= len(ELLIPSIS):
+            # too many values to fit even when shortened: keep as many as fit
+            values = values[:-1]
+        else:
+            keep = max(len(value) - (len(encoded) - MAX_VALUES_CHARS) - len(ELLIPSIS), 0)
+            values[longest] = value[:keep] + ELLIPSIS
+        encoded = json.dumps(values)
+    return encoded
+
 
 class WriterProcess:
-    def __init__(self, flush_interval=WRITER_FLUSH_INTERVAL):
+    """
+    Takes parsed chunks off the queue and writes them to the database. Rows of
+    consecutive chunks are encoded into one pending batch, which is flushed when it
+    reaches `batch_rows` rows or `batch_bytes` bytes, or `flush_interval` seconds after
+    its first chunk arrived. Flushes run on a background thread, so the next batch is
+    encoded while the previous one is being inserted; at most one insert is in flight.
+    Chunks are acknowledged only once the batch that holds them is committed; a
+    batch whose insert (or a chunk whose template lookup) keeps failing after
+    `retries` attempts is saved to `dead_letter_dir` instead, and acknowledged then.
+    """
+
+    def __init__(self, flush_interval=WRITER_FLUSH_INTERVAL, insert_engine=INSERT_ENGINE,
+                 batch_rows=WRITER_BATCH_ROWS, batch_bytes=WRITER_BATCH_BYTES, retries=WRITER_RETRIES,
+                 retry_delay=WRITER_RETRY_DELAY, dead_letter_dir=DEAD_LETTER_DIR):
+        if insert_engine not in INSERT_ENGINES:
+            raise ValueError(f"Unknown insert engine {insert_engine!r}, expected one of {', '.join(INSERT_ENGINES)}")
         self.flush_interval = flush_interval
+        self.insert_engine = insert_engine
+        self.batch_rows = batch_rows
+        self.batch_bytes = batch_bytes
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.dead_letter_dir = dead_letter_dir
+        # failed inserts, batches saved to dead_letter_dir, and batches lost altogether
+        # (their chunks are never acknowledged, so the checkpoint stops before them)
+        self.failures = {"retried": 0, "dead_lettered": 0, "lost": 0, "rows_without_time": 0}
         self.facade = ChronoLogFacade()
         self.msg_cache = {} 
+        self.ack_queue = None
+        self.transport = None
+        # SharedTemplateCache used by all writers instead of msg_cache, if given to run()
+        self.template_cache = None
+        # the batch being filled: encoded rows (JSON fragments for the json engine),
+        # markers of the chunks in it, and when its first chunk arrived
+        self._pending = []
+        self._pending_rows = 0
+        self._pending_bytes = 0
+        self._pending_markers = []
+        self._pending_since = None
+        # single flush thread and the insert it is running; created on first use
+        self._flusher = None
+        self._inflight = None
 
-    def run(self, queue, stop_flag):
+    def run(self, queue, ack_queue=None, transport=None, template_cache=None):
+        """
+        Writes queued chunks until it takes a STOP sentinel off the queue. The parent
+        queues one per writer behind the last chunk, so everything before it is written.
+        """
+        self.ack_queue = ack_queue
+        self.transport = transport
+        self.template_cache = template_cache
         print(f"WriterProcess started. PID: {os.getpid()}")
+        self._prewarm_cache()
+        stopped = False
         try:
-            while not stop_flag.is_set() or not queue.empty():
-                self._process_queue(queue)
+            while self._process_queue(queue):
+                pass
+            stopped = True
         except KeyboardInterrupt:
             print("WriterProcess interrupted")
         except Exception as e:
             print(f"WriterProcess crashed: {e}")
         finally:
-            print("WriterProcess draining queue...")
-            while not queue.empty():
-                self._process_queue(queue)
+            if not stopped:
+                print("WriterProcess draining queue...")
+                while self._process_queue(queue):
+                    pass
+            self.flush()
+            if self._flusher is not None:
+                self._flusher.shutdown()
+            print(f"WriterProcess connection pool: {self.facade.get_pool_stats()}")
+            print(f"WriterProcess failures: {self.failures}")
+            if self.template_cache is not None:
+                self.template_cache.close()
+            self.facade.close()
             print("WriterProcess finished")
 
     def _process_queue(self, queue_obj):
+        # Handles one queue item; False once the STOP sentinel was taken
         try:
-            item = queue_obj.get(timeout=0.5)
+            item = queue_obj.get(timeout=self._wait_time())
+            if item is STOP:
+                return False
             if not item:
-                return
-                
-            delta_events, delta_timeline = item
-            print(f"Writer received chunk with {len(delta_timeline)} events") # DEBUG
-            
-            bulk_data = []
-            for entry in delta_timeline:
-                processed = self._prepare_entry(entry)
-                if processed:
-                    bulk_data.append(processed)
-            
-            if bulk_data:
-                print(f"Bulk inserting {len(bulk_data)} events") # DEBUG
-                self.facade.bulk_insert_timeline_events(bulk_data)
-            else:
-                # pass
-                print("No data to insert") # DEBUG
+                return True
+
+            batch, marker = self._unpack(item)
+            print(f"Writer received chunk with {len(batch)} events") # DEBUG
+            self._add(batch, marker)
 
         except queue.Empty:
             print("Writer queue empty, waiting...") # DEBUG
             pass
         except Exception as e:
-            print(f"Writer error: {e}") # DEBUG
-            pass
+            print(f"Writer error: {e}; the chunk stays unacknowledged")
+            self.failures["lost"] += 1
+        if self._flush_due():
+            self._flush()
+        return True
+
+    def _wait_time(self):
+        if self._pending_since is None:
+            return QUEUE_GET_TIMEOUT
+        left = self._pending_since + self.flush_interval - time.monotonic()
+        return max(0.0, min(QUEUE_GET_TIMEOUT, left))
+
+    def _add(self, batch, marker):
+        # Encodes the chunk's rows onto the pending batch. Template resolution needs the
+        # database too, so it is retried like an insert; a chunk whose templates still
+        # cannot be resolved is saved with its templates and acknowledged.
+        try:
+            rows = self._retrying(f"Resolving templates of {len(batch)} events", lambda: self._encode(batch))
+        except Exception as e:
+            print(f"Resolving templates of {len(batch)} events failed after {self.retries + 1} attempts: {e}")
+            if self._dead_letter("unresolved", json.dumps(list(batch.rows()), default=str), len(batch)):
+                self._acknowledge(marker)
+            else:
+                self.failures["lost"] += 1
+            return
+        if self.insert_engine == "json":
+            if rows:
+                encoded = json.dumps(rows)
+                self._pending.append(encoded[1:-1])
+                self._pending_bytes += len(encoded)
+        else:
+            self._pending.extend(rows)
+            self._pending_bytes += len(rows) * (ROW_BYTES + len(batch.source or "")) \
+                + sum(len(v) for v in batch.msg_values if v)
+        self._pending_rows += len(rows)
+        self._pending_markers.append(marker)
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+
+    def _encode(self, batch):
+        return self._prepare_batch(batch) if self.insert_engine == "json" else self._prepare_rows(batch)
+
+    def _flush_due(self):
+        return self._pending_since is not None and (
+            self._pending_rows >= self.batch_rows
+            or self._pending_bytes >= self.batch_bytes
+            or time.monotonic() - self._pending_since >= self.flush_interval
+        )
+
+    def _flush(self):
+        # Hands the pending batch to the flush thread and starts a new one
+        if self._pending_since is None:
+            return
+        rows, count, markers = self._pending, self._pending_rows, self._pending_markers
+        self._pending, self._pending_rows, self._pending_bytes = [], 0, 0
+        self._pending_markers, self._pending_since = [], None
+        # double buffering: wait for the previous insert before starting this one
+        self._wait_for_flush()
+        if self._flusher is None:
+            self._flusher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer-flush")
+        self._inflight = self._flusher.submit(self._write, rows, count, markers)
+
+    def _wait_for_flush(self):
+        if self._inflight is not None:
+            self._inflight.result()
+            self._inflight = None
+
+    def flush(self):
+        """
+        Writes the pending batch now and waits until it is committed.
+        """
+        self._flush()
+        self._wait_for_flush()
 
-    def _prepare_entry(self, entry):
-        msg_key = entry.get("msg")
-        msg_id = None
-        msg_values = None
-
-        if msg_key:
-            stripped = re.sub(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} ", "", msg_key)
-            nums = re.findall(r"\b\d+\b", stripped)
-            tmpl = re.sub(r"\b\d+\b", "{num}", stripped)
-
-            # Check local cache first
-            msg_id = self.msg_cache.get(tmpl)
-            if msg_id is None:
-                # Get from DB (or create)
-                msg_id = self.facade.get_or_create_message_id(tmpl)
-                if msg_id is not None:
-                    msg_id = int(msg_id)
-                    self.msg_cache[tmpl] = msg_id
-
-            if nums:
-                msg_values = json.dumps(nums)
-
-        return {
-            "time": entry["time"],
-            "event": entry["event"],
-            "msg_id": msg_id,
-            "msg_values": msg_values,
-            "value": entry.get("value") # Pass as number or None
-        }
\ No newline at end of file
+    def _write(self, rows, count, markers):
+        if count:
+            print(f"Bulk inserting {count} events") # DEBUG
+            if not self._insert(rows, count) and not self._dead_letter(self.insert_engine, self._document(rows), count):
+                self.failures["lost"] += 1
+                return
+        else:
+            print("No data to insert") # DEBUG
+
+        # Only acknowledge once the chunks are committed (or saved), so checkpoints never skip data
+        for marker in markers:
+            self._acknowledge(marker)
+
+    def _insert(self, rows, count):
+        # False once every attempt failed
+        try:
+            if self.insert_engine == "json":
+                self._retrying(f"Insert of {count} events",
+                               lambda: self.facade.bulk_insert_timeline_json(self._document(rows)))
+            else:
+                self._retrying(f"Insert of {count} events",
+                               lambda: self.facade.bulk_insert_timeline_rows(rows, self.insert_engine))
+            return True
+        except Exception as e:
+            print(f"Insert of {count} events failed after {self.retries + 1} attempts: {e}")
+            return False
+
+    def _retrying(self, what, action):
+        # Runs action, retrying failures with exponential backoff; the last failure is raised
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                return action()
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                self.failures["retried"] += 1
+                print(f"{what} failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                delay *= 2
+
+    def _document(self, rows):
+        # JSON array of pending rows: fragments for the json engine, typed tuples otherwise
+        if self.insert_engine == "json":
+            return "[" + ",".join(rows) + "]"
+        return json.dumps(rows, default=str)
+
+    def _dead_letter(self, kind, document, count):
+        # Saves rows that could not be written, as a JSON array
+        path = self.dead_letter_dir / f"{kind}-{os.getpid()}-{time.time_ns()}.json"
+        try:
+            self.dead_letter_dir.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(document)
+        except OSError as e:
+            print(f"Could not save {count} events to {path}: {e}; their chunks stay unacknowledged")
+            return False
+        self.failures["dead_lettered"] += 1
+        print(f"Saved {count} events that could not be written to {path}")
+        return True
+
+    def _unpack(self, item):
+        # (EventBatch, marker), or (SharedRef, marker) when the batch was left in shared memory
+        batch = item[0]
+        if isinstance(batch, SharedRef):
+            batch = self.transport.take(batch)
+        return batch, (item[1] if len(item) > 1 else None)
+
+    def _acknowledge(self, marker):
+        if self.ack_queue is not None and marker is not None:
+            self.ack_queue.put(marker)
+
+    def _prepare_batch(self, batch):
+        # Templates come ready-made from the parser; the distinct templates of the
+        # batch are resolved together, then rows only reference the resulting ids.
+        msg_ids = self._message_ids(batch.templates)
+        rows = []
+        for i in range(len(batch)):
+            t = batch.time_at(i)
+            if t is None:
+                # EventTime is NOT NULL: one such row would fail the whole insert
+                self._skip_row_without_time(batch)
+                continue
+            tmpl = batch.template_ids[i]
+            row = {
+                "time": t,
+                "event": batch.event_names[batch.event_codes[i]],
+                "msg_id": msg_ids[tmpl] if tmpl != NO_TEMPLATE else None,
+                "msg_values": fit_values(batch.msg_values[i]),
+                "value": batch.value_at(i), # Pass as number or None
+                "source": batch.source
+            }
+            if batch.counts is not None:
+                # pre-aggregated row: value is the sum of `count` events
+                row["count"] = batch.counts[i]
+                if row["value"] is not None:
+                    row["min"], row["max"] = batch.mins[i], batch.maxs[i]
+            rows.append(row)
+        return rows
+
+    def _prepare_rows(self, batch):
+        # Same rows as _prepare_batch, as typed tuples in TIMELINE_COLUMNS order for the
+        # executemany and tvp engines. Values are always floats so every row binds alike.
+        # NO_TEMPLATE (-1) picks the trailing None
+        msg_ids = self._message_ids(batch.templates) + [None]
+        names = batch.event_names
+        source = batch.source
+        aggregated = batch.counts is not None
+        rows = []
+        for i, (t, code, value, tmpl, msg_values) in enumerate(zip(
+                batch.times, batch.event_codes, batch.values, batch.template_ids, batch.msg_values)):
+            if t == NO_TIME:
+                self._skip_row_without_time(batch)
+                continue
+            if value != value:  # NaN: no value
+                value = low = high = None
+            elif aggregated:
+                low, high = batch.mins[i], batch.maxs[i]
+            else:
+                low = high = None
+            rows.append((
+                EPOCH + timedelta(seconds=t),
+                names[code],
+                msg_ids[tmpl],
+                fit_values(msg_values),
+                value,
+                source,
+                batch.counts[i] if aggregated else 1,
+                low,
+                high,
+            ))
+        return rows
+
+    def _skip_row_without_time(self, batch):
+        if not self.failures["rows_without_time"]:
+            print(f"Dropping events without a timestamp (first seen in {batch.source})")
+        self.failures["rows_without_time"] += 1
+
+    def _message_ids(self, templates):
+        # Check the cache first; all templates missing from it are then fetched
+        # (or created) in a single round-trip
+        templates = [fit_template(tmpl) for tmpl in templates]
+        if self.template_cache is not None:
+            msg_ids = self.template_cache.get_many(templates)
+        else:
+            msg_ids = [self.msg_cache.get(tmpl) for tmpl in templates]
+        missing = [tmpl for tmpl, msg_id in zip(templates, msg_ids) if msg_id is None]
+        if missing:
+            resolved = self.facade.get_or_create_message_ids(missing)
+            found = []
+            for i, tmpl in enumerate(templates):
+                if msg_ids[i] is None and resolved.get(tmpl) is not None:
+                    msg_ids[i] = int(resolved[tmpl])
+                    found.append((tmpl, msg_ids[i]))
+            self._cache_messages(found)
+        return msg_ids
+
+    def _cache_messages(self, pairs):
+        if self.template_cache is not None:
+            self.template_cache.put_many(pairs)
+            return
+        for tmpl, msg_id in pairs:
+            if len(self.msg_cache) >= MSG_CACHE_SIZE:
+                self.msg_cache.clear()
+            self.msg_cache[tmpl] = msg_id
+
+    def _prewarm_cache(self):
+        """
+        Fills the message cache from the Messages table (newest templates first, up to
+        MSG_CACHE_SIZE), so a restarted writer does not look up known templates again.
+        A shared cache is filled by the first writer only.
+        """
+        if self.template_cache is not None and not self.template_cache.claim_prewarm():
+            return
+        try:
+            messages = self.facade.get_messages()
+        except Exception as e:
+            print(f"Could not prewarm message cache: {e}")
+            return
+        newest = sorted(((int(msg_id), tmpl) for msg_id, tmpl in messages.items()), reverse=True)
+        if self.template_cache is not None:
+            # oldest first, so the newest templates count as the most recently used
+            self.template_cache.put_many((tmpl, msg_id) for msg_id, tmpl in reversed(newest[:MSG_CACHE_SIZE]))
+            print(f"Shared message cache prewarmed with {len(self.template_cache)} templates")
+            return
+        for msg_id, tmpl in newest[:MSG_CACHE_SIZE]:
+            self.msg_cache.setdefault(tmpl, msg_id)
+        print(f"Message cache prewarmed with {len(self.msg_cache)} templates")
@@ -31,8 +31,8 @@ def debug_pipeline():
     for chunk in reader:
         chunk_count += 1
         total_lines += len(chunk)
-        events, timeline = parser.parse_lines(chunk)
-        total_events += len(timeline)
+        batch = parser.parse_lines(chunk)
+        total_events += len(batch)
         
         if chunk_count % 10 == 0:
             print(f"Processed {chunk_count} chunks, {total_lines} lines...")
@@ -1,7 +1,7 @@
 import sys
 import os
 import json
-from datetime import datetime
+import time
 from pathlib import Path
 
 # Add src to path
@@ -16,14 +16,14 @@ def test_bulk_insert():
     # Create some dummy events
     events = [
         {
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "time": int(time.time()),
             "event": "test_event",
             "msg_id": None,
             "msg_values": None,
             "value": "123.45"
         },
         {
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "time": int(time.time()),
             "event": "test_event_2",
             "msg_id": None,
             "msg_values": None,
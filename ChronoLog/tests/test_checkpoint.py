@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from src.checkpoint import CheckpointStore, OffsetTracker
+
+
+class TestOffsetTracker(unittest.TestCase):
+    def test_out_of_order_commits(self):
+        tracker = OffsetTracker(0)
+        self.assertFalse(tracker.commit(100, 200))
+        self.assertFalse(tracker.commit(200, 300))
+        self.assertEqual(tracker.watermark, 0)
+        # the missing first range closes the gap
+        self.assertTrue(tracker.commit(0, 100))
+        self.assertEqual(tracker.watermark, 300)
+        self.assertEqual(tracker.pending, {})
+
+    def test_already_committed_range_ignored(self):
+        tracker = OffsetTracker(500)
+        self.assertFalse(tracker.commit(0, 100))
+        self.assertEqual(tracker.watermark, 500)
+
+
+class TestCheckpointStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmpdir.name)
+        self.log = self.dir / "app.log"
+        self.log.write_bytes(b"line 1\nline 2\nline 3\n")
+        self.store_path = self.dir / "state" / "checkpoints.json"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_save_and_resume(self):
+        store = CheckpointStore(self.store_path)
+        store.update(self.log, 14)
+        store.save()
+
+        reloaded = CheckpointStore(self.store_path)
+        self.assertEqual(reloaded.resume_offset(self.log), 14)
+
+    def test_missing_checkpoint_starts_at_zero(self):
+        store = CheckpointStore(self.store_path)
+        self.assertEqual(store.resume_offset(self.log), 0)
+
+    def test_truncated_file_starts_at_zero(self):
+        store = CheckpointStore(self.store_path)
+        store.update(self.log, 14)
+        self.log.write_bytes(b"new\n")
+        self.assertEqual(store.resume_offset(self.log), 0)
+
+    def test_rotated_file_starts_at_zero(self):
+        store = CheckpointStore(self.store_path)
+        store.update(self.log, 14)
+        # rotation: the old file is renamed and a new one created under the same name
+        os.rename(self.log, self.dir / "app.log.1")
+        self.log.write_bytes(b"line 1\nline 2\nline 3\nline 4\n")
+        self.assertEqual(store.resume_offset(self.log), 0)
+
+    def test_corrupt_file_is_ignored(self):
+        self.store_path.parent.mkdir(parents=True)
+        self.store_path.write_text("{not json", encoding="utf-8")
+        store = CheckpointStore(self.store_path)
+        self.assertEqual(store.entries, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
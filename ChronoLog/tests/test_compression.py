@@ -0,0 +1,104 @@
+import bz2
+import gzip
+import lzma
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+from src import compression
+from src.compression import detect_compression, member_units, group_units, read_member_range
+from src.file_chunk_reader import FileChunkReader, decode_lines
+
+
+def bgzf_member(data):
+    # gzip member with the 'BC' extra subfield holding the member size, as written by bgzip
+    deflate = zlib.compressobj(6, zlib.DEFLATED, -15)
+    body = deflate.compress(data) + deflate.flush()
+    size = 12 + 6 + len(body) + 8
+    header = b"\x1f\x8b\x08\x04" + b"\x00" * 4 + b"\x00\xff" + struct.pack("<H", 6)
+    extra = b"BC" + struct.pack("<HH", 2, size - 1)
+    return header + extra + body + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.lines = [f"2025-11-23 12:00:{i:02d} INFO line {i}" for i in range(40)]
+        self.text = ("\n".join(self.lines) + "\n").encode("utf-8")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def _bgzf(self, block_size=50):
+        # blocks cut at fixed sizes, so most of them split a line in the middle
+        blocks = [self.text[i:i + block_size] for i in range(0, len(self.text), block_size)]
+        # bgzip ends files with an empty EOF member
+        return self._write("app.log.gz", b"".join(bgzf_member(b) for b in blocks) + bgzf_member(b""))
+
+    def test_detect_compression(self):
+        self.assertEqual(detect_compression(self._write("a.gz", gzip.compress(self.text))), "gzip")
+        self.assertEqual(detect_compression(self._write("a.bz2", bz2.compress(self.text))), "bz2")
+        self.assertEqual(detect_compression(self._write("a.xz", lzma.compress(self.text))), "xz")
+        self.assertIsNone(detect_compression(self._write("a.log", self.text)))
+
+    def test_streams_single_stream_codecs(self):
+        for name, data in (("a.gz", gzip.compress(self.text) + gzip.compress(b"tail\n")),
+                           ("a.bz2", bz2.compress(self.text)),
+                           ("a.xz", lzma.compress(self.text))):
+            reader = FileChunkReader(self._write(name, data), live=False, chunk_bytes=64)
+            lines = [l for chunk in reader for l in chunk]
+            self.assertEqual(lines[:40], self.lines, name)
+            self.assertIsNone(reader.member_ranges(), name)
+
+    def test_stream_resumes_from_decompressed_offset(self):
+        path = self._write("a.gz", gzip.compress(self.text))
+        offset = len(self.text) - len(self.lines[-1]) - 1
+        reader = FileChunkReader(path, live=False, start_offset=offset)
+        self.assertEqual([l for chunk in reader for l in chunk], [self.lines[-1]])
+        self.assertEqual(reader.offset, len(self.text))
+
+    def test_bgzf_units_skip_empty_members(self):
+        path = self._bgzf()
+        units = member_units(path, "gzip")
+        self.assertEqual(units[0][0], 0)
+        self.assertEqual(units[-1][0] + units[-1][1], os.path.getsize(path))
+        self.assertEqual(len(units), -(-len(self.text) // 50))
+
+    def test_bgzf_ranges_yield_every_line_once(self):
+        path = self._bgzf()
+        for chunk_bytes in (1, 100, 10 ** 6):
+            lines = []
+            for offset, length, prev in group_units(member_units(path, "gzip"), chunk_bytes):
+                lines.extend(decode_lines(read_member_range(path, "gzip", offset, length, prev)))
+            self.assertEqual(lines, self.lines, chunk_bytes)
+
+    def test_plain_gzip_is_not_splittable(self):
+        self.assertIsNone(member_units(self._write("a.gz", gzip.compress(self.text)), "gzip"))
+
+    def test_group_units_rejects_unknown_start(self):
+        with self.assertRaises(ValueError):
+            list(group_units([(0, 10), (10, 10)], 5, start=3))
+
+    @unittest.skipIf(compression.zstandard is None, "zstandard not installed")
+    def test_zstd_frames_yield_every_line_once(self):
+        zstd = compression.zstandard.ZstdCompressor()
+        frames = [zstd.compress(self.text[i:i + 70]) for i in range(0, len(self.text), 70)]
+        path = self._write("app.log.zst", b"".join(frames))
+        self.assertEqual(detect_compression(path), "zstd")
+        lines = []
+        for offset, length, prev in group_units(member_units(path, "zstd"), 120):
+            lines.extend(decode_lines(read_member_range(path, "zstd", offset, length, prev)))
+        self.assertEqual(lines, self.lines)
+        reader = FileChunkReader(path, live=False, chunk_bytes=64)
+        self.assertEqual([l for chunk in reader for l in chunk], self.lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
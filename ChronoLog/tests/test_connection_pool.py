@@ -0,0 +1,88 @@
+import threading
+import unittest
+from src.connection_pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self, n):
+        self.n = n
+        self.alive = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.opened = []
+
+    def _connect(self):
+        conn = FakeConnection(len(self.opened))
+        self.opened.append(conn)
+        return conn
+
+    @staticmethod
+    def _ping(conn):
+        if not conn.alive:
+            raise ConnectionError("link down")
+
+    def _pool(self, **kwargs):
+        return ConnectionPool(self._connect, self._ping, **kwargs)
+
+    def test_connections_are_reused(self):
+        pool = self._pool(min_size=1, max_size=4)
+        self.assertEqual(len(self.opened), 1)
+        for _ in range(5):
+            conn = pool.acquire()
+            pool.release(conn)
+        self.assertEqual(len(self.opened), 1)
+        stats = pool.stats()
+        self.assertEqual((stats["size"], stats["idle"], stats["created"], stats["reused"]), (1, 1, 1, 5))
+
+    def test_max_size_bounds_checkouts(self):
+        pool = self._pool(min_size=0, max_size=2, timeout=0.05)
+        a, b = pool.acquire(), pool.acquire()
+        with self.assertRaises(TimeoutError):
+            pool.acquire()
+        # a connection returned by another thread wakes the waiting checkout
+        threading.Timer(0.01, pool.release, (a,)).start()
+        pool.timeout = 5
+        self.assertIs(pool.acquire(), a)
+        self.assertEqual(pool.stats()["timeouts"], 1)
+        self.assertEqual(pool.stats()["in_use"], 2)
+        pool.release(b)
+
+    def test_broken_connections_are_replaced_on_checkout(self):
+        pool = self._pool(min_size=1, max_size=2, ping_interval=0)
+        self.opened[0].alive = False
+        conn = pool.acquire()
+        self.assertIs(conn, self.opened[1])
+        self.assertTrue(self.opened[0].closed)
+        self.assertEqual(pool.stats()["broken"], 1)
+        pool.discard(conn)
+        self.assertEqual(pool.stats()["size"], 0)
+
+    def test_idle_connections_are_closed_down_to_min_size(self):
+        pool = self._pool(min_size=1, max_size=3, idle_timeout=0)
+        conns = [pool.acquire() for _ in range(3)]
+        for conn in conns:
+            pool.release(conn)
+        pool.release(pool.acquire())
+        self.assertEqual(pool.stats()["size"], 1)
+        self.assertEqual(pool.stats()["closed_idle"], 2)
+        self.assertEqual(sum(c.closed for c in self.opened), 2)
+
+    def test_close(self):
+        pool = self._pool(min_size=2)
+        conn = pool.acquire()
+        pool.close()
+        pool.release(conn)
+        self.assertTrue(all(c.closed for c in self.opened))
+        self.assertEqual(pool.stats()["size"], 0)
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+
+
+if __name__ == "__main__":
+    unittest.main()
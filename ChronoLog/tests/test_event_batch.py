@@ -0,0 +1,68 @@
+import pickle
+import unittest
+from array import array
+from src.event_batch import EventBatch
+
+
+class TestEventBatch(unittest.TestCase):
+    def setUp(self):
+        self.batch = EventBatch("app.log")
+        self.batch.add(1763899200, "error", template="ERROR User {num} failed", msg_values='["1"]')
+        self.batch.add(None, "latency", 42)
+        self.batch.add(1763899201, "error", template="ERROR User {num} failed", msg_values='["2"]')
+        self.batch.add(1763899202, "ratio", 0.5)
+
+    def test_rows_restore_timeline_entries(self):
+        self.assertEqual(list(self.batch.rows()), [
+            {"time": 1763899200, "event": "error", "template": "ERROR User {num} failed", "msg_values": '["1"]', "source": "app.log"},
+            {"time": None, "event": "latency", "value": 42, "source": "app.log"},
+            {"time": 1763899201, "event": "error", "template": "ERROR User {num} failed", "msg_values": '["2"]', "source": "app.log"},
+            {"time": 1763899202, "event": "ratio", "value": 0.5, "source": "app.log"},
+        ])
+
+    def test_names_and_templates_are_stored_once(self):
+        self.assertEqual(self.batch.event_names, ["error", "latency", "ratio"])
+        self.assertEqual(self.batch.templates, ["ERROR User {num} failed"])
+        self.assertEqual(list(self.batch.template_ids), [0, -1, 0, -1])
+
+    def test_add_metrics_appends_whole_columns(self):
+        self.batch.add_metrics(array("q", [1763899203, 1763899204]), "latency", array("d", [7, 8.5]))
+        rows = list(self.batch.rows())[4:]
+        self.assertEqual([(r["time"], r["event"], r["value"]) for r in rows],
+                         [(1763899203, "latency", 7), (1763899204, "latency", 8.5)])
+        self.assertEqual(self.batch.event_names, ["error", "latency", "ratio"])
+        self.assertEqual(len(self.batch.msg_values), 6)
+
+    def test_aggregated_merges_events_per_bucket(self):
+        for t in (1763899210, 1763899230, 1763899270):
+            self.batch.add(t, "error", template="ERROR User {num} failed", msg_values='["1"]')
+            self.batch.add(t, "latency", t % 100)
+        rows = list(self.batch.aggregated(60).rows())
+        self.assertEqual([(r["time"], r["event"], r["count"]) for r in rows], [
+            (1763899200, "error", 3),
+            (None, "latency", 1),
+            (1763899200, "error", 1),
+            (1763899200, "ratio", 1),
+            (1763899200, "latency", 2),
+            (1763899260, "error", 1),
+            (1763899260, "latency", 1),
+        ])
+        self.assertEqual((rows[4]["value"], rows[4]["min"], rows[4]["max"]), (40, 10, 30))
+        self.assertEqual(rows[0]["msg_values"], '["1"]')
+        # the aggregated batch keeps its counts across processes
+        copy = pickle.loads(pickle.dumps(self.batch.aggregated(60)))
+        self.assertEqual(list(copy.rows()), rows)
+        self.assertEqual(copy.count_at(0), 3)
+        self.assertEqual(self.batch.count_at(0), 1)
+
+    def test_pickle_round_trip(self):
+        copy = pickle.loads(pickle.dumps(self.batch))
+        self.assertEqual(list(copy.rows()), list(self.batch.rows()))
+        # the copy can keep growing with the same codes
+        copy.add(1763899203, "latency", 7)
+        self.assertEqual(copy.event_codes[-1], 1)
+        self.assertEqual(len(copy), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
-﻿import unittest
+﻿import os
+import unittest
 import tempfile
-from src.file_chunk_reader import FileChunkReader
+from pathlib import Path
+from src.file_chunk_reader import FileChunkReader, read_byte_range, resolve_input_files
 
 class TestFileChunkReader(unittest.TestCase):
     def setUp(self):
@@ -32,6 +34,131 @@ class TestFileChunkReader(unittest.TestCase):
         self.assertEqual(chunk1[0].strip(), "line 1")
         self.assertEqual(chunk3[0].strip(), "line 5")
 
+    def test_byte_ranges_are_newline_aligned(self):
+        reader = FileChunkReader(self.tmp.name, live=False, chunk_bytes=10)
+        ranges = list(reader.byte_ranges())
+        with open(self.tmp.name, "rb") as f:
+            data = f.read()
+        # ranges are contiguous and cover the whole file
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(sum(length for _, length in ranges), len(data))
+        for offset, length in ranges:
+            self.assertTrue(data[offset:offset + length].endswith(b"\n"))
+
+    def test_byte_ranges_empty_file(self):
+        with open(self.tmp.name, "w", encoding="utf-8"):
+            pass
+        reader = FileChunkReader(self.tmp.name, live=False)
+        self.assertEqual(list(reader.byte_ranges()), [])
+        self.assertEqual(list(reader), [])
+
+    def test_batch_iter_yields_all_lines(self):
+        reader = FileChunkReader(self.tmp.name, live=False, chunk_bytes=10)
+        lines = [l for chunk in reader for l in chunk]
+        self.assertEqual(lines, [l.strip() for l in self.lines])
+        self.assertTrue(reader.eof_reached)
+
+    def test_byte_ranges_start_at_resume_offset(self):
+        reader = FileChunkReader(self.tmp.name, live=False, chunk_bytes=10, start_offset=14)
+        lines = [l for chunk in reader for l in chunk]
+        self.assertEqual(lines, ["line 3", "line 4", "line 5"])
+
+    def test_live_holds_back_partial_line(self):
+        with open(self.tmp.name, "a", encoding="utf-8") as f:
+            f.write("line 6 still being writ")
+        reader = FileChunkReader(self.tmp.name, chunk_size=100, poll_interval=0.01)
+        chunk = next(iter(reader))
+        self.assertEqual(chunk[-1], "line 5")
+        self.assertEqual(reader.chunk_range, (0, 35))
+        self.assertEqual(reader.offset, 35)
+
+    def test_live_follows_rename_rotation(self):
+        reader = FileChunkReader(self.tmp.name, chunk_size=100, poll_interval=0.01, tail_mode="poll")
+        it = iter(reader)
+        self.assertEqual(len(next(it)), 5)
+        # the application writes a few more lines (the last one unterminated), then logrotate renames the file
+        with open(self.tmp.name, "a", encoding="utf-8") as f:
+            f.write("line 6\nline 7")
+        os.rename(self.tmp.name, self.tmp.name + ".1")
+        self.addCleanup(os.unlink, self.tmp.name + ".1")
+        with open(self.tmp.name, "w", encoding="utf-8") as f:
+            f.write("new 1\n")
+
+        self.assertEqual(next(it), ["line 6"])
+        # the old file is drained to EOF before switching, including the unterminated line
+        self.assertEqual(next(it), ["line 7"])
+        self.assertEqual(reader.generation, 0)
+        self.assertEqual(next(it), ["new 1"])
+        self.assertEqual(reader.generation, 1)
+        self.assertEqual(reader.chunk_range, (0, 6))
+
+    def test_live_detects_truncation(self):
+        reader = FileChunkReader(self.tmp.name, chunk_size=100, poll_interval=0.01, tail_mode="poll")
+        it = iter(reader)
+        next(it)
+        # copytruncate: the file is emptied in place and the application keeps writing
+        with open(self.tmp.name, "r+", encoding="utf-8") as f:
+            f.truncate(0)
+            f.write("fresh\n")
+        self.assertEqual(next(it), ["fresh"])
+        self.assertEqual(reader.generation, 1)
+        self.assertEqual(reader.chunk_range, (0, 6))
+
+    def test_read_byte_range(self):
+        reader = FileChunkReader(self.tmp.name, live=False, chunk_bytes=10)
+        offset, length = list(reader.byte_ranges())[1]
+        self.assertEqual(read_byte_range(self.tmp.name, offset, length), ["line 3", "line 4"])
+
+    def _write_traces(self):
+        with open(self.tmp.name, "w", encoding="utf-8") as f:
+            for i in range(5):
+                f.write(f"2025-11-23 12:00:0{i} ERROR failure {i}\nTraceback:\n  at frame {i}\n")
+
+    def test_multiline_ranges_keep_records_whole(self):
+        self._write_traces()
+        reader = FileChunkReader(self.tmp.name, live=False, chunk_bytes=10, multiline=True)
+        ranges = list(reader.byte_ranges())
+        self.assertEqual(len(ranges), 5)
+        for offset, length in ranges:
+            lines = read_byte_range(self.tmp.name, offset, length)
+            self.assertEqual(len(lines), 3)
+            self.assertTrue(lines[0].startswith("2025-11-23"))
+
+    def test_multiline_live_holds_back_last_record(self):
+        self._write_traces()
+        reader = FileChunkReader(self.tmp.name, chunk_size=100, poll_interval=0.01, tail_mode="poll", multiline=True)
+        it = iter(reader)
+        # the last record may still be growing, so it only follows once a pass finds nothing new
+        self.assertEqual(len(next(it)), 12)
+        self.assertEqual(next(it), ["2025-11-23 12:00:04 ERROR failure 4", "Traceback:", "  at frame 4"])
+        with open(self.tmp.name, "a", encoding="utf-8") as f:
+            f.write("2025-11-23 12:00:05 ERROR failure 5\nTraceback:\n")
+        self.assertEqual(next(it), ["2025-11-23 12:00:05 ERROR failure 5", "Traceback:"])
+
+
+class TestResolveInputFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmpdir.name)
+        (self.root / "api").mkdir()
+        for name in ("b.log", "a.log", "notes.txt", "api/c.log"):
+            (self.root / name).write_text("x\n", encoding="utf-8")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_single_file(self):
+        path = self.root / "a.log"
+        self.assertEqual(resolve_input_files(path), [(path, "a.log")])
+
+    def test_directory_uses_pattern(self):
+        found = resolve_input_files(self.root, "*.log")
+        self.assertEqual([source for _, source in found], ["a.log", "b.log"])
+
+    def test_glob_sources_are_relative_to_glob_root(self):
+        found = resolve_input_files(self.root / "**" / "*.log")
+        self.assertEqual([source for _, source in found], ["a.log", "api/c.log", "b.log"])
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
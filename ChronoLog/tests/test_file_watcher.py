@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from src.file_watcher import PollingWatcher, InotifyWatcher, create_watcher
+
+
+class TestFileWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.NamedTemporaryFile(mode="w", delete=False, encoding="utf-8")
+        self.tmp.close()
+
+    def tearDown(self):
+        try:
+            os.unlink(self.tmp.name)
+        except Exception:
+            pass
+
+    def _append_later(self, delay=0.05):
+        def write():
+            time.sleep(delay)
+            with open(self.tmp.name, "a", encoding="utf-8") as f:
+                f.write("2025-11-23 12:00:00 INFO latency=5\n")
+        t = threading.Thread(target=write)
+        t.start()
+        return t
+
+    def test_polling_watcher_sleeps(self):
+        watcher = PollingWatcher(self.tmp.name, poll_interval=0.01)
+        start = time.monotonic()
+        self.assertTrue(watcher.wait())
+        self.assertGreaterEqual(time.monotonic() - start, 0.01)
+
+    def test_poll_mode_forced(self):
+        watcher = create_watcher(self.tmp.name, mode="poll", poll_interval=0.01)
+        self.assertIsInstance(watcher, PollingWatcher)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux-only")
+    def test_inotify_wakes_on_write(self):
+        watcher = InotifyWatcher(self.tmp.name)
+        try:
+            writer = self._append_later()
+            start = time.monotonic()
+            self.assertTrue(watcher.wait(timeout=5))
+            # woken by the write, not by the timeout
+            self.assertLess(time.monotonic() - start, 2)
+            writer.join()
+        finally:
+            watcher.close()
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux-only")
+    def test_inotify_times_out_when_idle(self):
+        watcher = InotifyWatcher(self.tmp.name)
+        try:
+            self.assertFalse(watcher.wait(timeout=0.05))
+        finally:
+            watcher.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import threading
+import time
+import unittest
+from src.flow_control import InFlightBudget
+
+
+class TestInFlightBudget(unittest.TestCase):
+    def test_blocks_at_chunk_limit_until_released(self):
+        budget = InFlightBudget(max_chunks=2, max_bytes=0)
+        self.assertTrue(budget.acquire(10))
+        self.assertTrue(budget.acquire(10))
+
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: budget.acquire(10, poll=0.01) and acquired.set())
+        thread.start()
+        time.sleep(0.05)
+        self.assertFalse(acquired.is_set())
+
+        budget.release(10)
+        thread.join(timeout=1)
+        self.assertTrue(acquired.is_set())
+        self.assertEqual(budget.snapshot(), {"chunks": 2, "bytes": 20, "waits": 1})
+
+    def test_byte_limit_admits_single_oversized_chunk(self):
+        budget = InFlightBudget(max_chunks=0, max_bytes=100)
+        self.assertTrue(budget.acquire(500))
+        stop = threading.Event()
+        stop.set()
+        # over budget and asked to stop: gives up instead of blocking
+        self.assertFalse(budget.acquire(1, stop_flag=stop))
+        budget.release(500)
+        self.assertTrue(budget.acquire(60, stop_flag=stop))
+        self.assertTrue(budget.acquire(40, stop_flag=stop))
+        self.assertFalse(budget.acquire(1, stop_flag=stop))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from src.ingest_rules import IngestRules
+from src.log_parser import LogParser
+
+
+class TestIngestRules(unittest.TestCase):
+    def _parse(self, rules, lines, log_format="default"):
+        parser = LogParser(var_regex=None, rules=rules, vector_parsing=False)
+        return [(r["event"], r.get("value")) for r in parser.parse_lines(lines, log_format=log_format).rows()]
+
+    def test_include_and_exclude(self):
+        rules = IngestRules(include=r"api|db", exclude=r"healthcheck")
+        lines = [
+            "2025-11-23 12:00:00 INFO api latency=5",
+            "2025-11-23 12:00:01 INFO api healthcheck latency=1",
+            "2025-11-23 12:00:02 ERROR worker crashed",
+            "2025-11-23 12:00:03 ERROR db connection lost",
+        ]
+        self.assertEqual(self._parse(rules, lines), [("latency", 5), ("error", None)])
+        self.assertEqual(rules.take_counts(), (2, 0))
+        self.assertEqual(rules.take_counts(), (0, 0))
+
+    def test_level_threshold(self):
+        lines = [
+            "2025-11-23 12:00:00 INFO latency=5",
+            "2025-11-23 12:00:01 WARNING slow latency=900",
+            "2025-11-23 12:00:02 ERROR failed",
+        ]
+        self.assertEqual(self._parse(IngestRules(min_level="warning"), lines),
+                         [("warning", None), ("latency", 900), ("error", None)])
+        rules = IngestRules(min_level="error")
+        self.assertEqual(self._parse(rules, lines), [("error", None)])
+        self.assertEqual(rules.dropped, 2)
+        with self.assertRaises(ValueError):
+            IngestRules(min_level="info")
+
+    def test_level_threshold_for_structured_formats(self):
+        rules = IngestRules(min_level="error")
+        lines = ['{"level": "warn", "msg": "slow"}', '{"level": "fatal", "msg": "down"}', '{"latency": 5}']
+        self.assertEqual(self._parse(rules, lines, "jsonl"), [("error", None)])
+        self.assertEqual(rules.dropped, 2)
+
+    def test_sampling_is_deterministic(self):
+        rules = IngestRules(sample_rates={"latency": 0.25, "warning": 1})
+        lines = [f"2025-11-23 12:00:{i:02d} WARNING latency={i}" for i in range(8)]
+        events = self._parse(rules, lines)
+        self.assertEqual([v for e, v in events if e == "latency"], [3, 7])
+        self.assertEqual(sum(1 for e, _ in events if e == "warning"), 8)
+        self.assertEqual(rules.sampled, 6)
+
+    def test_sample_span_matches_sample(self):
+        one, many = IngestRules(sample_rates={"x": 0.3}), IngestRules(sample_rates={"x": 0.3})
+        kept = sum(one.sample("x") for _ in range(10))
+        credit, rate = many.sample_span("x", 10)
+        self.assertEqual((credit, rate), (0.0, 0.3))
+        self.assertEqual(many.sampled, one.sampled)
+        self.assertEqual(10 - many.sampled, kept)
+        self.assertIsNone(many.sample_span("y", 10))
+
+    def test_line_filters_disable_vector_path(self):
+        self.assertIsNone(LogParser(var_regex=["latency"], rules=IngestRules(exclude="x")).vector)
+
+
+if __name__ == "__main__":
+    unittest.main()
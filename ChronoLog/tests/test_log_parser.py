@@ -1,19 +1,19 @@
 ﻿import unittest
 from datetime import datetime
-from src.log_parser import LogParser
+from src.log_parser import LogParser, detect_format, make_template
 
 
 class TestLogParser(unittest.TestCase):
     def setUp(self):
-        # use default behavior (KEY_VAL_RE and VAR_REGEX from config)
+        # default behavior: LINE_RE and TRACK_VARIABLES from config (every key=value pair when empty)
         self.parser = LogParser(var_regex=None)
 
     def test_extract_timestamp_valid(self):
         line = "2025-11-23 12:34:56 INFO something happened"
         ts = self.parser.extract_timestamp(line)
-        # should be ISO format and match the original date/time
+        # should be epoch seconds matching the original date/time
         self.assertIsNotNone(ts)
-        self.assertTrue(ts.startswith("2025-11-23T12:34:56"))
+        self.assertEqual(datetime.utcfromtimestamp(ts), datetime(2025, 11, 23, 12, 34, 56))
 
     def test_parse_lines_errors_and_warnings(self):
         lines = [
@@ -21,22 +21,19 @@ class TestLogParser(unittest.TestCase):
             "2025-11-23 12:01:00 WARNING Memory usage high",
             ""  # blank should be ignored
         ]
-        events, timeline = self.parser.parse_lines(lines)
-        self.assertIn("ERROR", events)
-        self.assertIn("WARNING", events)
-        self.assertEqual(len(events["ERROR"]), 1)
-        self.assertEqual(len(events["WARNING"]), 1)
-        # timeline should have entries for both events
-        event_names = {e["event"] for e in timeline}
-        self.assertIn("error", event_names)
-        self.assertIn("warning", event_names)
+        timeline = list(self.parser.parse_lines(lines).rows())
+        # timeline should have one entry for each event
+        event_names = [e["event"] for e in timeline]
+        self.assertEqual(event_names.count("error"), 1)
+        self.assertEqual(event_names.count("warning"), 1)
 
     def test_parse_variables_with_keyval(self):
         lines = ["2025-11-23 12:10:00 INFO processed=7 size=123"]
-        events, timeline = self.parser.parse_lines(lines)
-        # KEY_VAL_RE should capture processed and size
-        self.assertIn("processed", events)
-        self.assertIn("size", events)
+        timeline = list(self.parser.parse_lines(lines).rows())
+        # LINE_RE should capture processed and size
+        event_names = {e["event"] for e in timeline}
+        self.assertIn("processed", event_names)
+        self.assertIn("size", event_names)
         # timeline should include entries with "value" keys for those metrics
         values = [t.get("value") for t in timeline if "value" in t]
         self.assertIn(7, values)
@@ -46,12 +43,161 @@ class TestLogParser(unittest.TestCase):
         # supply a custom var_regex to only capture latency
         p = LogParser(var_regex={"latency": __import__("re").compile(r"latency=(\d+)")})
         lines = ["2025-11-23 12:11:00 INFO latency=250", "2025-11-23 12:12:00 INFO latency=120"]
-        events, timeline = p.parse_lines(lines)
-        self.assertIn("latency", events)
-        self.assertEqual(len(events["latency"]), 2)
+        timeline = list(p.parse_lines(lines).rows())
+        self.assertEqual(len(timeline), 2)
         vals = [t["value"] for t in timeline if t.get("event") == "latency"]
         self.assertCountEqual(vals, [250, 120])
 
+    def test_levels_match_whole_tokens_only(self):
+        lines = [
+            "2025-11-23 12:00:00 INFO retried ERRORS_TOTAL=3",
+            "2025-11-23 12:00:01 [ERROR] failed, ERROR again",
+            "2025-11-23 12:00:02 INFO NOWARNING here",
+        ]
+        timeline = list(self.parser.parse_lines(lines).rows())
+        self.assertEqual([t["event"] for t in timeline], ["ERRORS_TOTAL", "error"])
+
+    def test_tracked_variables_keep_first_value_and_ignore_others(self):
+        p = LogParser(var_regex=["latency", "size"])
+        timeline = list(p.parse_lines(["2025-11-23 12:00:00 WARNING size=5 user=7 latency=9 latency=11"]).rows())
+        self.assertEqual(
+            [(t["event"], t.get("value")) for t in timeline],
+            [("warning", None), ("size", 5), ("latency", 9)],
+        )
+
+    def test_messages_are_templated_in_parser(self):
+        line = "2025-11-23 12:00:00 ERROR User 123 failed after 3 retries (code E42)"
+        self.assertEqual(
+            make_template(line),
+            ("ERROR User {num} failed after {num} retries (code E42)", '["123", "3"]'),
+        )
+        self.assertEqual(make_template("2025-11-23 12:00:00 WARNING disk full"), ("WARNING disk full", None))
+
+        timeline = list(self.parser.parse_lines([line]).rows())
+        self.assertEqual(timeline[0]["template"], "ERROR User {num} failed after {num} retries (code E42)")
+        self.assertEqual(timeline[0]["msg_values"], '["123", "3"]')
+        self.assertNotIn("msg", timeline[0])
+
+    def test_parse_lines_tags_source(self):
+        lines = ["2025-11-23 12:00:00 ERROR Database connection failed", "2025-11-23 12:00:01 INFO latency=5"]
+        timeline = list(self.parser.parse_lines(lines, source="api/app.log").rows())
+        self.assertEqual({t["source"] for t in timeline}, {"api/app.log"})
+
+    def test_miner_masks_ids_into_one_template(self):
+        p = LogParser(var_regex=None, template_miner=True)
+        lines = [
+            "2025-11-23 12:00:00 ERROR job 550e8400-e29b-41d4-a716-446655440000 from 10.0.0.1 failed at 0x7ffe1c",
+            "2025-11-23 12:00:01 ERROR job 123e4567-e89b-12d3-a456-426614174000 from 192.168.1.20 failed at 0xdeadbeef",
+            "2025-11-23 12:00:02 ERROR job 9b2f4c1e-0d3a-4f5b-8c7d-6e5f4a3b2c1d from 172.16.0.9 failed at 0x1a2b3c",
+        ]
+        batch = p.parse_lines(lines)
+        self.assertEqual(batch.templates, ["ERROR job {num} from {num} failed at {num}"])
+        self.assertEqual(batch.msg_values[1], '["123e4567-e89b-12d3-a456-426614174000", "192.168.1.20", "0xdeadbeef"]')
+        self.assertEqual(len(p.miner), 1)
+
+    def test_multiline_records_become_one_event(self):
+        p = LogParser(var_regex=["latency"], multiline=True)
+        lines = [
+            "Caused by: leftover from the previous chunk",
+            "2025-11-23 12:00:00 ERROR Request 7 failed",
+            "Traceback (most recent call last):",
+            '  File "app.py", line 42, in handler',
+            "ValueError: bad input",
+            "2025-11-23 12:00:01 INFO latency=5",
+        ]
+        timeline = list(p.parse_lines(lines).rows())
+        self.assertEqual(
+            [(t["event"], t["time"], t.get("template") or t.get("value")) for t in timeline],
+            [("error", 1763899200, "ERROR Request {num} failed"), ("latency", 1763899201, 5)],
+        )
+
+
+class TestLogFormats(unittest.TestCase):
+    T = 1763899200  # 2025-11-23 12:00:00 UTC
+
+    def setUp(self):
+        self.parser = LogParser(var_regex=None)
+
+    def _rows(self, lines, log_format, parser=None):
+        return [(t["time"], t["event"], t.get("value", t.get("template")))
+                for t in (parser or self.parser).parse_lines(lines, log_format=log_format).rows()]
+
+    def test_jsonl(self):
+        lines = [
+            '{"time": "2025-11-23T12:00:00Z", "level": "error", "msg": "user 42 failed", "latency": 12}',
+            '{"ts": 1763899201500, "level": "warn", "message": "slow", "ok": true, "note": "x"}',
+            '{"time": "2025-11-23T12:00:02", "level": "info", "size": 3.5}',
+            'not json',
+        ]
+        self.assertEqual(self._rows(lines, "jsonl"), [
+            (self.T, "error", "ERROR user {num} failed"),
+            (self.T, "latency", 12),
+            (self.T + 1, "warning", "WARNING slow"),
+            (self.T + 2, "size", 3.5),
+        ])
+
+    def test_logfmt(self):
+        lines = ['time=2025-11-23T12:00:00Z level=error msg="disk \\"sda\\" full" free=12 host=db1']
+        self.assertEqual(self._rows(lines, "logfmt"), [
+            (self.T, "error", "ERROR disk {num} full"),
+            (self.T, "free", 12),
+        ])
+
+    def test_syslog_rfc5424_and_rfc3164(self):
+        lines = [
+            '<11>1 2025-11-23T12:00:00.120Z web01 nginx 1234 - [meta x="1"] upstream timed out retries=3',
+            '<14>1 2025-11-23T12:00:01Z web01 cron - - - job done',
+            '<12>Nov 23 12:00:02 web01 sshd[99]: auth slow',
+            'Nov 23 12:00:03 web01 app: WARNING queue full size=7',
+        ]
+        rows = self._rows(lines, "syslog")
+        self.assertEqual([r[1:] for r in rows], [
+            ("error", "nginx: upstream timed out retries={num}"),
+            ("retries", 3),
+            ("warning", "sshd: auth slow"),
+            ("warning", "app: WARNING queue full size={num}"),
+            ("size", 7),
+        ])
+        self.assertEqual(rows[0][0], self.T)
+
+    def test_nginx_combined(self):
+        lines = [
+            '10.0.0.1 - - [23/Nov/2025:12:00:00 +0000] "GET /api/users?id=5 HTTP/1.1" 502 157 "-" "curl/8.0" 0.250',
+            '10.0.0.2 - bob [23/Nov/2025:12:00:01 +0000] "POST /login HTTP/1.1" 200 12 "-" "Mozilla/5.0"',
+        ]
+        self.assertEqual(self._rows(lines, "nginx"), [
+            (self.T, "error", "GET /api/users {num}"),
+            (self.T, "body_bytes_sent", 157),
+            (self.T, "request_time", 0.25),
+            (self.T + 1, "body_bytes_sent", 12),
+        ])
+        tracked = LogParser(var_regex=["request_time"])
+        self.assertEqual([r[1] for r in self._rows(lines, "nginx", tracked)], ["error", "request_time"])
+
+    def test_nginx_zone_matches_jsonl(self):
+        # the same instant logged in +02:00 by nginx and in UTC by a JSON logger
+        nginx = self._rows(['10.0.0.1 - - [23/Nov/2025:14:00:00 +0200] "GET / HTTP/1.1" 500 5 "-" "-"'], "nginx")
+        jsonl = self._rows(['{"time": "2025-11-23T12:00:00Z", "level": "error", "msg": "boom"}'], "jsonl")
+        self.assertEqual(nginx[0][0], self.T)
+        self.assertEqual(nginx[0][0], jsonl[0][0])
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format(['{"level": "info"}', '{"msg": "x"}']), "jsonl")
+        self.assertEqual(detect_format(["level=info msg=hi", "level=warn msg=x"]), "logfmt")
+        self.assertEqual(detect_format(["Nov 23 12:00:00 host app[1]: hi"]), "syslog")
+        self.assertEqual(detect_format(['1.2.3.4 - - [23/Nov/2025:12:00:00 +0000] "GET / HTTP/1.1" 200 5 "-" "-"']), "nginx")
+        self.assertEqual(detect_format(["2025-11-23 12:00:00 ERROR x"]), "default")
+        self.assertEqual(detect_format(["free text"]), "default")
+
+    def test_auto_format_detects_per_chunk(self):
+        parser = LogParser(var_regex=None, log_format="auto")
+        rows = list(parser.parse_lines(['{"time": 1763899200, "level": "error", "msg": "boom"}']).rows())
+        self.assertEqual([(r["time"], r["event"]) for r in rows], [(self.T, "error")])
+
+    def test_unknown_format_rejected(self):
+        with self.assertRaises(ValueError):
+            LogParser(log_format="csv")
+
 
 if __name__ == "__main__":
     unittest.main()
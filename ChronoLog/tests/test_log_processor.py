@@ -1,6 +1,13 @@
 ﻿import unittest
+import gzip
+import os
 import queue
-from src.log_processor import LogProcessor
+import tempfile
+from unittest.mock import MagicMock, patch
+from src import log_processor
+from src.log_processor import LogProcessor, parse_byte_range, parse_chunk, parse_shared_chunk
+from src.event_batch import EventBatch
+from src.shared_transport import SharedRef, SharedSlots
 
 
 class DummyPool:
@@ -28,10 +35,28 @@ class TestLogProcessor(unittest.TestCase):
         got = self.lp.queue.get_nowait()
         self.assertEqual(got, item)
         # test _on_result uses safe_queue_put
-        self.lp._on_result(({"ERROR": []}, [{"time": None, "event": "error", "msg": "m"}]))
-        ev, tl = self.lp.queue.get_nowait()
-        self.assertIsInstance(ev, dict)
-        self.assertIsInstance(tl, list)
+        batch = EventBatch("f.log")
+        batch.add(None, "error", template="m")
+        self.lp._on_result(batch, marker=("f.log", 0, 0, 10))
+        got, marker = self.lp.queue.get_nowait()
+        self.assertIs(got, batch)
+        self.assertEqual(marker, ("f.log", 0, 0, 10))
+
+    def test_on_result_forwards_shared_ref(self):
+        ref = SharedRef("seg", 0, 10)
+        self.lp._on_result(ref, marker=("f.log", 0, 0, 10))
+        self.assertEqual(self.lp.queue.get_nowait(), (ref, ("f.log", 0, 0, 10)))
+
+    def test_chunk_task_uses_shared_memory_for_raw_chunks(self):
+        self.lp.transport = SharedSlots(slots=1, slot_bytes=64)
+        self.addCleanup(self.lp.transport.unlink)
+        task, ref = self.lp._chunk_task(b"2025-11-23 12:00:01 INFO latency=42\n")
+        self.assertIs(task, parse_shared_chunk)
+        self.assertIsInstance(ref, SharedRef)
+        # no free slot left: the lines are sent inline
+        task, lines = self.lp._chunk_task(b"2025-11-23 12:00:02 INFO latency=43\n")
+        self.assertIs(task, parse_chunk)
+        self.assertEqual(lines, ["2025-11-23 12:00:02 INFO latency=43"])
 
     def test_handle_interrupt_sets_stop_and_terminates_pool(self):
         pool = DummyPool()
@@ -42,6 +67,106 @@ class TestLogProcessor(unittest.TestCase):
         self.assertTrue(pool.terminated)
         self.assertTrue(pool.joined)
 
+    def test_shutdown_sends_one_sentinel_per_writer_and_waits(self):
+        writers = [MagicMock(), MagicMock()]
+        for wp in writers:
+            wp.is_alive.return_value = True
+        self.lp._shutdown(DummyPool(), writers)
+        self.assertEqual([self.lp.queue.get_nowait() for _ in writers], [None, None])
+        self.assertTrue(self.lp.queue.empty())
+        for wp in writers:
+            wp.join.assert_called_once_with()
+            wp.terminate.assert_not_called()
+
+    def test_commit_marker_advances_tracker(self):
+        from src.checkpoint import OffsetTracker
+        self.lp.trackers["f.log"] = OffsetTracker(0)
+        self.assertFalse(self.lp._commit_marker(("f.log", 0, 10, 20)))
+        self.assertTrue(self.lp._commit_marker(("f.log", 0, 0, 10)))
+        self.assertEqual(self.lp.trackers["f.log"].watermark, 20)
+        # acknowledgements for unknown sources or an older file generation are ignored
+        self.assertFalse(self.lp._commit_marker(("other.log", 0, 0, 10)))
+        self.lp.trackers["f.log"] = OffsetTracker(0, generation=1)
+        self.assertFalse(self.lp._commit_marker(("f.log", 0, 0, 10)))
+
+    def test_compressed_reader_tracks_offset_after_member_reset(self):
+        # a checkpoint off a member boundary makes member_ranges restart from 0
+        def restart(reader):
+            reader.offset = 0
+            return [(0, 10, None)]
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, "app.log.gz")
+        with open(path, "wb") as f:
+            f.write(gzip.compress(b"2025-11-23 12:00:00 INFO latency=1\n"))
+        self.lp.checkpoints = MagicMock()
+        self.lp._resume_offset = lambda file_path: 7
+        pool = MagicMock()
+        with patch.object(log_processor.FileChunkReader, "member_ranges", autospec=True, side_effect=restart) as ranges:
+            reader = self.lp._open_reader(path, "app.log.gz", live=False)
+            self.assertEqual(self.lp.trackers[str(reader.file_path)].watermark, 0)
+            self.lp._dispatch_file(pool, reader)
+        self.assertEqual(ranges.call_count, 1)
+        self.assertEqual(pool.apply_async.call_args.kwargs["args"][1:3], (0, 10))
+
+    def test_parse_byte_range_reads_own_slice(self):
+        tmp = tempfile.NamedTemporaryFile(mode="wb", delete=False)
+        first = b"2025-11-23 12:00:00 ERROR Database connection failed\n"
+        second = b"2025-11-23 12:00:01 INFO latency=42\n"
+        tmp.write(first + second)
+        tmp.close()
+        try:
+            batch = parse_byte_range(tmp.name, len(first), len(second))
+        finally:
+            os.unlink(tmp.name)
+        self.assertEqual(list(batch.rows()), [{"time": 1763899201, "event": "latency", "value": 42}])
+
+    def test_worker_delivers_result_to_writer_queue(self):
+        from src import log_processor
+        writer_queue = queue.Queue()
+        log_processor._init_worker(writer_queue=writer_queue)
+        self.addCleanup(log_processor._init_worker)
+        result = parse_chunk(["2025-11-23 12:00:01 INFO latency=42"], "app.log", marker=("app.log", 0, 0, 36))
+        # nothing goes back to the parent
+        self.assertIsNone(result)
+        batch, marker = writer_queue.get_nowait()
+        self.assertEqual(batch.value_at(0), 42)
+        self.assertEqual(marker, ("app.log", 0, 0, 36))
+
+    def test_workers_report_ingest_rule_counts(self):
+        from src import log_processor
+        from src.ingest_rules import IngestRules
+        writer_queue = queue.Queue()
+        log_processor._init_worker(writer_queue=writer_queue, rule_counts=self.lp.rule_counts)
+        self.addCleanup(log_processor._init_worker)
+        log_processor._worker_parser.rules = IngestRules(exclude="healthcheck", sample_rates={"latency": 0.5})
+        parse_chunk(["2025-11-23 12:00:01 INFO healthcheck ok", "2025-11-23 12:00:02 INFO latency=1",
+                     "2025-11-23 12:00:03 INFO latency=2"], "app.log")
+        stats = self.lp.stats()
+        self.assertEqual((stats["dropped"], stats["sampled"]), (1, 1))
+        self.assertIn("dropped lines: 1", self.lp.stats_line())
+
+    def test_on_result_ignores_delivered_results(self):
+        self.lp._on_result(None, marker=("f.log", 0, 0, 10))
+        self.assertTrue(self.lp.queue.empty())
+
+    def test_completed_chunks_release_in_flight_budget(self):
+        self.lp.budget.acquire(10)
+        self.lp.budget.acquire(20)
+        self.lp._on_result(None, marker=("f.log", 0, 0, 10), size=10)
+        self.lp._on_error(RuntimeError("boom"), size=20)
+        stats = self.lp.stats()
+        self.assertEqual((stats["chunks"], stats["bytes"]), (0, 0))
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertIn("writer queue depth: 0", self.lp.stats_line())
+
+
+    def test_failed_chunk_is_acknowledged(self):
+        self.lp.ack_queue = queue.Queue()
+        self.lp._on_error(RuntimeError("boom"), marker=("f.log", 0, 10, 20), size=10)
+        self.assertEqual(self.lp.ack_queue.get_nowait(), ("f.log", 0, 10, 20))
+
 
 if __name__ == "__main__":
     unittest.main()
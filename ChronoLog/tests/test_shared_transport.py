@@ -0,0 +1,53 @@
+import pickle
+import unittest
+from src.shared_transport import SharedRef, SharedSlots, shm_free_bytes
+
+
+class TestSharedSlots(unittest.TestCase):
+    def setUp(self):
+        self.slots = SharedSlots(slots=2, slot_bytes=1024)
+
+    def tearDown(self):
+        self.slots.unlink()
+
+    def test_create_falls_back_when_shm_is_too_small(self):
+        self.assertIsNone(SharedSlots.create(slots=4, slot_bytes=1024, free=4095))
+        slots = SharedSlots.create(slots=4, slot_bytes=1024, free=4096)
+        self.addCleanup(slots.unlink)
+        self.assertEqual(slots.slots, 4)
+        free = shm_free_bytes()
+        self.assertTrue(free is None or free > 0)
+
+    def test_put_and_take_round_trip(self):
+        result = ({"INFO": ["ok"]}, [{"time": "2025-11-23T12:00:00", "event": "latency", "value": 42}])
+        ref = self.slots.put(result)
+        self.assertIsInstance(ref, SharedRef)
+        self.assertEqual(ref.segment, self.slots.name)
+        self.assertEqual(self.slots.take(ref), result)
+        self.assertEqual(self.slots.in_use(), 0)
+
+    def test_ref_pickles_as_descriptor_only(self):
+        ref = self.slots.put_bytes(b"x" * 1000)
+        self.assertLess(len(pickle.dumps(ref)), 200)
+        copy = pickle.loads(pickle.dumps(ref))
+        self.assertEqual((copy.segment, copy.offset, copy.length), (ref.segment, ref.offset, ref.length))
+
+    def test_view_reads_raw_bytes(self):
+        ref = self.slots.put_bytes(b"line 1\nline 2\n")
+        view = self.slots.view(ref)
+        self.assertEqual(bytes(view), b"line 1\nline 2\n")
+        view.release()
+        self.slots.release(ref)
+
+    def test_put_returns_none_when_full_or_oversized(self):
+        self.assertIsNone(self.slots.put_bytes(b"x" * 1025))
+        first = self.slots.put_bytes(b"a")
+        second = self.slots.put_bytes(b"b")
+        self.assertNotEqual(first.offset, second.offset)
+        self.assertIsNone(self.slots.put_bytes(b"c"))
+        self.slots.release(first)
+        self.assertIsNotNone(self.slots.put_bytes(b"c", timeout=1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
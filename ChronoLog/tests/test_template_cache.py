@@ -0,0 +1,56 @@
+import multiprocessing
+import unittest
+from unittest.mock import patch
+from src.template_cache import SharedTemplateCache, template_key
+
+
+def _store(cache):
+    cache.put_many([("ERROR from child", 7)])
+
+
+class TestSharedTemplateCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = SharedTemplateCache(size=8, ways=4)
+        self.addCleanup(self.cache.unlink)
+
+    def test_get_and_put(self):
+        self.assertEqual(self.cache.get_many(["ERROR A", "ERROR B"]), [None, None])
+        self.cache.put_many([("ERROR A", 1), ("ERROR B", 2)])
+        self.assertEqual(self.cache.get_many(["ERROR B", "ERROR A", "ERROR C"]), [2, 1, None])
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.stats(), {"size": 8, "hits": 2, "misses": 3, "evictions": 0})
+
+    def test_size_is_bounded_with_lru_replacement(self):
+        # templates that all land in the same set of 4 entries
+        same_set = [t for t in (f"WARNING {i}" for i in range(200)) if template_key(t)[0] % 2 == 0][:5]
+        self.cache.put_many((tmpl, i) for i, tmpl in enumerate(same_set[:4]))
+        self.cache.get_many([same_set[0]])  # now the most recently used
+        self.cache.put_many([(same_set[4], 4)])
+        self.assertEqual(self.cache.get_many(same_set), [0, None, 2, 3, 4])
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.assertEqual(len(self.cache), 4)
+
+    def test_key_collision_is_not_a_hit(self):
+        # a template with the same 64-bit key but another check word
+        key, check = template_key("ERROR A")
+        self.cache.put_many([("ERROR A", 1)])
+        with patch("src.template_cache.template_key", return_value=(key, check + 1)):
+            self.assertEqual(self.cache.get_many(["ERROR B"]), [None])
+            self.cache.put_many([("ERROR B", 2)])
+        self.assertEqual(self.cache.get_many(["ERROR A"]), [1])
+        self.assertEqual(len(self.cache), 2)
+
+    def test_shared_with_child_processes(self):
+        self.cache.put_many([("ERROR from parent", 3)])
+        child = multiprocessing.Process(target=_store, args=(self.cache,))
+        child.start()
+        child.join()
+        self.assertEqual(self.cache.get_many(["ERROR from child", "ERROR from parent"]), [7, 3])
+
+    def test_prewarm_is_claimed_once(self):
+        self.assertTrue(self.cache.claim_prewarm())
+        self.assertFalse(self.cache.claim_prewarm())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import json
+import unittest
+from src.template_miner import TemplateMiner
+
+
+class TestTemplateMiner(unittest.TestCase):
+    def setUp(self):
+        self.miner = TemplateMiner(depth=4, similarity=0.5, max_children=100, max_clusters=1000)
+
+    def _template(self, line):
+        template, values = self.miner.template(line)
+        return template, json.loads(values) if values else None
+
+    def test_masks_high_cardinality_tokens(self):
+        self.assertEqual(
+            self._template('2025-11-23 12:00:00 ERROR login for "bob smith" from 10.0.0.1:443 failed'),
+            ("ERROR login for {num} from {num} failed", ['"bob smith"', "10.0.0.1:443"]),
+        )
+        self.assertEqual(
+            self._template("ERROR job 550e8400-e29b-41d4-a716-446655440000 wrote /var/log/x.log in 30.5ms"),
+            ("ERROR job {num} wrote {num} in {num}ms", ["550e8400-e29b-41d4-a716-446655440000", "/var/log/x.log", "30.5"]),
+        )
+        self.assertEqual(self._template("WARNING ptr 0x7ffe1c at deadbeef01"), ("WARNING ptr {num} at {num}", ["0x7ffe1c", "deadbeef01"]))
+        self.assertEqual(self._template("WARNING CPU usage > 90%"), ("WARNING CPU usage > {num}%", ["90"]))
+
+    def test_similar_messages_share_a_template(self):
+        self.assertEqual(self._template("ERROR Disk write error on sda"), ("ERROR Disk write error on sda", None))
+        self.assertEqual(self._template("ERROR Disk read error on sdb"), ("ERROR Disk {num} error on {num}", ["read", "sdb"]))
+        self.assertEqual(self._template("ERROR Disk write error on sda"), ("ERROR Disk {num} error on {num}", ["write", "sda"]))
+        self.assertEqual(len(self.miner), 1)
+
+    def test_different_messages_stay_apart(self):
+        self._template("ERROR Database connection failed")
+        self._template("ERROR User authentication failed")
+        self._template("WARNING Memory usage high")
+        self._template("WARNING Memory usage high for worker 3")
+        self.assertEqual(len(self.miner), 4)
+
+    def test_cluster_count_is_bounded(self):
+        miner = TemplateMiner(max_clusters=10)
+        for i in range(200):
+            miner.template(f"ERROR component{chr(65 + i % 26)}{chr(65 + i // 26)} is down and out")
+        self.assertEqual(len(miner), 10)
+        self.assertEqual(sum(len(leaf) for _, leaf in miner.clusters.values()), 10)
+
+    def test_empty_message(self):
+        self.assertEqual(self.miner.template(""), ("", None))
+
+
+if __name__ == "__main__":
+    unittest.main()
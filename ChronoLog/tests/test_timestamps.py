@@ -0,0 +1,76 @@
+import unittest
+from datetime import datetime, timedelta
+from src.timestamps import TimestampParser, from_epoch, to_epoch
+
+
+class TestTimestampParser(unittest.TestCase):
+    def setUp(self):
+        self.parser = TimestampParser(formats=[])
+
+    def test_fixed_layouts(self):
+        expected = to_epoch(datetime(2025, 11, 23, 12, 34, 56))
+        self.assertEqual(expected, 1763901296)
+        self.assertEqual(self.parser.parse("2025-11-23 12:34:56 INFO ok"), expected)
+        self.assertEqual(self.parser.parse("2025-11-23T12:34:56 INFO ok"), expected)
+        self.assertEqual(self.parser.parse("2025-11-23 12:34:56,123 INFO ok"), expected)
+        self.assertEqual(self.parser.parse("2025-11-23 12:34:56"), expected)
+
+    def test_rejects_invalid_values(self):
+        self.assertIsNone(self.parser.parse("2025-13-23 12:34:56 INFO"))
+        self.assertIsNone(self.parser.parse("2025-11-23T25:34:56 INFO"))
+        self.assertIsNone(self.parser.parse("INFO no timestamp here"))
+        self.assertIsNone(self.parser.parse(""))
+
+    def test_repeated_second_is_cached(self):
+        line = "2025-11-23 12:34:56 INFO first"
+        value = self.parser.parse(line)
+        self.assertEqual(self.parser._seconds, {"2025-11-23 12:34:56": value})
+        self.assertEqual(self.parser.parse("2025-11-23 12:34:56 ERROR second"), value)
+        self.assertEqual(len(self.parser._seconds), 1)
+
+    def test_zone_suffix_converts_to_utc(self):
+        expected = to_epoch(datetime(2025, 11, 23, 12, 34, 56))
+        self.assertEqual(self.parser.parse("2025-11-23T12:34:56Z INFO"), expected)
+        self.assertEqual(self.parser.parse("2025-11-23T14:34:56+02:00 INFO"), expected)
+        self.assertEqual(self.parser.parse("2025-11-23 11:04:56.250-0130 INFO"), expected)
+        # the same as an aware datetime through to_epoch
+        self.assertEqual(self.parser.parse("2025-11-23T14:34:56+02:00"),
+                         to_epoch(datetime.fromisoformat("2025-11-23T14:34:56+02:00")))
+
+    def test_malformed_suffix_skips_the_cache(self):
+        self.parser.parse("2025-11-23T12:34:56 INFO first")
+        self.assertIsNone(self.parser.parse("2025-11-23T12:34:56abc INFO"))
+
+    def test_variable_width_formats_rejected(self):
+        for fmt in ("%B %d %H:%M:%S", "%d %b %Y %I:%M:%S %p", "%Y-%m-%d %H:%M:%S %z"):
+            with self.assertRaises(ValueError):
+                TimestampParser(formats=[fmt])
+        self.assertEqual(len(TimestampParser(formats=["%d%%B %H:%M:%S"]).formats), 1)
+
+    def test_bare_iso_date_falls_back(self):
+        self.assertEqual(self.parser.parse("2025-11-23 INFO"), to_epoch(datetime(2025, 11, 23)))
+
+    def test_extra_formats(self):
+        parser = TimestampParser(formats=["%d/%m/%Y %H:%M:%S", "%b %d %H:%M:%S"])
+        self.assertEqual(parser.parse("23/11/2025 12:34:56 INFO ok"), 1763901296)
+        # formats without a year assume the current one
+        parsed = from_epoch(parser.parse("Jan 01 00:00:00 host app: ok"))
+        self.assertEqual(parsed, datetime(datetime.now().year, 1, 1))
+
+    def test_yearless_dates_ahead_are_from_last_year(self):
+        now = datetime.now()
+        parser = TimestampParser(formats=["%b %d %H:%M:%S"])
+        ahead, behind = now + timedelta(days=3), now - timedelta(days=3)
+        parsed = from_epoch(parser.parse(ahead.strftime("%b %d %H:%M:%S") + " host app: ok"))
+        self.assertEqual(parsed.year, ahead.year - 1)
+        parsed = from_epoch(parser.parse(behind.strftime("%b %d %H:%M:%S") + " host app: ok"))
+        self.assertEqual(parsed.year, behind.year)
+
+    def test_zone_after_format(self):
+        parser = TimestampParser(formats=["%d/%b/%Y:%H:%M:%S"])
+        self.assertEqual(parser.parse("23/Nov/2025:14:34:56 +0200"), 1763901296)
+        self.assertEqual(parser.parse("23/Nov/2025:12:34:56 host"), 1763901296)
+
+
+if __name__ == "__main__":
+    unittest.main()
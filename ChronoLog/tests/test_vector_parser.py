@@ -0,0 +1,63 @@
+import unittest
+from collections import Counter
+from src import vector_parser
+from src.file_chunk_reader import decode_lines
+from src.log_parser import LogParser
+
+
+@unittest.skipIf(vector_parser.np is None, "numpy not installed")
+class TestVectorParser(unittest.TestCase):
+    DATA = (
+        "2025-11-23 12:00:00 INFO latency=5 size=10\n"
+        "2025-11-23T12:00:01.250Z INFO latency=6 latency=7 xlatency=1\n"
+        "2025-11-23 12:00:02 ERROR request failed latency=8\n"
+        "2025-11-23 12:00:03 INFO latency=9ms size=12 latency=13\n"
+        "  2025-11-23 12:00:04 INFO latency=14\n"
+        "2025-11-23 25:00:05 INFO latency=15\n"
+        "2025-02-30 12:00:06 INFO latency=16\n"
+        "2025-11-23 12:00:07 INFO latency=1234567890123456789\n"
+        "2025-11-23 12:00:08 INFO naïve latency=17\n"
+        "2025-11-23T14:00:09+02:00 INFO latency=20\n"
+        "2025-11-23 10:30:10.5-0130 INFO latency=21\n"
+        "no timestamp latency=18\n"
+        "\n"
+        "2025-11-24 00:00:00 INFO size=19"
+    ).encode("utf-8")
+
+    def setUp(self):
+        self.vector = LogParser(var_regex=["latency", "size"])
+        self.lines = LogParser(var_regex=["latency", "size"], vector_parsing=False)
+
+    def _events(self, batch):
+        return Counter((r["time"], r["event"], r.get("value"), r.get("template")) for r in batch.rows())
+
+    def test_same_events_as_line_parser(self):
+        self.assertIsNotNone(self.vector.vector)
+        for data in (self.DATA, memoryview(self.DATA), b""):
+            expected = self.lines.parse_lines(decode_lines(data), log_format="default")
+            batch = self.vector.parse_buffer(data, decode_lines, "app.log", "default")
+            self.assertEqual(self._events(batch), self._events(expected))
+            self.assertEqual(batch.source, "app.log")
+
+    def test_metric_columns(self):
+        batch = self.vector.vector.parse(b"2025-11-23 12:00:00 INFO latency=5\n2025-11-23 12:00:01 INFO latency=6\n")
+        self.assertEqual([(r["time"], r["event"], r["value"]) for r in batch.rows()],
+                         [(1763899200, "latency", 5), (1763899201, "latency", 6)])
+
+    def test_sampling_keeps_the_same_share(self):
+        from src.ingest_rules import IngestRules
+        data = "".join(f"2025-11-23 12:00:{i:02d} INFO latency={i}\n" for i in range(40)).encode()
+        parser = LogParser(var_regex=["latency"], rules=IngestRules(sample_rates={"latency": 0.25}))
+        batch = parser.parse_buffer(data, decode_lines, log_format="default")
+        self.assertEqual([r["value"] for r in batch.rows()], list(range(3, 40, 4)))
+        self.assertEqual(parser.rules.sampled, 30)
+
+    def test_needs_tracked_variables_and_default_format(self):
+        self.assertIsNone(LogParser(var_regex=None).vector)
+        line = b'{"time": 1763899200, "level": "error", "msg": "boom"}\n'
+        batch = self.vector.parse_buffer(line, decode_lines, log_format="jsonl")
+        self.assertEqual([r["event"] for r in batch.rows()], ["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,14 @@
 ﻿import unittest
+from unittest.mock import MagicMock, patch
+import json
+import queue
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from src.writer_process import MAX_TEMPLATE_CHARS, MAX_VALUES_CHARS, WriterProcess
+from src.event_batch import EventBatch
+
 class TestWriterProcess(unittest.TestCase):
     def setUp(self):
         # Patch the facade class where it is imported in writer_process
@@ -7,7 +17,10 @@ class TestWriterProcess(unittest.TestCase):
         self.mock_facade_instance = self.MockFacade.return_value
         
         # Initialize WriterProcess
-        self.wp = WriterProcess(flush_interval=0.01)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dead_letter_dir = Path(tmp.name) / "dead_letter"
+        self.wp = WriterProcess(flush_interval=0.01, retry_delay=0, dead_letter_dir=self.dead_letter_dir)
 
     def tearDown(self):
         self.facade_patcher.stop()
@@ -18,167 +31,367 @@ class TestWriterProcess(unittest.TestCase):
         self.assertEqual(self.wp.facade, self.mock_facade_instance)
         self.assertEqual(self.wp.msg_cache, {})
 
-    def test_prepare_entry_valid(self):
-        """Test _prepare_entry with valid data."""
-        entry = {
-            "time": "2023-10-27T10:00:00",
-            "event": "INFO",
-            "msg": "2023-10-27 10:00:00 INFO User 123 logged in",
-            "value": None
-        }
+    def test_prepare_batch_valid(self):
+        """Test _prepare_batch with valid data."""
+        batch = EventBatch("input.log")
+        batch.add(1698400800, "INFO", template="INFO User {num} logged in", msg_values='["123"]')
+        batch.add(1698400801, "latency", 250)
         
         # Mock facade behavior
-        self.mock_facade_instance.get_or_create_message_id.return_value = 5
+        self.mock_facade_instance.get_or_create_message_ids.return_value = {"INFO User {num} logged in": 5}
         
-        result = self.wp._prepare_entry(entry)
+        result = self.wp._prepare_batch(batch)
         
-        self.assertEqual(result["time"], "2023-10-27T10:00:00")
-        self.assertEqual(result["event"], "INFO")
-        self.assertEqual(result["msg_id"], 5)
-        self.assertEqual(result["msg_values"], '["123"]') # JSON string
-        self.assertIsNone(result["value"])
+        self.assertEqual(result[0]["time"], 1698400800)
+        self.assertEqual(result[0]["event"], "INFO")
+        self.assertEqual(result[0]["msg_id"], 5)
+        self.assertEqual(result[0]["msg_values"], '["123"]') # JSON string
+        self.assertIsNone(result[0]["value"])
+        self.assertEqual(result[0]["source"], "input.log")
+        self.assertEqual(result[1]["value"], 250)
+        self.assertIsNone(result[1]["msg_id"])
         
         # Verify cache interaction
-        self.mock_facade_instance.get_or_create_message_id.assert_called_with("INFO User {num} logged in")
+        self.mock_facade_instance.get_or_create_message_ids.assert_called_once_with(["INFO User {num} logged in"])
         self.assertEqual(self.wp.msg_cache["INFO User {num} logged in"], 5)
 
-    def test_prepare_entry_cached(self):
-        """Test _prepare_entry uses local cache."""
-        entry = {
-            "time": "2023-10-27T10:00:00",
-            "event": "INFO",
-            "msg": "2023-10-27 10:00:00 INFO User 123 logged in",
-            "value": None
-        }
+    def test_prepare_batch_cached(self):
+        """Test _prepare_batch uses local cache."""
+        batch = EventBatch()
+        batch.add(1698400800, "INFO", template="INFO User {num} logged in", msg_values='["123"]')
         
         # Pre-populate cache
         self.wp.msg_cache["INFO User {num} logged in"] = 10
         
-        result = self.wp._prepare_entry(entry)
+        result = self.wp._prepare_batch(batch)
         
-        self.assertEqual(result["msg_id"], 10)
-        self.mock_facade_instance.get_or_create_message_id.assert_not_called()
+        self.assertEqual(result[0]["msg_id"], 10)
+        self.mock_facade_instance.get_or_create_message_ids.assert_not_called()
 
-    def test_process_queue_bulk_insert(self):
-        """Test _process_queue calls bulk_insert_timeline_events."""
-        q = queue.Queue()
-        
-        events = {"INFO": ["User 123 logged in"]}
-        timeline = [
-            {"time": "2023-10-27T10:00:00", "event": "INFO", "msg": "2023-10-27 10:00:00 INFO User 123 logged in", "value": None},
-            {"time": "2023-10-27T10:00:01", "event": "INFO", "msg": "2023-10-27 10:00:01 INFO User 456 logged in", "value": None}
-        ]
-        q.put((events, timeline))
-        
-        self.mock_facade_instance.get_or_create_message_id.return_value = 1
-        
-        self.wp._process_queue(q)
-        
-        self.mock_facade_instance.bulk_insert_timeline_events.assert_called_once()
-        call_args = self.mock_facade_instance.bulk_insert_timeline_events.call_args[0][0]
-        self.assertEqual(len(call_args), 2)
-        self.assertEqual(call_args[0]["msg_values"], '["123"]')
-        self.assertEqual(call_args[1]["msg_values"], '["456"]')
+    def test_unknown_templates_are_resolved_in_one_call(self):
+        """Test all uncached templates of a batch are fetched together."""
+        batch = EventBatch()
+        batch.add(1698400800, "error", template="ERROR A")
+        batch.add(1698400801, "error", template="ERROR B")
+        batch.add(1698400802, "warning", template="WARNING C")
+        self.wp.msg_cache["ERROR B"] = 2
+        self.mock_facade_instance.get_or_create_message_ids.return_value = {"ERROR A": 1, "WARNING C": 3}
 
-    def test_process_queue_empty_item(self):
-        """Test _process_queue handles None/empty item gracefully."""
-        q = MagicMock()
-        q.get.return_value = None # Simulate empty or None
-import unittest
-from unittest.mock import MagicMock, patch
-import queue
-import time
-from src.writer_process import WriterProcess
+        result = self.wp._prepare_batch(batch)
 
-class TestWriterProcess(unittest.TestCase):
-    def setUp(self):
-        # Patch the facade class where it is imported in writer_process
-        self.facade_patcher = patch('src.writer_process.ChronoLogFacade')
-        self.MockFacade = self.facade_patcher.start()
-        self.mock_facade_instance = self.MockFacade.return_value
-        
-        # Initialize WriterProcess
-        self.wp = WriterProcess(flush_interval=0.01)
+        self.assertEqual([row["msg_id"] for row in result], [1, 2, 3])
+        self.mock_facade_instance.get_or_create_message_ids.assert_called_once_with(["ERROR A", "WARNING C"])
+        self.assertEqual(self.wp.msg_cache, {"ERROR A": 1, "ERROR B": 2, "WARNING C": 3})
 
-    def tearDown(self):
-        self.facade_patcher.stop()
+    def test_shared_template_cache_replaces_local_cache(self):
+        """Test writers given a shared cache look templates up there and fill it."""
+        from src.template_cache import SharedTemplateCache
+        cache = SharedTemplateCache(size=16, ways=4)
+        self.addCleanup(cache.unlink)
+        cache.put_many([("ERROR B", 2)])
+        self.wp.template_cache = cache
+        batch = EventBatch()
+        batch.add(1698400800, "error", template="ERROR A")
+        batch.add(1698400801, "error", template="ERROR B")
+        self.mock_facade_instance.get_or_create_message_ids.return_value = {"ERROR A": 1}
 
-    def test_init(self):
-        """Test initialization of WriterProcess."""
-        self.assertEqual(self.wp.flush_interval, 0.01)
-        self.assertEqual(self.wp.facade, self.mock_facade_instance)
+        self.assertEqual([row["msg_id"] for row in self.wp._prepare_batch(batch)], [1, 2])
+        self.mock_facade_instance.get_or_create_message_ids.assert_called_once_with(["ERROR A"])
+        self.assertEqual(cache.get_many(["ERROR A"]), [1])
         self.assertEqual(self.wp.msg_cache, {})
 
-    def test_prepare_entry_valid(self):
-        """Test _prepare_entry with valid data."""
-        entry = {
-            "time": "2023-10-27T10:00:00",
-            "event": "INFO",
-            "msg": "2023-10-27 10:00:00 INFO User 123 logged in",
-            "value": None
-        }
-        
-        # Mock facade behavior
-        self.mock_facade_instance.get_or_create_message_id.return_value = 5
-        
-        result = self.wp._prepare_entry(entry)
-        
-        self.assertEqual(result["time"], "2023-10-27T10:00:00")
-        self.assertEqual(result["event"], "INFO")
-        self.assertEqual(result["msg_id"], 5)
-        self.assertEqual(result["msg_values"], '["123"]') # JSON string
-        self.assertIsNone(result["value"])
-        
-        # Verify cache interaction
-        self.mock_facade_instance.get_or_create_message_id.assert_called_with("INFO User {num} logged in")
-        self.assertEqual(self.wp.msg_cache["INFO User {num} logged in"], 5)
+        # only the first writer fills a shared cache from the database
+        self.mock_facade_instance.get_messages.return_value = {"3": "WARNING C"}
+        self.wp._prewarm_cache()
+        self.wp._prewarm_cache()
+        self.mock_facade_instance.get_messages.assert_called_once()
+        self.assertEqual(cache.get_many(["WARNING C"]), [3])
 
-    def test_prepare_entry_cached(self):
-        """Test _prepare_entry uses local cache."""
-        entry = {
-            "time": "2023-10-27T10:00:00",
-            "event": "INFO",
-            "msg": "2023-10-27 10:00:00 INFO User 123 logged in",
-            "value": None
-        }
-        
-        # Pre-populate cache
-        self.wp.msg_cache["INFO User {num} logged in"] = 10
-        
-        result = self.wp._prepare_entry(entry)
-        
-        self.assertEqual(result["msg_id"], 10)
-        self.mock_facade_instance.get_or_create_message_id.assert_not_called()
+    def test_prewarm_cache_from_messages(self):
+        """Test the cache is filled from the Messages table, newest first."""
+        self.mock_facade_instance.get_messages.return_value = {"1": "ERROR A", "2": "ERROR B", "3": "WARNING C"}
+        with patch("src.writer_process.MSG_CACHE_SIZE", 2):
+            self.wp._prewarm_cache()
+        self.assertEqual(self.wp.msg_cache, {"WARNING C": 3, "ERROR B": 2})
+
+        # a database that cannot be reached leaves the cache cold
+        self.mock_facade_instance.get_messages.side_effect = Exception("DB down")
+        self.wp.msg_cache = {}
+        self.wp._prewarm_cache()
+        self.assertEqual(self.wp.msg_cache, {})
+
+    def test_prepare_batch_aggregated(self):
+        """Test _prepare_batch passes occurrence counts and metric ranges."""
+        batch = EventBatch()
+        for i in range(3):
+            batch.add(1698400800 + i, "error", template="ERROR Database connection failed")
+            batch.add(1698400800 + i, "latency", 100 * (i + 1))
+        self.wp.msg_cache["ERROR Database connection failed"] = 4
+
+        result = self.wp._prepare_batch(batch.aggregated(60))
+
+        self.assertEqual(len(result), 2)
+        self.assertEqual((result[0]["time"], result[0]["msg_id"], result[0]["count"]), (1698400800, 4, 3))
+        self.assertNotIn("min", result[0])
+        self.assertEqual((result[1]["value"], result[1]["count"], result[1]["min"], result[1]["max"]), (600, 3, 100, 300))
+
+    def test_prepare_rows_typed(self):
+        """Test _prepare_rows builds typed tuples for the executemany/tvp engines."""
+        batch = EventBatch("input.log")
+        batch.add(1698400800, "error", template="ERROR User {num} failed", msg_values='["7"]')
+        batch.add(1698400801, "latency", 250)
+        self.wp.msg_cache["ERROR User {num} failed"] = 5
+
+        rows = self.wp._prepare_rows(batch)
+
+        self.assertEqual(rows[0], (datetime(2023, 10, 27, 10, 0), "error", 5, '["7"]', None, "input.log", 1, None, None))
+        self.assertEqual(rows[1], (datetime(2023, 10, 27, 10, 0, 1), "latency", None, None, 250.0, "input.log", 1, None, None))
+        self.assertIsInstance(rows[1][4], float)
+
+        rows = self.wp._prepare_rows(batch.aggregated(60))
+        self.assertEqual(rows[1][4:], (250.0, "input.log", 1, 250.0, 250.0))
+
+    def test_process_queue_row_engine(self):
+        """Test _process_queue hands typed rows to bulk_insert_timeline_rows."""
+        wp = WriterProcess(flush_interval=0.01, insert_engine="tvp")
+        q = queue.Queue()
+        batch = EventBatch()
+        batch.add(1698400801, "latency", 250)
+        q.put((batch, None))
+
+        wp._process_queue(q)
+        wp.flush()
+
+        self.mock_facade_instance.bulk_insert_timeline_json.assert_not_called()
+        rows, engine = self.mock_facade_instance.bulk_insert_timeline_rows.call_args[0]
+        self.assertEqual((len(rows), engine), (1, "tvp"))
+
+    def test_rows_of_consecutive_chunks_are_inserted_together(self):
+        """Test chunks are collected until the row threshold, then inserted and acknowledged."""
+        wp = WriterProcess(flush_interval=60, batch_rows=3)
+        wp.ack_queue = queue.Queue()
+        q = queue.Queue()
+        for n in range(2):
+            batch = EventBatch()
+            batch.add(1698400800 + n, "latency", 5)
+            batch.add(1698400800 + n, "size", 7)
+            q.put((batch, ("input.log", 0, n * 100, n * 100 + 100)))
+
+        wp._process_queue(q)
+        wp._wait_for_flush()
+        self.mock_facade_instance.bulk_insert_timeline_json.assert_not_called()
+        self.assertTrue(wp.ack_queue.empty())
+
+        wp._process_queue(q)
+        wp._wait_for_flush()
+        events = json.loads(self.mock_facade_instance.bulk_insert_timeline_json.call_args[0][0])
+        self.assertEqual([e["value"] for e in events], [5, 7, 5, 7])
+        self.assertEqual([wp.ack_queue.get_nowait() for _ in range(2)], [("input.log", 0, 0, 100), ("input.log", 0, 100, 200)])
+
+    def test_pending_rows_are_flushed_after_interval(self):
+        """Test a small batch is written once the flush interval has passed."""
+        wp = WriterProcess(flush_interval=0.05)
+        q = queue.Queue()
+        batch = EventBatch()
+        batch.add(1698400800, "latency", 5)
+        q.put((batch, None))
+
+        wp._process_queue(q)
+        self.assertLessEqual(wp._wait_time(), 0.05)
+        wp._process_queue(q)  # nothing queued: waits out the interval
+        wp._wait_for_flush()
+        self.mock_facade_instance.bulk_insert_timeline_json.assert_called_once()
+
+    def test_unknown_insert_engine_rejected(self):
+        with self.assertRaises(ValueError):
+            WriterProcess(insert_engine="bcp")
 
     def test_process_queue_bulk_insert(self):
-        """Test _process_queue calls bulk_insert_timeline_events."""
+        """Test the json engine inserts through bulk_insert_timeline_json."""
         q = queue.Queue()
         
-        events = {"INFO": ["User 123 logged in"]}
-        timeline = [
-            {"time": "2023-10-27T10:00:00", "event": "INFO", "msg": "2023-10-27 10:00:00 INFO User 123 logged in", "value": None},
-            {"time": "2023-10-27T10:00:01", "event": "INFO", "msg": "2023-10-27 10:00:01 INFO User 456 logged in", "value": None}
-        ]
-        q.put((events, timeline))
+        batch = EventBatch()
+        batch.add(1698400800, "INFO", template="INFO User {num} logged in", msg_values='["123"]')
+        batch.add(1698400801, "INFO", template="INFO User {num} logged in", msg_values='["456"]')
+        q.put((batch, None))
         
-        self.mock_facade_instance.get_or_create_message_id.return_value = 1
+        self.mock_facade_instance.get_or_create_message_ids.return_value = {"INFO User {num} logged in": 1}
         
         self.wp._process_queue(q)
+        self.wp.flush()
         
-        self.mock_facade_instance.bulk_insert_timeline_events.assert_called_once()
-        call_args = self.mock_facade_instance.bulk_insert_timeline_events.call_args[0][0]
+        # the rows go out as one JSON document, encoded while the batch was collected
+        self.mock_facade_instance.bulk_insert_timeline_json.assert_called_once()
+        call_args = json.loads(self.mock_facade_instance.bulk_insert_timeline_json.call_args[0][0])
         self.assertEqual(len(call_args), 2)
         self.assertEqual(call_args[0]["msg_values"], '["123"]')
         self.assertEqual(call_args[1]["msg_values"], '["456"]')
 
     def test_process_queue_empty_item(self):
-        """Test _process_queue handles None/empty item gracefully."""
+        """Test _process_queue stops on the None sentinel and skips empty items."""
         q = MagicMock()
-        q.get.return_value = None # Simulate empty or None
+        q.get.return_value = None # Simulate the stop sentinel
         
-        self.wp._process_queue(q)
+        self.assertFalse(self.wp._process_queue(q))
+        q.get.return_value = ()
+        self.assertTrue(self.wp._process_queue(q))
+        self.wp.flush()
         
-        self.mock_facade_instance.bulk_insert_timeline_events.assert_not_called()
+        self.mock_facade_instance.bulk_insert_timeline_json.assert_not_called()
+
+    def test_process_queue_reads_shared_memory_result(self):
+        from src import writer_process
+        from src.shared_transport import SharedSlots
+        transport = SharedSlots(slots=1, slot_bytes=4096)
+        self.addCleanup(transport.unlink)
+        batch = EventBatch()
+        batch.add(1698400800, "latency", 5)
+        stored = transport.put(batch)
+        # the class as imported by writer_process (src/ is also on sys.path)
+        ref = writer_process.SharedRef(stored.segment, stored.offset, stored.length)
+        self.wp.transport = transport
+        self.wp.ack_queue = queue.Queue()
+        q = queue.Queue()
+        q.put((ref, ("input.log", 0, 0, 100)))
+
+        self.wp._process_queue(q)
+        self.wp.flush()
+
+        self.mock_facade_instance.bulk_insert_timeline_json.assert_called_once()
+        self.assertEqual(self.wp.ack_queue.get_nowait(), ("input.log", 0, 0, 100))
+        # the slot was handed back
+        self.assertEqual(transport.in_use(), 0)
+
+    def test_process_queue_acknowledges_committed_chunk(self):
+        """Test the chunk marker is acknowledged only after a successful insert."""
+        q = queue.Queue()
+        acks = queue.Queue()
+        self.wp.ack_queue = acks
+        batch = EventBatch()
+        batch.add(1698400800, "latency", 5)
+        q.put((batch, ("input.log", 0, 0, 100)))
+
+        self.wp._process_queue(q)
+        self.wp.flush()
+        self.assertEqual(acks.get_nowait(), ("input.log", 0, 0, 100))
+
+        # a batch that can be neither inserted nor saved must not be acknowledged
+        self.mock_facade_instance.bulk_insert_timeline_json.side_effect = Exception("DB down")
+        self.dead_letter_dir.parent.mkdir(exist_ok=True)
+        self.dead_letter_dir.write_text("not a directory")
+        q.put((batch, ("input.log", 0, 100, 200)))
+        self.wp._process_queue(q)
+        self.wp.flush()
+        self.assertTrue(acks.empty())
+        self.assertEqual(self.wp.failures["lost"], 1)
+
+    def test_failed_insert_is_retried_with_backoff(self):
+        """Test a failing insert is retried, with a doubling delay, before it succeeds."""
+        self.wp.retry_delay = 0.01
+        self.wp.ack_queue = queue.Queue()
+        insert = self.mock_facade_instance.bulk_insert_timeline_json
+        insert.side_effect = [Exception("deadlock"), Exception("deadlock"), None]
+        batch = EventBatch()
+        batch.add(1698400800, "latency", 5)
+
+        with patch("src.writer_process.time.sleep") as sleep:
+            self.wp._add(batch, ("input.log", 0, 0, 100))
+            self.wp.flush()
+        self.assertEqual(insert.call_count, 3)
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [0.01, 0.02])
+        self.assertEqual(self.wp.ack_queue.get_nowait(), ("input.log", 0, 0, 100))
+        self.assertEqual(self.wp.failures["retried"], 2)
+
+    def test_failed_batch_is_dead_lettered_and_acknowledged(self):
+        """Test a batch that keeps failing is saved to the dead letter directory, then acknowledged."""
+        self.wp.ack_queue = queue.Queue()
+        self.mock_facade_instance.bulk_insert_timeline_json.side_effect = Exception("DB down")
+        batch = EventBatch("input.log")
+        batch.add(1698400800, "latency", 5)
+
+        self.wp._add(batch, ("input.log", 0, 0, 100))
+        self.wp.flush()
+        self.assertEqual(self.mock_facade_instance.bulk_insert_timeline_json.call_count, self.wp.retries + 1)
+        saved = list(self.dead_letter_dir.iterdir())
+        self.assertEqual(len(saved), 1)
+        rows = json.loads(saved[0].read_text())
+        self.assertEqual([(r["time"], r["event"], r["value"], r["source"]) for r in rows],
+                         [(1698400800, "latency", 5, "input.log")])
+        self.assertEqual(self.wp.ack_queue.get_nowait(), ("input.log", 0, 0, 100))
+        self.assertEqual(self.wp.failures["dead_lettered"], 1)
+
+    def test_unresolved_templates_are_retried_then_dead_lettered(self):
+        """Test a chunk whose templates cannot be looked up is retried, then saved and acknowledged."""
+        self.wp.ack_queue = queue.Queue()
+        resolve = self.mock_facade_instance.get_or_create_message_ids
+        resolve.side_effect = Exception("DB down")
+        batch = EventBatch("input.log")
+        batch.add(1698400800, "ERROR", template="ERROR job {num} failed", msg_values='["7"]')
+
+        self.wp._add(batch, ("input.log", 0, 0, 100))
+        self.wp.flush()
+        self.assertEqual(resolve.call_count, self.wp.retries + 1)
+        self.mock_facade_instance.bulk_insert_timeline_json.assert_not_called()
+        saved = list(self.dead_letter_dir.iterdir())
+        self.assertEqual([p.name.split("-")[0] for p in saved], ["unresolved"])
+        self.assertEqual(json.loads(saved[0].read_text())[0]["template"], "ERROR job {num} failed")
+        self.assertEqual(self.wp.ack_queue.get_nowait(), ("input.log", 0, 0, 100))
+        self.assertEqual(self.wp.failures["lost"], 0)
+
+        # a lookup that recovers within the retries is encoded as usual
+        resolve.side_effect = [Exception("DB down"), {"ERROR job {num} failed": 4}]
+        self.wp._add(batch, ("input.log", 0, 100, 200))
+        self.assertEqual(self.wp._pending_rows, 1)
+
+    def test_long_values_and_templates_fit_their_columns(self):
+        """Test values and templates longer than their NVARCHAR(500) columns are shortened, not cut."""
+        url = "https://example.com/" + "a" * 600
+        long_a, long_b = "ERROR " + "x" * 600 + " A", "ERROR " + "x" * 600 + " B"
+        batch = EventBatch()
+        batch.add(1698400800, "ERROR", template=long_a, msg_values=json.dumps(["42", url]))
+        batch.add(1698400801, "ERROR", template=long_b, msg_values=json.dumps(["7"]))
+        self.mock_facade_instance.get_or_create_message_ids.side_effect = \
+            lambda templates: {t: i + 1 for i, t in enumerate(templates)}
+
+        rows = self.wp._prepare_batch(batch)
+        values = json.loads(rows[0]["msg_values"])
+        self.assertLessEqual(len(rows[0]["msg_values"]), MAX_VALUES_CHARS)
+        self.assertEqual(values[0], "42")
+        self.assertTrue(url.startswith(values[1][:-3]) and values[1].endswith("..."))
+        self.assertEqual(rows[1]["msg_values"], '["7"]')
+        self.assertEqual(self.wp._prepare_rows(batch)[0][3], rows[0]["msg_values"])
+
+        templates = self.mock_facade_instance.get_or_create_message_ids.call_args_list[0].args[0]
+        self.assertEqual(len(set(templates)), 2)
+        self.assertTrue(all(len(t) <= MAX_TEMPLATE_CHARS for t in templates))
+        self.assertEqual([r["msg_id"] for r in rows], [1, 2])
+
+    def test_rows_without_time_are_dropped(self):
+        """Test rows without a timestamp are left out instead of failing the whole insert."""
+        batch = EventBatch()
+        batch.add(None, "latency", 1)
+        batch.add(1698400800, "latency", 5)
+        rows = self.wp._prepare_batch(batch)
+        self.assertEqual([r["value"] for r in rows], [5])
+        self.assertEqual([r[4] for r in self.wp._prepare_rows(batch)], [5.0])
+        self.assertEqual(self.wp.failures["rows_without_time"], 2)
+
+    def test_run_writes_everything_before_its_sentinel(self):
+        """Test run drains the queue up to the stop sentinel, then commits and exits."""
+        q = queue.Queue()
+        acks = queue.Queue()
+        for i in range(3):
+            batch = EventBatch()
+            batch.add(1698400800 + i, "latency", i)
+            q.put((batch, ("input.log", 0, i * 10, i * 10 + 10)))
+        q.put(None)
+        q.put("left for another writer")
+        self.mock_facade_instance.get_messages.return_value = {}
+
+        self.wp.run(q, acks)
+        self.assertEqual([acks.get_nowait()[2] for _ in range(3)], [0, 10, 20])
+        self.assertEqual(q.get_nowait(), "left for another writer")
+        self.mock_facade_instance.close.assert_called_once()
 
     def test_process_queue_exception(self):
         """Test _process_queue handles exceptions."""